@@ -0,0 +1,141 @@
+"""
+分句性能测试
+在大文件（如几百MB的政府公报合集）上比较原有的两种分句实现和流式分句的耗时与内存占用，
+每种实现在单独的子进程中运行，内存为子进程的峰值常驻内存
+
+用法：
+    python scripts/benchmark_sentence_splitter.py --size-mb 300
+    python scripts/benchmark_sentence_splitter.py --input data/input/gazette_dump.txt
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.text_processing import iter_sentences
+
+METHODS = ["findall", "split", "stream", "mmap"]
+
+# 生成测试文本使用的片段
+FRAGMENTS = ["第{n}条", "为进一步做好住房保障工作", "对符合条件的本市户籍家庭给予租赁补贴", "（一）",
+             "公共租赁住房实行实物保障与货币补贴并举", "补贴标准由市住房城乡建设部门会同财政部门确定",
+             "\n", "本办法自发布之日起施行", "各区人民政府应当加强组织领导"]
+
+
+def generate_text(path, size_mb, seed=0):
+    """生成约size_mb大小的模拟公报文本"""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < target:
+            parts = []
+            for n in range(1000):
+                clause = "，".join(rng.choice(FRAGMENTS).format(n=n) for _ in range(rng.randint(1, 4)))
+                parts.append(clause + rng.choice("。。。！？"))
+            block = "".join(parts)
+            f.write(block)
+            written += len(block.encode('utf-8'))
+
+
+def legacy_findall(text):
+    """原run_analysis.chunk_text_into_sentences的实现"""
+    pattern = r'([^。！？]+[。！？]+)'
+    sentences = re.findall(pattern, text)
+    remaining = re.sub(pattern, '', text).strip()
+    if remaining:
+        sentences.append(remaining)
+    return [s.strip() for s in sentences if s.strip()]
+
+
+def legacy_split(text):
+    """原text_processing.split_text_into_sentences的实现"""
+    pattern = r'([。！？])'
+    parts = re.split(pattern, text)
+    sentences = []
+    temp_sentence = []
+    for part in parts:
+        if re.match(pattern, part):
+            temp_sentence.append(part)
+            sentence = "".join(temp_sentence).strip()
+            if sentence:
+                sentences.append(sentence)
+            temp_sentence = []
+        else:
+            temp_sentence.append(part)
+    if temp_sentence:
+        sentence = "".join(temp_sentence).strip()
+        if sentence:
+            sentences.append(sentence)
+    return [s for s in sentences if s.strip()]
+
+
+def run_one(method, path):
+    """在当前进程中运行一种实现，返回耗时、句子数和峰值常驻内存"""
+    start = time.perf_counter()
+    if method == "findall":
+        with open(path, 'r', encoding='utf-8') as f:
+            count = len(legacy_findall(f.read().strip()))
+    elif method == "split":
+        with open(path, 'r', encoding='utf-8') as f:
+            count = len(legacy_split(f.read().strip()))
+    elif method == "stream":
+        with open(path, 'r', encoding='utf-8') as f:
+            count = sum(1 for _ in iter_sentences(f))
+    else:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            count = sum(1 for _ in iter_sentences(mapped))
+    elapsed = time.perf_counter() - start
+    # Linux下ru_maxrss的单位为KB
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"method": method, "seconds": round(elapsed, 3), "sentences": count, "peak_rss_mb": round(peak_mb, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较分句实现在大文件上的性能')
+    parser.add_argument('--input', help='测试文件，不指定时生成模拟公报文本')
+    parser.add_argument('--size-mb', type=int, default=300, help='生成的模拟文本大小（MB）')
+    parser.add_argument('--methods', default=",".join(METHODS), help='要比较的实现，用逗号分隔')
+    parser.add_argument('--run-one', nargs=2, metavar=('METHOD', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(*args.run_one)))
+        return
+
+    path = args.input
+    temp_dir = None
+    if path is None:
+        temp_dir = tempfile.mkdtemp()
+        path = os.path.join(temp_dir, "gazette.txt")
+        print(f"生成 {args.size_mb}MB 模拟文本: {path}")
+        generate_text(path, args.size_mb)
+    size_mb = os.path.getsize(path) / 1024 / 1024
+
+    try:
+        print(f"{'实现':<10}{'耗时(秒)':>10}{'MB/秒':>10}{'句子数':>12}{'峰值内存(MB)':>14}")
+        for method in args.methods.split(","):
+            output = subprocess.run([sys.executable, __file__, "--run-one", method, path],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{method:<10}{result['seconds']:>10.2f}{size_mb / result['seconds']:>10.1f}"
+                  f"{result['sentences']:>12}{result['peak_rss_mb']:>14.1f}")
+    finally:
+        if temp_dir is not None:
+            os.remove(path)
+            os.rmdir(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
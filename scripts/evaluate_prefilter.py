@@ -0,0 +1,72 @@
+"""
+相关性预筛选评估
+在标注样本上计算预筛选的precision和recall（以"相关"为正类，recall即相关句子被保留的比例），
+可同时比较多个阈值，用于调整PREFILTER_CONFIG
+
+样本来源：
+    --labels: 人工标注的JSONL文件，每行为{"text": 句子, "relevant": true/false}
+    --outputs: 已有运行的汇总结果（all目录下的*_sentences.json），任一模型的policy_object已匹配
+               或policy_tool已定义时标为相关，所有模型都回答"未匹配/未定义"时标为不相关
+
+用法：
+    python scripts/evaluate_prefilter.py --outputs "data/output/housing/all/*_sentences.json"
+    python scripts/evaluate_prefilter.py --labels data/prefilter_labels.jsonl --thresholds 0.5,1,1.5,2
+"""
+
+import os
+import sys
+import json
+import glob
+import argparse
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.config.model_config import PREFILTER_CONFIG
+from src.core.prefilter import HousingPrefilter, labels_from_output, labels_from_jsonl
+
+
+def load_samples(labels=None, outputs=None):
+    """读取标注样本，返回(句子, 是否相关)列表"""
+    samples = []
+    if labels:
+        with open(labels, 'r', encoding='utf-8') as f:
+            samples.extend(labels_from_jsonl(f))
+    for path in sorted(glob.glob(outputs)) if outputs else []:
+        with open(path, 'r', encoding='utf-8') as f:
+            samples.extend(labels_from_output(json.load(f)))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在标注样本上评估相关性预筛选的precision和recall')
+    parser.add_argument('--labels', help='人工标注的JSONL文件')
+    parser.add_argument('--outputs', help='已有运行的汇总结果文件，支持通配符')
+    parser.add_argument('--thresholds', default=str(PREFILTER_CONFIG["threshold"]),
+                        help='要比较的阈值，用逗号分隔')
+    parser.add_argument('--show-misses', type=int, default=0,
+                        help='列出前N个被筛掉的相关句子')
+    args = parser.parse_args()
+    if not args.labels and not args.outputs:
+        parser.error('需要指定--labels或--outputs')
+
+    samples = load_samples(args.labels, args.outputs)
+    if not samples:
+        print("没有找到标注样本")
+        return
+
+    print(f"{'阈值':<8}{'样本数':>8}{'相关':>8}{'筛掉比例':>10}{'precision':>11}{'recall':>9}{'f1':>8}")
+    for threshold in args.thresholds.split(','):
+        prefilter = HousingPrefilter(float(threshold))
+        result = prefilter.evaluate(samples)
+        print(f"{result['threshold']:<8}{result['samples']:>8}{result['relevant']:>8}{result['filtered_ratio']:>10.2%}"
+              f"{result['precision']:>11.4f}{result['recall']:>9.4f}{result['f1']:>8.4f}")
+        if args.show_misses:
+            misses = [sentence for sentence, relevant in samples
+                      if relevant and prefilter.score(sentence)[0] < prefilter.threshold]
+            for sentence in misses[:args.show_misses]:
+                print(f"    漏判: {sentence}")
+
+
+if __name__ == "__main__":
+    main()
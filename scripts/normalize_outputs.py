@@ -0,0 +1,61 @@
+"""
+归一化已有的分析结果
+为此前运行保存的汇总结果（all目录下的*_sentences.json）中每个housing模板答案补充"normalized"字段，
+将policy_object等枚举型要素归一化为模板中的标准取值，并统计各标准取值出现的次数
+
+用法：
+    python scripts/normalize_outputs.py "data/output/housing/all/*_sentences.json"
+    python scripts/normalize_outputs.py "data/output/housing/all/*_sentences.json" --dry-run
+"""
+
+import os
+import sys
+import json
+import glob
+import argparse
+from collections import Counter
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.vocabulary import get_housing_normalizer
+
+
+def normalize_file(path, normalizer, counts, write=True):
+    """归一化一个汇总结果文件，返回归一化的答案数"""
+    with open(path, 'r', encoding='utf-8') as f:
+        combined = json.load(f)
+    answers = 0
+    for entry in combined.get("sentences", []):
+        for result in entry.get("models", {}).values():
+            if not isinstance(result, dict) or "policy_object" not in result:
+                continue
+            result["normalized"] = normalizer.normalize(result)
+            values = result["normalized"].get("policy_object", {}).get("values") or ["（无法归一化）"]
+            counts.update(values)
+            answers += 1
+    if write:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(combined, f, ensure_ascii=False, indent=2)
+    return answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='为已有的housing分析结果补充枚举要素的归一化取值')
+    parser.add_argument('pattern', help='汇总结果文件，支持通配符')
+    parser.add_argument('--dry-run', action='store_true', help='只统计，不改写文件')
+    args = parser.parse_args()
+
+    normalizer = get_housing_normalizer()
+    counts = Counter()
+    for path in sorted(glob.glob(args.pattern)):
+        answers = normalize_file(path, normalizer, counts, write=not args.dry_run)
+        print(f"{path}: {answers} 个答案")
+
+    print("policy_object标准取值分布:")
+    for value, count in counts.most_common():
+        print(f"  {value}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+基于任务队列的分布式分析
+
+produce: 将输入文件的(文件, 句子, 模板, 模型)任务加入队列
+work:    领取任务并调用模型，结果写回队列；可同时运行多个工作进程，多台机器共享队列文件时
+         共享卷必须正确实现fcntl锁（见src/services/task_queue.py的说明）
+status:  查看队列中各状态的任务数
+export:  将队列中的结果导出为与run_analysis.py相同的输出目录结构
+
+示例：
+    python scripts/queue_analysis.py produce --template housing --input "data/input/*.txt"
+    python scripts/queue_analysis.py work --concurrency 16
+    python scripts/queue_analysis.py export --template housing
+"""
+
+import os
+import sys
+import time
+import socket
+import logging
+import argparse
+import threading
+
+# 添加项目根目录和脚本目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from run_analysis import (llm_service, models, chunk_text_into_sentences, collect_input_files,
+                          parse_provider_limits, save_results)
+from src.config.model_config import GLOBAL_CONCURRENCY, TASK_QUEUE_CONFIG, TIMEOUT_CONFIG, CIRCUIT_BREAKER_CONFIG
+from src.config.prompt_templates import TEMPLATES, DEFAULT_TEMPLATE
+from src.core.scheduler import AnalysisScheduler, ModelTask
+from src.core.run_report import RunReport
+from src.services.response_cache import ResponseCache, CACHE_MODES
+from src.services.task_queue import SQLiteTaskQueue
+
+logger = logging.getLogger('queue')
+
+
+def produce(args, queue):
+    """将输入文件的所有句子按模型拆成任务加入队列"""
+    input_directory = os.path.join(os.path.dirname(__file__), '..', 'data', 'input')
+    input_files = collect_input_files(args.input, input_directory)
+    run_models = [m.strip() for m in args.models.split(',') if m.strip()] if args.models else models
+    if not input_files:
+        logger.warning(f"没有找到输入文件: {args.input or input_directory}")
+        return
+
+    total = 0
+    for file_path in input_files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            sentences = chunk_text_into_sentences(f)
+        file_key = os.path.abspath(file_path)
+        file_name = os.path.splitext(os.path.basename(file_path))[0]
+        inserted = queue.enqueue([
+            {"file_key": file_key, "file_name": file_name, "sentence_index": i, "sentence": sentence,
+             "template": args.template, "model": model_name}
+            for i, sentence in enumerate(sentences) for model_name in run_models
+        ])
+        total += inserted
+        logger.info(f"{file_path}: {len(sentences)} 个句子，新加入 {inserted} 个任务")
+    logger.info(f"共加入 {total} 个任务，队列状态: {queue.counts()}")
+
+
+def work(args, queue):
+    """
+    领取任务并通过调度器调用模型
+
+    已领取但未完成的任务由后台线程定期续约；队列中没有待处理和处理中的任务时退出（--keep-polling时继续等待）
+    """
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    batch_size = args.batch_size or args.concurrency * 2
+    if args.cache != 'bypass':
+        llm_service.response_cache = ResponseCache(args.cache_dir, mode=args.cache)
+
+    in_flight = {}  # 任务id -> 已尝试次数
+    drained = threading.Condition()
+    stop = threading.Event()
+    counters = {"leased": 0, "completed": 0, "failed": 0, "requeued": 0, "lost_lease": 0}
+
+    def on_result(task, result):
+        result = {k: v for k, v in result.items() if k != "prompt"}
+        if result["status"] == "success":
+            written = queue.complete(task.file_id, worker_id, result)
+            outcome = "completed"
+        elif result.get("not_sent") or result["status"] == "skipped":
+            # 请求没有发出或被取消，不计入尝试次数；模型熔断中时等熔断恢复后再领取
+            if result.get("not_sent") == "circuit_open":
+                delay = CIRCUIT_BREAKER_CONFIG["reset_timeout"]
+            else:
+                delay = queue.retry_delay(1)
+            written = queue.fail(task.file_id, worker_id, result, count_attempt=False, delay=delay)
+            outcome = "requeued"
+        else:
+            with drained:
+                attempts = in_flight.get(task.file_id, 1)
+            written = queue.fail(task.file_id, worker_id, result, delay=queue.retry_delay(attempts))
+            outcome = "failed"
+        with drained:
+            in_flight.pop(task.file_id, None)
+            counters[outcome if written else "lost_lease"] += 1
+            drained.notify_all()
+
+    def heartbeat():
+        while not stop.wait(queue.visibility_timeout / 3):
+            with drained:
+                task_ids = list(in_flight)
+            renewed = queue.heartbeat(worker_id, task_ids)
+            if renewed < len(task_ids):
+                logger.warning(f"{len(task_ids) - renewed} 个任务的租约已被其他工作进程接管")
+
+    heartbeat_thread = threading.Thread(target=heartbeat, name="queue-heartbeat", daemon=True)
+    heartbeat_thread.start()
+    logger.info(f"工作进程 {worker_id} 开始领取任务，每批最多 {batch_size} 个")
+
+    report = RunReport()
+    scheduler = AnalysisScheduler(llm_service, global_limit=args.concurrency,
+                                  provider_limits=parse_provider_limits(args.provider_concurrency),
+                                  sentence_deadline=TIMEOUT_CONFIG["sentence_deadline"])
+    try:
+        with scheduler:
+            while True:
+                # 处理中的任务降到一半以下时再领取下一批，减少对队列文件的访问
+                with drained:
+                    while len(in_flight) > batch_size // 2:
+                        drained.wait()
+                    free = batch_size - len(in_flight)
+                tasks = queue.lease(worker_id, free)
+                for task in tasks:
+                    with drained:
+                        in_flight[task["id"]] = task["attempts"]
+                        counters["leased"] += 1
+                    prompt = TEMPLATES[task["template"]].format(policy_text=task["sentence"])
+                    scheduler.submit(ModelTask(task["id"], task["sentence_index"], task["model"], prompt,
+                                               task["template"], scheduler.new_deadline()), on_result)
+                if tasks:
+                    continue
+
+                with drained:
+                    busy = bool(in_flight)
+                    if busy:
+                        drained.wait(timeout=args.poll_interval)
+                if busy:
+                    continue
+                if not args.keep_polling and not queue.has_unfinished():
+                    break
+                time.sleep(args.poll_interval)
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+
+    report.add_section("队列工作进程", {"worker_id": worker_id, **counters})
+    report.add_section("调度统计", dict(scheduler.stats))
+    report.add_section("限流统计", llm_service.rate_limiter.stats())
+    report.add_section("熔断统计", llm_service.circuit_breakers.stats())
+    if llm_service.response_cache is not None:
+        report.add_section("响应缓存统计", dict(llm_service.response_cache.stats))
+        llm_service.response_cache.close()
+    report.add_section("队列状态", queue.counts())
+    report.log_summary(logger)
+
+
+def export(args, queue):
+    """将已结束的任务按文件导出，输出格式与run_analysis.py的汇总文件相同"""
+    output_directory = args.output or os.path.join(os.path.dirname(__file__), '..', 'data', 'output')
+    for file_key, file_name, rows in queue.results(args.template):
+        sentences = {}
+        for index, sentence, model_name, status, result in rows:
+            entry = sentences.setdefault(index, {"sentence": sentence, "results": {}})
+            if status in ("done", "failed") and result is not None:
+                entry["results"][model_name] = result
+        sentence_results = [sentences[i] for i in sorted(sentences)]
+        save_results(sentence_results, file_name, output_directory, args.template)
+    logger.info(f"队列状态: {queue.counts()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基于任务队列的分布式政策文档分析')
+    parser.add_argument('--queue-db', default=str(TASK_QUEUE_CONFIG["db_path"]),
+                        help='任务队列文件路径；多台机器共享时放在正确实现fcntl锁的共享卷上，否则只在一台机器上运行')
+    parser.add_argument('--visibility-timeout', type=float, default=TASK_QUEUE_CONFIG["visibility_timeout"],
+                        help='任务租约时长（秒），超时未续约的任务会被重新领取')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    produce_parser = subparsers.add_parser('produce', help='将输入文件的任务加入队列')
+    produce_parser.add_argument('--template', '-t', choices=list(TEMPLATES.keys()), default=DEFAULT_TEMPLATE)
+    produce_parser.add_argument('--input', '-i', help='输入文件或目录路径，支持通配符')
+    produce_parser.add_argument('--models', '-m', help='要使用的模型，用逗号分隔')
+
+    work_parser = subparsers.add_parser('work', help='领取并处理队列中的任务')
+    work_parser.add_argument('--worker-id', help='工作进程标识，默认为主机名-进程号')
+    work_parser.add_argument('--concurrency', type=int, default=GLOBAL_CONCURRENCY,
+                             help='本工作进程的最大并发模型调用数')
+    work_parser.add_argument('--provider-concurrency', help='各服务商的最大并发调用数，如 alicloud=8,baidu=2')
+    work_parser.add_argument('--batch-size', type=int, help='每次最多领取的任务数，默认为并发数的2倍')
+    work_parser.add_argument('--poll-interval', type=float, default=TASK_QUEUE_CONFIG["poll_interval"],
+                             help='队列暂时没有可领取任务时的等待间隔（秒）')
+    work_parser.add_argument('--keep-polling', action='store_true', help='队列清空后继续等待新任务')
+    work_parser.add_argument('--cache', choices=CACHE_MODES, default='readwrite', help='响应缓存模式')
+    work_parser.add_argument('--cache-dir', help='响应缓存目录，默认为data/cache')
+
+    subparsers.add_parser('status', help='查看队列中各状态的任务数')
+
+    export_parser = subparsers.add_parser('export', help='将队列中的结果导出到输出目录')
+    export_parser.add_argument('--template', '-t', choices=list(TEMPLATES.keys()), default=DEFAULT_TEMPLATE)
+    export_parser.add_argument('--output', '-o', help='输出目录，默认为data/output')
+    args = parser.parse_args()
+
+    queue = SQLiteTaskQueue(args.queue_db, visibility_timeout=args.visibility_timeout)
+    try:
+        if args.command == 'produce':
+            produce(args, queue)
+        elif args.command == 'work':
+            work(args, queue)
+        elif args.command == 'status':
+            logger.info(f"队列状态: {queue.counts()}")
+        elif args.command == 'export':
+            export(args, queue)
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,16 +7,35 @@ from pathlib import Path
 import json
 import argparse
 import glob
-import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.utils.response_parser import parse_housing_elements
+from src.utils.response_parser import format_model_result
+from src.utils.text_processing import iter_sentences
 from src.utils.file_utils import write_model_results_to_json, setup_model_logger
 from src.services.llm_service import LLMService, call_models
-from src.config.model_config import MODEL_ENDPOINTS, DEFAULT_MODELS
-from src.config.prompt_templates import TEMPLATES, DEFAULT_TEMPLATE
+from src.config.model_config import (MODEL_ENDPOINTS, DEFAULT_MODELS, GLOBAL_CONCURRENCY, PROVIDER_CONCURRENCY,
+                                     TIMEOUT_CONFIG, OUTPUT_BUDGET_CONFIG, QUORUM_CONFIG, BATCH_CONFIG,
+                                     CHUNKING_CONFIG, PREFILTER_CONFIG)
+from src.core.scheduler import AnalysisScheduler, ModelTask
+from src.services.response_cache import ResponseCache, CACHE_MODES
+from src.services.hedging import HedgePolicy
+from src.services.output_budget import OutputBudget, REPORT_SECTION as OUTPUT_LENGTH_SECTION
+from src.config.prompt_templates import TEMPLATES, DEFAULT_TEMPLATE, PACKED_TEMPLATES, packed_template_key
+from src.core.packing import AdaptivePacker, render_packed_prompt, split_packed_response
+from src.core.dedup import SentenceDeduplicator
+from src.core.cascade import Cascade, CASCADE_MODEL, CASCADE_TEMPLATES
+from src.core.quorum import Quorum, QUORUM_TEMPLATES
+from src.core.chunking import ClauseChunker
+from src.core.prefilter import HousingPrefilter, PREFILTER_TEMPLATES
+from src.core.run_report import RunReport
+from src.services.journal import ProgressJournal
+from src.services.storage_service import StreamingResultWriter
+from src.services.batch import BatchRun, batch_custom_id, load_manifest
+from src.core.workers import (MP_CONTEXT, ProgressMonitor, shard_files, create_shared_limits, init_worker,
+                              worker_shared_limits, report_file_done, start_log_listener, merge_stats)
 
 # 确保日志目录存在
 logs_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
@@ -46,23 +65,32 @@ def chunk_text_into_sentences(text):
     将文本分割成句子
     
     Args:
-        text: 要分割的文本
+        text: 要分割的文本，也可以是打开的文件对象或mmap（逐块读取，不需要一次读入整个文件）
     
     Returns:
         句子列表
     """
-    # 使用正则表达式匹配句子，保留句末标点
-    # 匹配模式为句号、感叹号、问号，并且后面不是引号
-    pattern = r'([^。！？]+[。！？]+)'
-    sentences = re.findall(pattern, text)
-    
-    # 处理可能的剩余部分（没有以句号等结尾的最后部分）
-    remaining = re.sub(pattern, '', text).strip()
-    if remaining:
-        sentences.append(remaining)
-    
-    # 过滤空句子
-    return [s.strip() for s in sentences if s.strip()]
+    return list(iter_sentences(text))
+
+def read_file_units(file_path, chunker=None):
+    """
+    读取文件并切分为调用模型的单元
+    
+    Args:
+        file_path: 文件路径
+        chunker: 分块器，为None时逐句切分
+    
+    Returns:
+        (文本列表, 位置列表)；逐句切分时位置列表为None，分块时为每块的
+        {"start", "end", "sentences": [[起始位置, 结束位置], ...]}，位置为原文中的字符偏移
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        if chunker is None:
+            return chunk_text_into_sentences(f), None
+        chunks = chunker.chunk(f)
+    spans = [{"start": chunk.start, "end": chunk.end, "sentences": [list(span) for span in chunk.sentences]}
+             for chunk in chunks]
+    return [chunk.text for chunk in chunks], spans
 
 def process_sentence(sentence, template, models):
     """处理单个句子"""
@@ -77,32 +105,240 @@ def process_sentence(sentence, template, models):
         "results": results
     }
 
-def process_file(file_path, models, output_dir, template_name):
-    """处理单个文件"""
-    try:
-        # 读取政策文本
-        with open(file_path, 'r', encoding='utf-8') as f:
-            policy_text = f.read().strip()
+class FileJob:
+    """
+    单个文件的分析任务，收集各句子各模型的结果
+    
+    流式输出时每个句子的所有模型完成后立即写出并释放该句结果，否则在文件全部完成后统一保存
+    """
+
+    def __init__(self, file_path, sentences, models, output_dir, template_name, journal=None,
+                 stream=False, finalize=True, on_finish=None, spans=None):
+        self.file_path = file_path
+        self.file_key = os.path.abspath(file_path)
+        self.filename = os.path.splitext(os.path.basename(file_path))[0]
+        self.output_dir = output_dir
+        self.template_name = template_name
+        self.models = list(models)
+        self.sentence_results = [{"sentence": sentence, "results": {}} for sentence in sentences]
+        for entry, span in zip(self.sentence_results, spans or ()):
+            entry["span"] = span
+        self.remaining = len(sentences) * len(models)
+        self.journal = journal
+        self.finalize = finalize
+        self.on_finish = on_finish
+        self.writer = None
+        if stream:
+            template_output_dir = os.path.join(output_dir, template_name) if template_name else output_dir
+            self.writer = StreamingResultWriter(template_output_dir, self.filename)
+        self.lock = threading.Lock()
+
+    def record(self, sentence_index, model_name, result, replayed=False):
+        """
+        记录一个句子在一个模型上的结果，当文件的所有任务完成时保存结果
         
-        # 将政策文本分割成句子
-        sentences = chunk_text_into_sentences(policy_text)
-        logger.info(f"将文本分割为 {len(sentences)} 个句子")
+        同一句子同一模型只记录第一次的结果；新完成的成功结果会写入进度日志
+        """
+        with self.lock:
+            entry = self.sentence_results[sentence_index]
+            results = entry["results"]
+            if entry.get("written") or model_name in results:
+                return
+            results[model_name] = result
+            self.remaining -= 1
+            finished = self.remaining == 0
+            if self.writer is not None and len(results) == len(self.models):
+                self.writer.write_sentence(sentence_index, entry["sentence"], {
+                    m: format_model_result(results[m]) for m in self.models
+                }, entry.get("span"))
+                entry["results"] = {}
+                entry["written"] = True
+        if self.journal is not None and not replayed and result.get("status") == "success":
+            self.journal.append(self.file_key, sentence_index, entry["sentence"], model_name, result)
+        if finished:
+            self.finish()
+
+    def finish(self):
+        if self.writer is None:
+            save_results(self.sentence_results, self.filename, self.output_dir, self.template_name)
+        else:
+            self.writer.close(finalize=self.finalize)
+            logger.info(f"所有句子分析结果已写入 {self.writer.all_path}")
+        logger.info(f"文件 {self.file_path} 处理完成")
+        if self.on_finish is not None:
+            self.on_finish(self.file_path, len(self.sentence_results))
+
+def submit_sentences(file_id, items, models, template_name, scheduler, record):
+    """
+    逐句提交任务
+    
+    Args:
+        file_id: 文件标识
+        items: (句子索引, 句子)列表
+        models: 模型列表
+        template_name: 模板名称
+        scheduler: 调度器
+        record: 结果记录函数，参数为(句子索引, 模型名称, 结果)
+    """
+    template = TEMPLATES[template_name]
+    
+    def on_result(task, result):
+        if result["status"] == "success":
+            result["prompt"] = task.prompt
+        record(task.sentence_index, task.model_name, result)
+    
+    # 按句子顺序提交任务，待处理任务达到上限时在此阻塞；同一句子的所有模型共享一个截止时间
+    for index, sentence in items:
+        prompt = template.format(policy_text=sentence)
+        deadline = scheduler.new_deadline()
+        for model_name in models:
+            scheduler.submit(ModelTask(file_id, index, model_name, prompt, template_name, deadline), on_result)
+
+def submit_packed_batches(file_id, items, models, template_name, scheduler, packer, record):
+    """
+    以多句打包的方式提交任务
+    
+    各模型轮流取下一批句子，批大小由打包器根据该模型最近的解析情况决定；
+    解析缺失的句子使用单句模板单独重试
+    """
+    pending = {model_name: list(items) for model_name in models}
+    
+    def submit_single(model_name, index, sentence, block=True):
+        if block:
+            submit_sentences(file_id, [(index, sentence)], [model_name], template_name, scheduler, record)
+            return
+        prompt = TEMPLATES[template_name].format(policy_text=sentence)
+        scheduler.submit(ModelTask(file_id, index, model_name, prompt, template_name, scheduler.new_deadline()),
+                         lambda task, result: record(task.sentence_index, task.model_name, result), block=False)
+    
+    def on_packed_result(batch, task, result):
+        if result["status"] != "success":
+            for index, _ in batch:
+                record(index, task.model_name, dict(result))
+            return
+        
+        lines = split_packed_response(result["content"], len(batch))
+        missing = [(index, sentence) for (index, sentence), line in zip(batch, lines) if line is None]
+        packer.record(task.model_name, len(batch), len(missing))
+        for (index, _), line in zip(batch, lines):
+            if line is not None:
+                record(index, task.model_name, {
+                    "content": line,
+                    "time": result["time"],
+                    "status": "success",
+                    "prompt": task.prompt,
+                    "packed": len(batch)
+                })
+        for index, sentence in missing:
+            submit_single(task.model_name, index, sentence, block=False)
+    
+    while any(pending.values()):
+        for model_name in models:
+            model_items = pending[model_name]
+            if not model_items:
+                continue
+            batch = packer.next_batch(model_name, model_items)
+            del model_items[:len(batch)]
+            if len(batch) == 1:
+                submit_single(model_name, *batch[0])
+                continue
+            prompt = render_packed_prompt(template_name, [sentence for _, sentence in batch])
+            indices = tuple(index for index, _ in batch)
+            scheduler.submit(ModelTask(file_id, indices, model_name, prompt, packed_template_key(template_name),
+                                       scheduler.new_deadline()),
+                             lambda task, result, batch=batch: on_packed_result(batch, task, result))
+
+def process_file(file_path, models, output_dir, template_name, scheduler=None, packer=None,
+                 deduplicator=None, journal=None, stream=False, finalize=True, on_finish=None, cascade=None,
+                 quorum=None, chunker=None, prefilter=None):
+    """
+    处理单个文件
+    
+    将文件中每个句子与每个模型组成任务提交给调度器，不等待结果返回；
+    如果未提供调度器，则创建临时调度器并等待该文件处理完成。
+    提供打包器且模板支持打包时，多个句子合并为一次调用；
+    提供去重器时，整个运行中重复出现的句子只调用一次，结果分发给所有出现位置；
+    提供进度日志时，每个完成的结果立即落盘，日志中已有的结果不再调用模型；
+    流式输出时每个句子完成后立即追加到JSONL文件，finalize为True时结束后再生成汇总JSON；
+    on_finish在文件全部完成后以(文件路径, 句子数)调用，用于汇总进度；
+    提供级联调用时models应为[CASCADE_MODEL]，每个句子按级联逐级调用模型；
+    提供法定数时，每个句子的七个要素达到法定数后不再等待其余模型，这些模型标记为跳过；
+    提供分块器时，同一条款内相邻的短句合并为一个单元调用模型，结果中记录该单元在原文中的位置；
+    提供预筛选器时，与住房政策无关的句子不调用模型，各模型直接记为不相关
+    """
+    if scheduler is None:
+        with AnalysisScheduler(llm_service) as local_scheduler:
+            return process_file(file_path, models, output_dir, template_name,
+                                local_scheduler, packer, deduplicator, journal, stream, finalize, on_finish,
+                                cascade, quorum, chunker, prefilter)
+    
+    try:
+        # 逐块读取政策文本并分割成句子（或按条款合并的块）
+        sentences, spans = read_file_units(file_path, chunker)
+        if spans is None:
+            logger.info(f"将文本分割为 {len(sentences)} 个句子")
+        else:
+            sentence_count = sum(len(span["sentences"]) for span in spans)
+            logger.info(f"将文本的 {sentence_count} 个句子按条款合并为 {len(sentences)} 个块")
         
-        # 获取选定的模板
-        template = TEMPLATES[template_name]
+        job = FileJob(file_path, sentences, models, output_dir, template_name, journal, stream, finalize,
+                      on_finish, spans)
+        if job.remaining == 0:
+            job.finish()
+            return True
         
-        # 处理每个句子，获取结果
-        sentence_results = []
+        # 按待调用的模型组合对句子分组；正常情况下只有一组，恢复运行时部分句子只缺少部分模型
+        groups = {}
+        keys = {}
         for i, sentence in enumerate(sentences):
-            logger.info(f"处理第 {i+1}/{len(sentences)} 个句子")
-            result = process_sentence(sentence, template, models)
-            sentence_results.append(result)
+            if prefilter is not None:
+                result = prefilter.check(sentence, len(models))
+                if result is not None:
+                    # 合成的结果不写入进度日志，恢复运行时重新判断
+                    for model_name in models:
+                        job.record(i, model_name, dict(result), replayed=True)
+                    continue
+            
+            replayed = journal.replay(job.file_key, i, sentence, models) if journal is not None else {}
+            for model_name, result in replayed.items():
+                job.record(i, model_name, result, replayed=True)
+            
+            if deduplicator is not None:
+                key, dispatch = deduplicator.register(template_name, sentence, i, job.record, models)
+                for model_name, result in replayed.items():
+                    deduplicator.resolve(key, model_name, result)
+                if not dispatch:
+                    continue
+                keys[i] = key
+            else:
+                dispatch = models
+            
+            missing = tuple(m for m in dispatch if m not in replayed)
+            if missing:
+                groups.setdefault(missing, []).append((i, sentence))
         
-        # 获取文件名（不含扩展名）
-        filename = os.path.splitext(os.path.basename(file_path))[0]
+        if deduplicator is None:
+            record = job.record
+        else:
+            record = lambda index, model_name, result: deduplicator.resolve(keys[index], model_name, result)
         
-        # 保存结果
-        save_results(sentence_results, filename, output_dir, template_name)
+        dispatched = sum(len(items) for items in groups.values())
+        if dispatched < len(sentences):
+            logger.info(f"预筛选、去重和恢复后需要调用模型的句子: {dispatched}/{len(sentences)}")
+        
+        for group_models, items in groups.items():
+            template = TEMPLATES[template_name]
+            if cascade is not None:
+                cascade.submit(scheduler, job.filename, items, lambda s: template.format(policy_text=s),
+                               template_name, record)
+            elif quorum is not None:
+                quorum.submit(scheduler, job.filename, items, lambda s: template.format(policy_text=s),
+                              list(group_models), template_name, record)
+            elif packer is not None and template_name in PACKED_TEMPLATES:
+                submit_packed_batches(job.filename, items, list(group_models), template_name,
+                                      scheduler, packer, record)
+            else:
+                submit_sentences(job.filename, items, list(group_models), template_name, scheduler, record)
         
         return True
     except Exception as e:
@@ -151,20 +387,13 @@ def save_results(sentence_results, filename, output_dir, template_name=None):
             "text": sentence,
             "models": {}
         }
+        if "span" in sentence_result:
+            sentence_entry["span"] = sentence_result["span"]
         
         # 处理每个模型的结果
         for model_name, result in sentence_result["results"].items():
             # 解析结果并添加到句子条目中
-            if "content" in result and result["status"] == "success":
-                content = result["content"]
-                # 检测是否是housing模板的输出格式
-                if isinstance(content, str) and "policy_object:" in content and "policy_stage:" in content:
-                    parsed_content = parse_housing_elements(content)
-                    sentence_entry["models"][model_name] = parsed_content
-                else:
-                    sentence_entry["models"][model_name] = content
-            else:
-                sentence_entry["models"][model_name] = {"error": result.get("error", "未知错误")}
+            sentence_entry["models"][model_name] = format_model_result(result)
         
         # 添加句子条目到汇总结果
         combined_results["sentences"].append(sentence_entry)
@@ -177,6 +406,292 @@ def save_results(sentence_results, filename, output_dir, template_name=None):
     
     logger.info(f"所有句子分析结果已保存到 {all_output_file}")
 
+def collect_input_files(input_arg, input_directory):
+    """根据--input参数（文件、目录或通配符）或默认输入目录收集待处理的文件"""
+    if input_arg:
+        if '*' in input_arg:
+            return [f for f in glob.glob(input_arg) if os.path.isfile(f)]
+        if os.path.isfile(input_arg):
+            return [input_arg]
+        if os.path.isdir(input_arg):
+            return [os.path.join(input_arg, f) for f in os.listdir(input_arg)
+                    if os.path.isfile(os.path.join(input_arg, f)) and f.endswith((".txt", ".json", ".md"))]
+        return []
+    
+    return [os.path.join(input_directory, f) for f in os.listdir(input_directory)
+            if f.endswith((".txt", ".json", ".md"))]
+
+def parse_provider_limits(value):
+    """解析形如 alicloud=8,baidu=2 的服务商并发上限参数"""
+    limits = {}
+    if value:
+        for item in value.split(','):
+            provider, _, limit = item.partition('=')
+            limits[provider.strip()] = int(limit)
+    return limits
+
+def create_prefilter(template_name, args):
+    """按--prefilter参数创建预筛选器，未开启或模板不支持时返回None"""
+    if not args.prefilter:
+        return None
+    if template_name not in PREFILTER_TEMPLATES:
+        logger.warning(f"模板 {template_name} 不支持相关性预筛选，所有句子都将调用模型")
+        return None
+    logger.info(f"相关性预筛选: 得分低于 {args.prefilter} 的句子不调用模型")
+    return HousingPrefilter(args.prefilter)
+
+def run_files(input_files, run_models, output_directory, template_name, args, journal_path, replay,
+              shared_limits=None, on_file_done=None):
+    """
+    在当前进程中处理一组文件
+    
+    Args:
+        input_files: 文件路径列表
+        run_models: 模型列表
+        output_directory: 输出目录
+        template_name: 模板名称
+        args: 命令行参数
+        journal_path: 进度日志路径
+        replay: 是否读取进度日志中已完成的结果
+        shared_limits: 跨进程共享的并发信号量，单进程运行时为None
+        on_file_done: 文件完成时以(文件路径, 句子数)调用
+    
+    Returns:
+        统计段落名称 -> 统计字典
+    """
+    if args.cache != 'bypass':
+        llm_service.response_cache = ResponseCache(args.cache_dir, mode=args.cache,
+                                                   max_size_mb=args.cache_max_size_mb,
+                                                   max_age_days=args.cache_max_age_days)
+    
+    if args.hedge:
+        llm_service.hedging = HedgePolicy()
+    llm_service.streaming = args.stream
+    # 按历史运行报告中的输出长度分布调整各模板的max_tokens
+    if OUTPUT_BUDGET_CONFIG["auto_tune"]:
+        llm_service.output_budget = OutputBudget.from_history(output_directory)
+    
+    cascade = None
+    if args.cascade:
+        if template_name in CASCADE_TEMPLATES:
+            cascade = Cascade()
+            run_models = [CASCADE_MODEL]
+            logger.info(f"级联调用: {' -> '.join(cascade.tiers)}，校验模型: {cascade.verifier}")
+        else:
+            logger.warning(f"模板 {template_name} 不支持级联调用，将按模型列表调用")
+    
+    quorum = None
+    if args.quorum and cascade is not None:
+        logger.warning("级联调用模式下不使用法定数提前结束")
+    elif args.quorum:
+        if template_name not in QUORUM_TEMPLATES:
+            logger.warning(f"模板 {template_name} 不支持法定数提前结束，将等待所有模型")
+        elif args.quorum > len(run_models):
+            logger.warning(f"法定数 {args.quorum} 大于模型数 {len(run_models)}，将等待所有模型")
+        else:
+            quorum = Quorum(args.quorum)
+            logger.info(f"法定数提前结束: {quorum.size}/{len(run_models)} 个模型的七个要素一致时完成句子")
+    
+    packer = None
+    if args.pack > 1 and cascade is not None:
+        logger.warning("级联调用模式下不使用多句打包")
+    elif args.pack > 1 and quorum is not None:
+        logger.warning("法定数提前结束模式下不使用多句打包")
+    elif args.pack > 1:
+        if template_name in PACKED_TEMPLATES:
+            packer = AdaptivePacker(max_k=args.pack)
+        else:
+            logger.warning(f"模板 {template_name} 不支持多句打包，将逐句调用")
+    
+    chunker = ClauseChunker(max_chars=args.chunk) if args.chunk else None
+    prefilter = create_prefilter(template_name, args)
+    deduplicator = None if args.no_dedup else SentenceDeduplicator()
+    journal = ProgressJournal(journal_path, replay=replay)
+    
+    # 所有文件共享一个调度器，文件之间不再互相等待
+    scheduler = AnalysisScheduler(llm_service,
+                                  global_limit=args.concurrency,
+                                  provider_limits=parse_provider_limits(args.provider_concurrency),
+                                  shared_limits=shared_limits,
+                                  sentence_deadline=args.sentence_deadline)
+    with scheduler:
+        for file_path in input_files:
+            logger.info(f"处理文件: {file_path}")
+            process_file(file_path, run_models, output_directory, template_name,
+                         scheduler, packer, deduplicator, journal,
+                         stream=args.output_format == 'jsonl', finalize=not args.no_finalize,
+                         on_finish=on_file_done, cascade=cascade, quorum=quorum, chunker=chunker,
+                         prefilter=prefilter)
+    journal.close()
+    
+    sections = {
+        "调度统计": dict(scheduler.stats),
+        "进度日志": {"path": journal.path, **journal.stats}
+    }
+    if chunker is not None:
+        sections["分块统计"] = chunker.stats()
+    if prefilter is not None:
+        sections["预筛选统计"] = prefilter.stats()
+    if deduplicator is not None:
+        sections["去重统计"] = deduplicator.stats(len(run_models))
+    if packer is not None:
+        sections["打包统计"] = packer.stats
+    if cascade is not None:
+        sections["级联统计"] = cascade.stats()
+    if quorum is not None:
+        sections["法定数统计"] = quorum.stats()
+    sections["合并请求统计"] = llm_service.single_flight.stats()
+    sections["限流统计"] = llm_service.rate_limiter.stats()
+    sections["熔断统计"] = llm_service.circuit_breakers.stats()
+    if llm_service.hedging is not None:
+        sections["对冲统计"] = llm_service.hedging.snapshot()
+    if llm_service.streaming:
+        sections["流式统计"] = llm_service.stream_stats.snapshot()
+    sections[OUTPUT_LENGTH_SECTION] = llm_service.output_budget.snapshot()
+    if llm_service.response_cache is not None:
+        sections["响应缓存统计"] = dict(llm_service.response_cache.stats)
+        llm_service.response_cache.close()
+    return sections
+
+def run_batch(input_files, run_models, output_directory, template_name, args):
+    """
+    批处理模式：将所有文件所有句子的调用写成服务商的批处理任务提交，等待任务完成后按常规格式保存结果
+    
+    批处理文件和任务清单保存在模板目录的batch子目录下；不支持批处理接口的模型（本地ChatGLM、百度文心等）
+    记为失败，需要时改用常规模式调用；等待超时时仍有请求未返回的文件不保存，之后用--batch-resume指定任务清单继续等待
+    
+    Returns:
+        统计段落名称 -> 统计字典
+    """
+    template = TEMPLATES[template_name]
+    config = dict(BATCH_CONFIG, poll_interval=args.batch_poll_interval)
+    if args.batch_resume:
+        batch_run = BatchRun.resume(llm_service, args.batch_resume, config)
+    else:
+        work_dir = os.path.abspath(os.path.join(output_directory, template_name, "batch",
+                                                time.strftime("%Y%m%d_%H%M%S")))
+        batch_run = BatchRun(llm_service, work_dir, config, context={
+            "template": template_name, "models": list(run_models),
+            "input_files": [os.path.abspath(path) for path in input_files],
+            "chunk": args.chunk, "prefilter": args.prefilter
+        })
+    work_dir = batch_run.work_dir
+    chunker = ClauseChunker(max_chars=args.chunk) if args.chunk else None
+    prefilter = create_prefilter(template_name, args)
+    unsupported = set()
+    files = []
+    for file_index, file_path in enumerate(input_files):
+        try:
+            sentences, spans = read_file_units(file_path, chunker)
+        except Exception as e:
+            logger.error(f"读取文件 {file_path} 时出错: {str(e)}")
+            continue
+        sentence_results = [{"sentence": sentence, "results": {}} for sentence in sentences]
+        for entry, span in zip(sentence_results, spans or ()):
+            entry["span"] = span
+        for index, sentence in enumerate(sentences):
+            filtered = prefilter.check(sentence, len(run_models)) if prefilter is not None else None
+            if filtered is not None:
+                sentence_results[index]["results"] = {model_name: dict(filtered) for model_name in run_models}
+                continue
+            prompt = template.format(policy_text=sentence)
+            for model_name in run_models:
+                if not batch_run.add(batch_custom_id(file_index, index, model_name), model_name, prompt,
+                                     template_name):
+                    unsupported.add(model_name)
+                    sentence_results[index]["results"][model_name] = {
+                        "content": None, "time": 0.0, "status": "error",
+                        "error": f"模型 {model_name} 不支持批处理接口"
+                    }
+        files.append((file_index, file_path, sentence_results))
+    if unsupported:
+        logger.warning(f"以下模型不支持批处理接口，结果记为失败: {sorted(unsupported)}")
+    
+    results = {}
+    if batch_run.resumed:
+        results = batch_run.wait()
+    elif batch_run.stats["requests"]:
+        logger.info(f"提交 {batch_run.stats['requests']} 个批处理请求，文件保存在 {work_dir}")
+        batch_run.submit()
+        results = batch_run.wait()
+    pending = batch_run.pending_ids()
+    
+    for file_index, file_path, sentence_results in files:
+        if any(batch_custom_id(file_index, index, model_name) in pending
+               for index in range(len(sentence_results)) for model_name in run_models):
+            logger.warning(f"文件 {file_path} 仍有批处理请求未返回，暂不保存结果；"
+                           f"稍后使用 --batch-resume {batch_run.manifest_path} 继续等待")
+            continue
+        for index, entry in enumerate(sentence_results):
+            for model_name in run_models:
+                if model_name in entry["results"]:
+                    continue
+                result = results.get(batch_custom_id(file_index, index, model_name)) or {
+                    "content": None, "time": 0.0, "status": "error", "error": "批处理任务未返回结果"
+                }
+                if result["status"] == "success":
+                    result["prompt"] = template.format(policy_text=entry["sentence"])
+                entry["results"][model_name] = result
+        save_results(sentence_results, os.path.splitext(os.path.basename(file_path))[0], output_directory,
+                     template_name)
+        logger.info(f"文件 {file_path} 处理完成")
+    sections = {"批处理统计": {"work_dir": work_dir, **batch_run.stats}}
+    if chunker is not None:
+        sections["分块统计"] = chunker.stats()
+    if prefilter is not None:
+        sections["预筛选统计"] = prefilter.stats()
+    return sections
+
+def run_shard(shard, run_models, output_directory, template_name, args, journal_path, replay):
+    """工作进程入口：处理一个文件分片，返回该进程的统计信息"""
+    return run_files(shard, run_models, output_directory, template_name, args, journal_path, replay,
+                     shared_limits=worker_shared_limits(), on_file_done=report_file_done)
+
+def run_workers(input_files, run_models, output_directory, template_name, args, journal_path, replay, progress):
+    """
+    将文件分片到多个工作进程并行处理
+    
+    各服务商的并发上限和全局并发上限由所有工作进程共享，工作进程的日志和进度汇总到主进程；
+    句子去重只在同一工作进程的文件之间生效
+    
+    Returns:
+        合并后的统计段落
+    """
+    shards = shard_files(input_files, args.workers)
+    provider_limits = dict(PROVIDER_CONCURRENCY)
+    provider_limits.update(parse_provider_limits(args.provider_concurrency))
+    shared_limits = create_shared_limits(args.concurrency, provider_limits)
+    log_queue = MP_CONTEXT.Queue()
+    progress_queue = MP_CONTEXT.Queue()
+    
+    logger.info(f"使用 {len(shards)} 个工作进程，各分片文件数: {[len(shard) for shard in shards]}")
+    listener = start_log_listener(log_queue)
+    progress.watch(progress_queue)
+    shard_sections = []
+    try:
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=MP_CONTEXT, initializer=init_worker,
+                                 initargs=(log_queue, progress_queue, shared_limits)) as pool:
+            futures = {pool.submit(run_shard, shard, run_models, output_directory, template_name,
+                                   args, journal_path, replay): shard for shard in shards}
+            for future in as_completed(futures):
+                try:
+                    shard_sections.append(future.result())
+                except Exception as e:
+                    logger.error(f"工作进程处理 {len(futures[future])} 个文件时出错: {str(e)}")
+    finally:
+        progress.stop(progress_queue)
+        listener.stop()
+    
+    sections = {}
+    for name in dict.fromkeys(name for result in shard_sections for name in result):
+        sections[name] = merge_stats([result[name] for result in shard_sections if name in result])
+    if "去重统计" in sections:
+        dedup = sections["去重统计"]
+        total = dedup["total_sentences"]
+        dedup["dedup_ratio"] = round(1 - dedup["unique_sentences"] / total, 4) if total else 0.0
+    sections["多进程统计"] = {"workers": len(shards), "completed_shards": len(shard_sections)}
+    return sections
+
 def main():
     # 解析命令行参数
     parser = argparse.ArgumentParser(description='政策文档分析工具')
@@ -189,6 +704,54 @@ def main():
                        help='指定输入文件或目录路径，支持通配符')
     parser.add_argument('--models', '-m',
                        help='指定要使用的模型，用逗号分隔')
+    parser.add_argument('--concurrency', type=int, default=GLOBAL_CONCURRENCY,
+                       help='全局最大并发模型调用数')
+    parser.add_argument('--provider-concurrency',
+                       help='各服务商的最大并发调用数，如 alicloud=8,baidu=2')
+    parser.add_argument('--sentence-deadline', type=float, default=TIMEOUT_CONFIG["sentence_deadline"],
+                       help='每个句子从提交到所有模型完成的截止时间（秒），超时的调用会被取消；0表示不限制')
+    parser.add_argument('--hedge', action='store_true',
+                       help='开启对冲请求：调用超过模型近期p95延迟仍未返回时再发送一个请求，先返回的结果生效')
+    parser.add_argument('--stream', action='store_true',
+                       help='以流式方式调用阿里云兼容模式和OpenAI模型，housing类模板的七个要素完整后提前结束')
+    parser.add_argument('--cascade', action='store_true',
+                       help='级联调用（仅housing类模板）：先用便宜模型回答，输出不合格或与校验模型不一致时再升级到更大的模型')
+    parser.add_argument('--quorum', type=int, nargs='?', const=QUORUM_CONFIG["size"], default=0,
+                       help=f'法定数提前结束（仅housing类模板）：七个要素都有至少N个模型一致时不再等待其余模型，'
+                            f'未返回的调用标记为skipped by quorum；不带数值时N为{QUORUM_CONFIG["size"]}，0表示关闭')
+    parser.add_argument('--batch', action='store_true',
+                       help='批处理模式：所有调用写成批处理JSONL文件经服务商批处理接口提交，轮询完成后保存结果（不要求实时返回的离线运行）')
+    parser.add_argument('--batch-resume', metavar='MANIFEST',
+                       help='恢复此前提交的批处理运行：按任务清单（batch目录下的manifest.json）继续轮询并保存结果，'
+                            '输入文件、模型、模板和分块/预筛选设置都取自清单')
+    parser.add_argument('--batch-poll-interval', type=float, default=BATCH_CONFIG["poll_interval"],
+                       help='批处理模式下轮询任务状态的间隔（秒）')
+    parser.add_argument('--pack', type=int, default=0,
+                       help='多句打包模式下每次调用最多包含的句子数（仅housing类模板），0表示不打包')
+    parser.add_argument('--chunk', type=int, nargs='?', const=CHUNKING_CONFIG["max_chars"], default=0,
+                       help=f'按条款分块：识别第X章/第X条/（一）等编号，同一条款内相邻的短句合并为一次调用，'
+                            f'每块不超过N个字符；不带数值时N为{CHUNKING_CONFIG["max_chars"]}，0表示逐句调用')
+    parser.add_argument('--prefilter', type=float, nargs='?', const=PREFILTER_CONFIG["threshold"], default=0,
+                       help=f'相关性预筛选（仅housing类模板）：按住房政策关键词为句子打分，得分低于阈值的句子不调用模型，'
+                            f'直接记为不相关；不带数值时阈值为{PREFILTER_CONFIG["threshold"]}，0表示关闭')
+    parser.add_argument('--no-dedup', action='store_true',
+                       help='关闭句子去重，重复出现的句子也分别调用模型')
+    parser.add_argument('--resume', nargs='?', const='latest',
+                       help='从进度日志恢复中断的运行，只调用缺失的部分；不带参数时使用最新的日志，也可指定日志文件路径')
+    parser.add_argument('--output-format', choices=['jsonl', 'json'], default='jsonl',
+                       help='jsonl: 每个句子完成后立即追加到JSONL文件；json: 文件全部完成后一次性保存')
+    parser.add_argument('--no-finalize', action='store_true',
+                       help='jsonl模式下不在文件完成后生成汇总JSON文件')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='工作进程数，大于1时将输入文件分片到多个进程并行处理，并发上限由所有进程共享')
+    parser.add_argument('--cache', choices=CACHE_MODES, default='readwrite',
+                       help='响应缓存模式：readwrite读写，readonly只读，refresh忽略已有缓存并重新写入，bypass不使用缓存')
+    parser.add_argument('--cache-dir',
+                       help='响应缓存目录，默认为data/cache')
+    parser.add_argument('--cache-max-size-mb', type=float,
+                       help='响应缓存大小上限（MB）')
+    parser.add_argument('--cache-max-age-days', type=float,
+                       help='响应缓存条目的最长保留天数')
     args = parser.parse_args()
     
     # 设置输入和输出目录
@@ -197,6 +760,7 @@ def main():
     
     # 使用命令行指定的模板 - 移到这里，确保所有分支都能访问
     template_name = args.template
+    run_models = [m.strip() for m in args.models.split(',') if m.strip()] if args.models else models
     
     # 确保输入目录存在
     if not os.path.exists(input_directory):
@@ -205,52 +769,50 @@ def main():
         logger.warning("请在输入目录中添加文本文件后重新运行")
         return
     
-    # 获取输入文件列表
-    if args.input:
-        # 如果提供了input参数，直接使用该路径
-        if '*' in args.input:
-            input_files = glob.glob(args.input)
-            # 处理每个匹配的文件
-            for file_path in input_files:
-                if os.path.isfile(file_path):
-                    logger.info(f"处理文件: {file_path}")
-                    process_file(file_path, models, output_directory, template_name)
-        else:
-            # 如果是单个文件或目录
-            if os.path.isfile(args.input):
-                process_file(args.input, models, output_directory, template_name)
-            elif os.path.isdir(args.input):
-                # 如果是目录，处理目录中的所有文件
-                for f in os.listdir(args.input):
-                    file_path = os.path.join(args.input, f)
-                    if os.path.isfile(file_path) and f.endswith((".txt", ".json", ".md")):
-                        logger.info(f"处理文件: {file_path}")
-                        process_file(file_path, models, output_directory, template_name)
-        logger.info("所有文件处理完成!")
-        return
+    # 获取输入文件列表；恢复批处理运行时输入文件、模型、模板和分块/预筛选设置都取自任务清单
+    if args.batch_resume:
+        context = load_manifest(args.batch_resume)["context"]
+        template_name, run_models, input_files = context["template"], context["models"], context["input_files"]
+        args.chunk, args.prefilter = context["chunk"], context["prefilter"]
     else:
-        # 使用默认输入目录
-        input_files = [f for f in os.listdir(input_directory) 
-                      if f.endswith((".txt", ".json", ".md"))]
-        # 原有处理逻辑...
-    
+        input_files = collect_input_files(args.input, input_directory)
     if not input_files:
-        logger.warning(f"没有找到输入文件。请在 {input_directory} 目录中添加文件后重新运行。")
+        logger.warning(f"没有找到输入文件。请在 {args.input or input_directory} 中添加文件后重新运行。")
         return
     
     logger.info(f"找到 {len(input_files)} 个输入文件")
+    report = RunReport()
+    progress = ProgressMonitor(len(input_files), logger)
     
-    # 使用命令行指定的模板
-    template_name = args.template
-    
-    # 依次处理每个输入文件，使用process_file函数
-    for input_file in input_files:
-        file_path = os.path.join(input_directory, input_file)
-        logger.info(f"处理文件: {input_file}")
+    if args.batch or args.batch_resume:
+        sections = run_batch(input_files, run_models, output_directory, template_name, args)
+    else:
+        # 每次运行写入一个进度日志，恢复运行时继续追加到原日志
+        journal_dir = os.path.join(output_directory, template_name, "journal")
+        journal_path = None
+        if args.resume == 'latest':
+            journal_path = ProgressJournal.latest_path(journal_dir)
+            if journal_path is None:
+                logger.warning(f"在 {journal_dir} 中没有找到进度日志，将重新开始运行")
+        elif args.resume:
+            journal_path = args.resume
+        replay = bool(journal_path)
+        journal_path = journal_path or ProgressJournal.new_path(journal_dir)
+        logger.info(f"进度日志: {journal_path}")
         
-        # 使用process_file替代原来的逻辑
-        process_file(file_path, models, output_directory, template_name)
+        if args.workers > 1 and len(input_files) > 1:
+            sections = run_workers(input_files, run_models, output_directory, template_name, args,
+                                   journal_path, replay, progress)
+        else:
+            sections = run_files(input_files, run_models, output_directory, template_name, args,
+                                 journal_path, replay, on_file_done=progress.file_done)
     
+    # 汇总运行报告
+    for name, data in sections.items():
+        report.add_section(name, data)
+    report.log_summary(logger)
+    report_file = report.save(os.path.join(output_directory, template_name))
+    logger.info(f"运行报告已保存到 {report_file}")
     logger.info("所有文件处理完成!")
 
 if __name__ == "__main__":
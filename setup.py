@@ -9,6 +9,7 @@ setup(
     install_requires=[
         "Flask>=2.0.1",
         "requests>=2.28.1",
+        "aiohttp>=3.8.0",
         "pandas>=1.3.3",
         "openai>=1.0.0",
         "pytest>=6.2.4",
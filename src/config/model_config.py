@@ -22,8 +22,10 @@ API_KEYS = {
 MODEL_ENDPOINTS = {
     "model_chatglm": os.getenv("CHATGLM_URL", "http://0.0.0.0:8002/chat"),
     "model_alicloud": "https://dashscope.aliyuncs.com/api/v1",  # 修改为标准API端点
+    "model_alicloud_compatible": os.getenv("ALICLOUD_COMPATIBLE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"),
+    "model_alicloud_native": "https://dashscope.aliyuncs.com/api/v1/services/foundation-models/text-generation/generation",
     "model_baidu": "https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat",
-    "model_openai": "https://api.openai.com/v1"
+    "model_openai": os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 }
 
 # 可用模型配置
@@ -75,3 +77,205 @@ DEFAULT_MODELS = [model for model in DEFAULT_MODELS if model is not None]
 # 如果没有可用模型，则至少使用qwen-turbo
 if not DEFAULT_MODELS:
     DEFAULT_MODELS = ["qwen-turbo"]
+
+# HTTP连接池配置（每个服务商、每个主机一个长连接池）
+# pool_connections: 缓存的主机连接池数量；pool_maxsize: 每个主机保持的最大连接数
+# async_limit: 异步调用时每个服务商同时打开的最大连接数
+HTTP_POOL_CONFIG = {
+    "default": {"pool_connections": 4, "pool_maxsize": 16, "async_limit": 200},
+    "alicloud": {"pool_connections": 4, "pool_maxsize": 32},
+    "baidu": {"pool_connections": 2, "pool_maxsize": 16},
+    "local": {"pool_connections": 1, "pool_maxsize": 8},
+}
+
+# 并发控制配置
+# GLOBAL_CONCURRENCY: 整个运行期间同时进行的模型调用总数上限
+# PROVIDER_CONCURRENCY: 各服务商同时进行的模型调用数上限
+GLOBAL_CONCURRENCY = 16
+PROVIDER_CONCURRENCY = {
+    "alicloud": 12,
+    "baidu": 4,
+    "openai": 4,
+    "local": 2,
+}
+
+# 模型响应缓存配置
+RESPONSE_CACHE_CONFIG = {
+    "cache_dir": ROOT_DIR / "data" / "cache",
+    "max_size_mb": 1024,
+    "max_age_days": 30,
+    "evict_interval": 500,  # 每写入多少条检查一次淘汰
+    "touch_batch": 200,     # 命中时的访问时间先记在内存中，累计多少条后批量写回
+}
+
+# 百度访问令牌缓存配置
+# refresh_margin: 距过期多少秒时提前刷新；default_expires_in: 接口未返回expires_in时假定的有效期（秒）
+BAIDU_TOKEN_CONFIG = {
+    "cache_dir": ROOT_DIR / "data" / "cache",
+    "refresh_margin": 300,
+    "default_expires_in": 86400,
+    "timeout": 10,
+}
+
+# 分布式任务队列配置
+# visibility_timeout: 租约时长（秒），工作进程每隔三分之一租约时长续约一次
+# poll_interval: 队列暂时为空时工作进程的轮询间隔（秒）
+TASK_QUEUE_CONFIG = {
+    "db_path": ROOT_DIR / "data" / "queue" / "tasks.sqlite3",
+    "visibility_timeout": 300,
+    "max_attempts": 3,
+    "poll_interval": 5,
+    # 失败任务放回队列后的等待时间（秒），按已尝试次数指数增长，不超过max_retry_delay
+    "retry_delay": 30,
+    "max_retry_delay": 600,
+}
+
+# 自适应限流配置（请按账号的实际配额调整）
+# requests_per_minute / tokens_per_minute: 每分钟请求数和token数上限，None表示不限制
+# initial_concurrency / min_concurrency / max_concurrency: AIMD并发上限的初始值和取值范围
+# 服务商和模型两级限制同时生效，models中未列出的模型只使用default
+RATE_LIMIT_CONFIG = {
+    "default": {
+        "requests_per_minute": None,
+        "tokens_per_minute": None,
+        "initial_concurrency": 4,
+        "min_concurrency": 1,
+        "max_concurrency": 32,
+    },
+    "providers": {
+        "alicloud": {"requests_per_minute": 1200, "tokens_per_minute": 1000000},
+        "baidu": {"requests_per_minute": 300, "tokens_per_minute": 300000, "max_concurrency": 8},
+        "openai": {"requests_per_minute": 500, "tokens_per_minute": 200000},
+        "local": {"initial_concurrency": 2, "max_concurrency": 4},
+    },
+    "models": {
+        "qwen-max": {"requests_per_minute": 600, "tokens_per_minute": 500000},
+        "qwen-plus": {"requests_per_minute": 1200, "tokens_per_minute": 1000000},
+        "qwen-turbo": {"requests_per_minute": 1200, "tokens_per_minute": 1000000},
+    },
+    "expected_output_tokens": 300,  # 预扣的输出token数，调用完成后按实际用量修正
+    "additive_increase": 1.0,  # 每个成功窗口并发上限增加的数量
+    "multiplicative_decrease": 0.5,  # 被限流时并发上限乘以的系数
+    "decrease_cooldown": 2.0,  # 两次减小并发上限之间的最短间隔（秒）
+    "throttle_backoff": 1.0,  # 被限流但没有Retry-After时暂停发送的秒数
+}
+
+# 模型熔断配置
+# failure_threshold: 连续失败多少次（每次已包含内部重试）后打开熔断器
+# reset_timeout: 熔断器打开后多少秒放行一个半开探测请求
+CIRCUIT_BREAKER_CONFIG = {
+    "failure_threshold": 3,
+    "reset_timeout": 60,
+}
+
+# 超时与截止时间配置（秒）
+# connect / read: 每次尝试的连接超时和读取超时；total: 一次调用包括所有重试在内的总预算
+# 模型配置覆盖服务商配置，服务商配置覆盖默认配置
+# sentence_deadline: 一个句子（或一个打包批次）从提交到所有模型完成的截止时间，超时的调用会被取消
+TIMEOUT_CONFIG = {
+    "default": {"connect": 5, "read": 60, "total": 180},
+    "providers": {
+        "local": {"read": 120, "total": 300},
+    },
+    "models": {
+        "qwen-max": {"read": 90, "total": 240},
+        "deepseek-r1": {"read": 180, "total": 360},
+    },
+    "sentence_deadline": 600,
+}
+
+# 对冲请求配置（通过run_analysis.py的--hedge开启）
+# percentile: 调用超过该模型近期成功延迟的这一百分位仍未返回时发送对冲请求
+# window / min_samples: 延迟统计的样本窗口大小和开始对冲所需的最少样本数
+# min_delay: 发送对冲请求前的最短等待秒数
+# max_hedge_ratio: 对冲请求数占调用数的比例上限
+# max_workers: 执行对冲调用的线程数上限
+# models: 可为模型指定对冲请求使用的备用端点（覆盖model_endpoints中的同名键）和备用API密钥的环境变量名
+HEDGE_CONFIG = {
+    "percentile": 95,
+    "window": 200,
+    "min_samples": 20,
+    "min_delay": 1.0,
+    "max_hedge_ratio": 0.1,
+    "max_workers": 64,
+    "models": {
+        # "qwen-max": {"endpoints": {"model_alicloud_compatible": "https://..."}, "api_key_env": "API_KEY_HEDGE"},
+    },
+}
+
+# 输出token预算自动调整配置（各模板的默认预算见prompt_templates.py中的TEMPLATE_OUTPUT_BUDGETS）
+# 每次运行按(模板, 模型)记录输出长度的分布并写入运行报告的“输出长度统计”，
+# 下次运行读取最近history_reports份报告，样本数不少于min_samples时将预算设为
+# percentile分位的输出长度乘以headroom（不小于min_tokens）
+# bucket_size: 输出长度分布的分桶宽度（字符数，约等于token数）
+OUTPUT_BUDGET_CONFIG = {
+    "auto_tune": True,
+    "percentile": 99,
+    "headroom": 1.5,
+    "min_samples": 50,
+    "min_tokens": 64,
+    "bucket_size": 16,
+    "history_reports": 20,
+}
+
+# 级联调用配置（通过run_analysis.py的--cascade开启，仅housing类模板）
+# tiers: 由便宜到昂贵的模型，每个句子先调用第一个模型，输出不合格时依次升级到下一个模型
+# verifier: 与第一个模型同时调用的另一个便宜模型，二者在agreement_fields上不一致时也升级，None表示不校验
+CASCADE_CONFIG = {
+    "tiers": ["qwen-turbo", "qwen-plus", "qwen-max"],
+    "verifier": "qwen2-7b-instruct",
+    "agreement_fields": ["policy_object", "policy_stage", "policy_type"],
+}
+
+# 法定数提前结束配置（通过run_analysis.py的--quorum开启，仅housing类模板）
+# 同一句子的多个模型中，fields中的每个要素都有至少size个模型取值相同时，该句子立即完成，
+# 尚未返回的调用被取消，在输出中标记为"skipped by quorum"
+QUORUM_CONFIG = {
+    "size": 2,
+    "fields": ["policy_object", "policy_stage", "policy_type", "policy_tool",
+               "policy_geo_scope", "policy_target_scope", "tool_parameter"],
+}
+
+# 批处理模式配置（通过run_analysis.py的--batch开启，用于不要求实时返回的离线批量运行）
+# 所有提示词写成OpenAI兼容格式的批处理JSONL文件，经服务商的批处理接口（阿里云百炼、OpenAI）提交后轮询结果
+# max_requests_per_file: 单个批处理文件的请求数上限，超过时拆分为多个批处理任务
+# poll_interval: 轮询任务状态的间隔（秒）；timeout: 最长等待时间（秒），超过后停止等待，任务编号保存在清单文件中
+BATCH_CONFIG = {
+    "completion_window": "24h",
+    "max_requests_per_file": 50000,
+    "poll_interval": 60,
+    "timeout": 86400,
+}
+
+# 按条款分块配置（通过run_analysis.py的--chunk开启）
+# 相邻的短句合并为一次调用，合并后的字符数不超过max_chars、估算token数不超过max_tokens（None表示不限制）；
+# boundary_levels中层级的条款标记（chapter: 第X章/节，article: 第X条，item: （一）、一、、1.）总是开始新块
+CHUNKING_CONFIG = {
+    "max_chars": 300,
+    "max_tokens": None,
+    "boundary_levels": ["chapter", "article"],
+}
+
+# 相关性预筛选配置（通过run_analysis.py的--prefilter开启，仅housing类模板）
+# 句子得分为其中出现的不同关键词的权重之和：policy_object的写法（HOUSING_POLICY_OBJECTS）计object_weight，
+# 政策工具关键词（HOUSING_TOOL_KEYWORDS）计tool_weight，泛化关键词（HOUSING_CONTEXT_KEYWORDS）计context_weight；
+# 得分低于threshold的句子不调用模型，直接记为不相关
+PREFILTER_CONFIG = {
+    "threshold": 1.0,
+    "object_weight": 1.0,
+    "tool_weight": 1.0,
+    "context_weight": 0.5,
+}
+
+# 枚举要素归一化配置：模型回答中没有出现任何标准写法时，按字符ngram的Dice系数模糊匹配最接近的写法，
+# 得分低于min_score时视为无法归一化
+VOCABULARY_CONFIG = {
+    "ngram": 2,
+    "min_score": 0.5,
+}
+
+# 句子去重配置：没有进行中调用的唯一句子最多保留max_completed个（按最近使用淘汰），
+# 供之后的文件中重复出现的句子直接复用；尚在等待结果的句子不受此限制
+DEDUP_CONFIG = {
+    "max_completed": 50000,
+}
@@ -561,5 +561,103 @@ TEMPLATES = {
     "housing_with_examples":HOUSING_ELEMENTS_TEMPLATE_WITH_MORE_EXAMPLES
 }
 
+# 各模板单次调用的输出token预算（max_tokens）
+# 实际使用的值还会按历史运行中观察到的输出长度自动调整（见OUTPUT_BUDGET_CONFIG），且不超过模型本身的上限
+TEMPLATE_OUTPUT_BUDGETS = {
+    "standard": 2000,
+    "elements": 1500,
+    "public": 2000,
+    "housing": 300,
+    "housing_with_examples": 300
+}
+
+# 指定模型在各模板下的输出token预算，优先于自动调整的结果
+# deepseek-r1等推理模型在给出答案前可能输出较长的内容，需要更多余量
+MODEL_OUTPUT_BUDGET_OVERRIDES = {
+    "deepseek-r1": {"housing": 1000, "housing_with_examples": 1000}
+}
+
+# housing模板中要求从固定选项中选择的要素及其可选值（含不确定时的取值）
+HOUSING_ELEMENT_CHOICES = {
+    "policy_stage": ["需求端", "供给端", "环境端", "未确定"],
+    "policy_type": ["强制性", "激励型", "信息型", "能力建设型", "未确定"]
+}
+
+# housing模板中policy_object的可选值（与模板中列出的顺序和写法一致）及其在文本中的常见写法
+# 用于本地的相关性预筛选和模型答案的归一化
+HOUSING_POLICY_OBJECTS = {
+    "公共租赁住房（公租房）": ["公共租赁住房", "公租房"],
+    "廉租房": ["廉租房", "廉租住房"],
+    "保障性租赁住房": ["保障性租赁住房", "保租房"],
+    "共有产权房": ["共有产权房", "共有产权住房"],
+    "经济适用房": ["经济适用房", "经济适用住房", "经适房"],
+    "企业自建福利房（企业人才住房）": ["企业自建福利房", "企业人才住房"],
+    "人才房": ["人才房", "人才住房", "人才公寓"],
+    "配租房": ["配租房"],
+    "配售房": ["配售房"],
+    "商品房（新房、二手房）": ["商品房", "商品住房", "新房", "二手房", "新建商品房"],
+    "限价商品房（两限房）": ["限价商品房", "限价房", "两限房"],
+    "安居型商品房": ["安居型商品房", "安居房"],
+    "限竞房": ["限竞房"],
+    "小产权房": ["小产权房"],
+    "商改住/工改住公寓": ["商改住", "工改住"],
+    "公有住房（房改房）": ["公有住房", "房改房", "公房"],
+    "棚改/旧改安置房": ["棚改安置房", "旧改安置房", "安置房", "棚改", "旧改"],
+    "回迁房": ["回迁房"],
+    "长租公寓": ["长租公寓"],
+    "集体土地租赁住房": ["集体土地租赁住房", "集体租赁住房"],
+}
+
+# policy_tool相关的关键词，取自housing模板的要素定义和policy_tool示例，用于本地的相关性预筛选
+HOUSING_TOOL_KEYWORDS = [
+    "租金", "公积金", "购房", "房贷", "首付", "限购", "限售", "预售", "供地", "房地产", "房企", "开发企业",
+    "物业", "装修", "配建", "网签", "中介", "经纪", "房源", "拆迁", "征收", "棚户区", "老旧小区", "加装电梯",
+    "套型", "户型", "闲置费", "绿色建筑", "装配式", "群租", "转租", "城市更新", "安居",
+]
+
+# 单独出现时不足以说明句子与住房政策相关的泛化关键词（如落款中的"住房和城乡建设局"），预筛选时权重较低
+HOUSING_CONTEXT_KEYWORDS = ["住房", "房屋", "租赁", "补贴", "保障", "土地", "用地", "产权", "业主", "无障碍", "落户"]
+
 # 默认使用的模板
-DEFAULT_TEMPLATE = "standard"
\ No newline at end of file
+DEFAULT_TEMPLATE = "standard"
+
+# 多句打包模式的输出要求，替换单句模板末尾的"政策文本"部分
+PACKED_HOUSING_INSTRUCTIONS = """以下共有{sentence_count}条带编号的政策文本，请对每一条分别提取"七步要素"。
+每条输出一行，行首写对应编号，格式如下：
+[1] policy_object: ...; policy_stage: ...; policy_type: ...; policy_tool: ...; policy_geo_scope: ...; policy_target_scope: ...; tool_parameter: ...;
+[2] policy_object: ...; policy_stage: ...; policy_type: ...; policy_tool: ...; policy_geo_scope: ...; policy_target_scope: ...; tool_parameter: ...;
+必须按编号顺序输出全部{sentence_count}行，不要合并或遗漏，不要有其他说明文本。
+
+政策文本：
+{policy_text}
+"""
+
+def _make_packed_template(template):
+    """保留单句模板的要素定义和示例，将末尾的政策文本部分替换为多句打包的输出要求"""
+    return template[:template.rindex("政策文本：")] + PACKED_HOUSING_INSTRUCTIONS
+
+def packed_template_key(template_name):
+    """多句打包调用使用的模板名称，与单句调用区分输出预算、流式提前结束条件和缓存"""
+    return f"{template_name}_packed"
+
+# 支持多句打包的模板
+PACKED_TEMPLATES = {
+    "housing": _make_packed_template(HOUSING_ELEMENTS_TEMPLATE),
+    "housing_with_examples": _make_packed_template(HOUSING_ELEMENTS_TEMPLATE_WITH_MORE_EXAMPLES)
+}
+
+# 多句打包配置
+# max_k: 每次调用最多打包的句子数；max_input_tokens: 打包句子的估算token总数上限
+# output_tokens_per_item: 每条结果预估的输出token数；max_output_tokens: 单次调用预估输出token上限
+# failure_threshold: 单批解析失败比例超过该值时将K减半
+PACKING_CONFIG = {
+    "max_k": 10,
+    "max_input_tokens": 1500,
+    "output_tokens_per_item": 80,
+    "max_output_tokens": 1500,
+    "failure_threshold": 0.2,
+}
+
+# 多句打包调用的输出预算与打包器的单次输出上限一致
+TEMPLATE_OUTPUT_BUDGETS.update({packed_template_key(name): PACKING_CONFIG["max_output_tokens"]
+                                for name in PACKED_TEMPLATES})
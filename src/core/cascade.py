@@ -0,0 +1,163 @@
+"""
+级联调用
+每个句子先由便宜的模型回答，输出无法解析、取值不在模板选项中或与另一个便宜模型不一致时，
+才依次升级到更大的模型；整个级联的最终结果以虚拟模型名"cascade"记录
+"""
+
+import time
+import logging
+import threading
+
+from src.config.model_config import CASCADE_CONFIG
+from src.core.scheduler import ModelTask
+from src.utils.response_parser import parse_housing_elements, housing_output_problems
+
+logger = logging.getLogger(__name__)
+
+# 级联结果在输出和进度日志中使用的模型名称
+CASCADE_MODEL = "cascade"
+
+# 支持级联调用的模板（输出为housing七要素格式）
+CASCADE_TEMPLATES = ("housing", "housing_with_examples")
+
+
+def disagreement(first, second, fields):
+    """返回两个housing输出取值不同的要素"""
+    first, second = parse_housing_elements(first), parse_housing_elements(second)
+    return [field for field in fields if first[field].strip() != second[field].strip()]
+
+
+class SentenceCascade:
+    """单个句子的级联状态，由Cascade.start创建"""
+
+    def __init__(self, cascade):
+        self.cascade = cascade
+        self.tier = 0
+        self.answers = {}
+        self.escalations = []
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def first_models(self):
+        """第一轮同时调用的模型：第一级模型和校验模型"""
+        models = [self.cascade.tiers[0]]
+        if self.cascade.verifier:
+            models.append(self.cascade.verifier)
+        return models
+
+    def _problems(self, result):
+        if result.get("status") != "success":
+            return ["call_failed"]
+        return housing_output_problems(result.get("content"))
+
+    def on_result(self, model_name, result):
+        """
+        处理一个模型的结果
+
+        Returns:
+            (下一步要调用的模型或None, 最终结果或None)；二者都为None表示还在等待第一轮的其他结果
+        """
+        with self._lock:
+            self.answers[model_name] = result
+            current = self.cascade.tiers[self.tier]
+            if self.tier == 0 and any(m not in self.answers for m in self.first_models()):
+                return None, None
+
+            answer = self.answers[current]
+            problems = self._problems(answer)
+            verified = None
+            if self.tier == 0 and self.cascade.verifier:
+                check = self.answers[self.cascade.verifier]
+                if not problems and not self._problems(check):
+                    different = disagreement(answer["content"], check["content"],
+                                             self.cascade.config["agreement_fields"])
+                    verified = not different
+                    if different:
+                        problems = [f"disagree_{field}" for field in different]
+
+            if problems and self.tier < len(self.cascade.tiers) - 1:
+                self.escalations.append({"model": current, "reasons": problems})
+                self.cascade.record_escalation(self.tier, current, problems)
+                self.tier += 1
+                return self.cascade.tiers[self.tier], None
+
+            self.cascade.record_accept(self.tier, current, verified)
+            final = dict(answer)
+            final["time"] = time.time() - self.started_at
+            final["cascade"] = {"model": current, "tier": self.tier, "escalations": self.escalations}
+            return None, final
+
+
+class Cascade:
+    def __init__(self, config=None):
+        """
+        初始化级联调用
+
+        Args:
+            config: 级联配置，结构同CASCADE_CONFIG，如果为None则使用CASCADE_CONFIG
+        """
+        self.config = config or CASCADE_CONFIG
+        self.tiers = list(self.config["tiers"])
+        self.verifier = self.config.get("verifier")
+        self._lock = threading.Lock()
+        self._tier_stats = {f"{i}:{model_name}": {"accepted": 0, "escalated": 0}
+                            for i, model_name in enumerate(self.tiers)}
+        self._reasons = {}
+        self._verifier_stats = {"agreed": 0, "disagreed": 0}
+
+    def start(self):
+        return SentenceCascade(self)
+
+    def record_escalation(self, tier, model_name, reasons):
+        with self._lock:
+            self._tier_stats[f"{tier}:{model_name}"]["escalated"] += 1
+            for reason in reasons:
+                self._reasons[reason] = self._reasons.get(reason, 0) + 1
+            if any(reason.startswith("disagree_") for reason in reasons):
+                self._verifier_stats["disagreed"] += 1
+
+    def record_accept(self, tier, model_name, verified):
+        with self._lock:
+            self._tier_stats[f"{tier}:{model_name}"]["accepted"] += 1
+            if verified:
+                self._verifier_stats["agreed"] += 1
+
+    def submit(self, scheduler, file_id, items, prompts, template_name, record):
+        """
+        以级联方式提交句子
+
+        Args:
+            scheduler: 调度器
+            file_id: 文件标识
+            items: (句子索引, 句子)列表
+            prompts: 句子 -> 提示词的函数
+            template_name: 模板名称
+            record: 结果记录函数，参数为(句子索引, 模型名称, 结果)，最终结果的模型名称为CASCADE_MODEL
+        """
+        def make_callback(state, prompt, deadline):
+            def on_result(task, result):
+                next_model, final = state.on_result(task.model_name, result)
+                if next_model is not None:
+                    scheduler.submit(ModelTask(file_id, task.sentence_index, next_model, prompt, template_name,
+                                               deadline), on_result, block=False)
+                elif final is not None:
+                    if final["status"] == "success":
+                        final["prompt"] = prompt
+                    record(task.sentence_index, CASCADE_MODEL, final)
+            return on_result
+
+        for index, sentence in items:
+            prompt = prompts(sentence)
+            # 级联的所有调用共享同一个句子截止时间
+            deadline = scheduler.new_deadline()
+            state = self.start()
+            on_result = make_callback(state, prompt, deadline)
+            for model_name in state.first_models():
+                scheduler.submit(ModelTask(file_id, index, model_name, prompt, template_name, deadline), on_result)
+
+    def stats(self):
+        """返回各级模型的采纳数和升级数、各升级原因的次数以及校验模型一致/不一致的次数"""
+        with self._lock:
+            return {"tiers": {name: dict(stats) for name, stats in self._tier_stats.items()},
+                    "reasons": dict(self._reasons),
+                    "verifier": dict(self._verifier_stats)}
@@ -0,0 +1,138 @@
+"""
+按条款分块
+政策文件按"第X章 / 第X条 / （一）"等编号组织，只按句末标点分句会产生大量很短的片段，每个片段都要调用所有模型。
+分块器识别章、条编号和列表标记，在不跨越条款边界的前提下把相邻的短句合并到字符数或token预算以内，
+并保留每个块中各句子在原文中的位置
+"""
+
+import re
+import threading
+from collections import namedtuple
+
+from src.config.model_config import CHUNKING_CONFIG
+from src.core.packing import estimate_tokens
+from src.utils.text_processing import iter_sentence_spans, SENTENCE_CHUNK_SIZE
+
+# 中文数字和阿拉伯数字编号
+_CN_NUMERALS = "一二三四五六七八九十百千零〇两"
+_DIGITS = "0-9０-９"
+# 行首的条款标记，按层级分组：章（含编、节）、条、项（（一）、一、、1.、（1））
+_MARKER_PATTERNS = {
+    "chapter": rf"第[{_CN_NUMERALS}{_DIGITS}]+[编章节]",
+    "article": rf"第[{_CN_NUMERALS}{_DIGITS}]+条",
+    "item": rf"[（(][{_CN_NUMERALS}{_DIGITS}]+[)）]|[{_CN_NUMERALS}]+、|[{_DIGITS}]+[.．、](?![{_DIGITS}])",
+}
+_MARKER_PATTERN = re.compile("|".join(f"(?P<{level}>{pattern})" for level, pattern in _MARKER_PATTERNS.items()))
+# 句子内部换行后紧跟条款标记的位置（如没有句末标点的标题行），在此处把句子继续拆开
+_LINE_MARKER_PATTERN = re.compile(rf"\n[ \t　]*(?={_MARKER_PATTERN.pattern})")
+# 完整条款的结尾标点，以条款标记开头且不以这些标点结尾的片段视为标题或引导语（如"第一章 总则"、"申请条件如下："）
+_CLAUSE_END_MARKS = tuple("。！？；;")
+
+LEVELS = tuple(_MARKER_PATTERNS)
+
+# text: 块文本；start/end: 块在原文中的字符偏移；sentences: 块中各句子在原文中的(起始位置, 结束位置)
+Chunk = namedtuple("Chunk", ["text", "start", "end", "sentences"])
+
+
+def clause_level(text):
+    """返回文本开头的条款标记层级（chapter/article/item），没有标记时返回None"""
+    match = _MARKER_PATTERN.match(text)
+    return match.lastgroup if match else None
+
+
+def iter_segments(source, chunk_size=SENTENCE_CHUNK_SIZE):
+    """
+    按句末标点分句，并在句子内部行首的条款标记处继续拆分
+
+    Yields:
+        (起始位置, 结束位置, 文本, 条款层级)，层级为None表示不以条款标记开头
+    """
+    for start, end, sentence in iter_sentence_spans(source, chunk_size):
+        offset = 0
+        for match in _LINE_MARKER_PATTERN.finditer(sentence):
+            piece = sentence[offset:match.start()].rstrip()
+            if piece:
+                yield start + offset, start + offset + len(piece), piece, clause_level(piece)
+            offset = match.end()
+        piece = sentence[offset:]
+        yield start + offset, end, piece, clause_level(piece)
+
+
+class ClauseChunker:
+    def __init__(self, max_chars=None, max_tokens=None, config=None):
+        """
+        初始化分块器
+
+        Args:
+            max_chars: 每块最多字符数，如果为None则使用CHUNKING_CONFIG中的max_chars
+            max_tokens: 每块最多token数（按packing.estimate_tokens估算），如果为None则使用CHUNKING_CONFIG中的max_tokens
+            config: 分块配置，覆盖CHUNKING_CONFIG中的对应项
+        """
+        self.config = dict(CHUNKING_CONFIG)
+        self.config.update(config or {})
+        self.max_chars = max_chars or self.config["max_chars"]
+        self.max_tokens = max_tokens or self.config["max_tokens"]
+        self.boundary_levels = set(self.config["boundary_levels"])
+        self._lock = threading.Lock()
+        self._stats = {"files": 0, "sentences": 0, "chunks": 0, "boundary_splits": 0, "budget_splits": 0}
+
+    def _fits(self, text):
+        if self.max_chars and len(text) > self.max_chars:
+            return False
+        return not (self.max_tokens and estimate_tokens(text) > self.max_tokens)
+
+    def iter_chunks(self, source, chunk_size=SENTENCE_CHUNK_SIZE):
+        """
+        将文本分块
+
+        新的条款（boundary_levels中的层级）总是开始新块，但只有标题或引导语的块与其后的第一个条款合并；
+        合并后超出预算时开始新块，单个超出预算的句子独立成块，不再拆分
+
+        Args:
+            source: 字符串、文本文件对象、二进制文件对象或mmap
+            chunk_size: 每次读取的大小
+
+        Yields:
+            Chunk
+        """
+        segments = []
+        text = ""
+        headings_only = True
+        stats = {"files": 1, "sentences": 0, "chunks": 0, "boundary_splits": 0, "budget_splits": 0}
+        for start, end, piece, level in iter_segments(source, chunk_size):
+            stats["sentences"] += 1
+            if segments:
+                # 结构标记前换行，保留原文的条款层次
+                joined = text + ("\n" if level else "") + piece
+                split = None
+                if level in self.boundary_levels and not headings_only:
+                    split = "boundary_splits"
+                elif not self._fits(joined):
+                    split = "budget_splits"
+                if split is not None:
+                    stats[split] += 1
+                    stats["chunks"] += 1
+                    yield Chunk(text, segments[0][0], segments[-1][1], segments)
+                    segments = []
+            if segments:
+                text = joined
+            else:
+                text = piece
+                headings_only = True
+            segments.append((start, end))
+            headings_only = headings_only and level is not None and not piece.endswith(_CLAUSE_END_MARKS)
+        if segments:
+            stats["chunks"] += 1
+            yield Chunk(text, segments[0][0], segments[-1][1], segments)
+        with self._lock:
+            for key, value in stats.items():
+                self._stats[key] += value
+
+    def chunk(self, source, chunk_size=SENTENCE_CHUNK_SIZE):
+        """返回文本的所有块"""
+        return list(self.iter_chunks(source, chunk_size))
+
+    def stats(self):
+        """返回分块统计：文件数、分句数、块数，以及因条款边界和预算开始新块的次数"""
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,122 @@
+"""
+句子去重
+在整个运行范围内按归一化文本合并重复句子，每个唯一句子对每个模型只调用一次，结果分发给所有出现位置
+
+每个出现位置取得它需要的所有模型的结果后即被释放，不再持有其记录函数（及其所属的文件任务）；
+只有成功（或跳过）的结果会被复用，出错的结果只分发给当时等待的出现位置，之后再出现时重新调用该模型；
+没有进行中调用的唯一句子只保留最近使用的DEDUP_CONFIG["max_completed"]个，供之后重复出现时直接复用
+"""
+
+import threading
+from collections import OrderedDict
+
+from src.config.model_config import DEDUP_CONFIG
+from src.utils.text_processing import normalize_sentence
+
+
+class _UniqueSentence:
+    def __init__(self, models):
+        self.models = list(models)
+        self.occurrences = []  # [记录函数, 句子索引, 尚未取得结果的模型集合]
+        self.results = {}      # 模型名称 -> 可复用的结果
+        self.in_flight = set()  # 已调用、尚未返回结果的模型
+
+    def complete(self):
+        return all(model_name in self.results for model_name in self.models)
+
+
+class SentenceDeduplicator:
+    def __init__(self, max_completed=None):
+        """
+        Args:
+            max_completed: 没有进行中调用的唯一句子最多保留的个数，如果为None则使用DEDUP_CONFIG中的配置
+        """
+        self.max_completed = max_completed or DEDUP_CONFIG["max_completed"]
+        self._entries = {}
+        self._completed = OrderedDict()  # 没有进行中调用的去重键，按最近使用排序
+        self._lock = threading.Lock()
+        self.total_sentences = 0
+        self.unique_sentences = 0
+        self.redispatched = 0
+        self.evicted = 0
+
+    def register(self, template_name, sentence, index, record, models):
+        """
+        登记一个句子的出现位置
+
+        Args:
+            template_name: 模板名称，不同模板的结果互不复用
+            sentence: 句子原文
+            index: 句子在所属文件中的索引
+            record: 结果记录函数，参数为(句子索引, 模型名称, 结果)
+            models: 该句子需要结果的模型，这些模型都返回后释放该出现位置
+
+        Returns:
+            (去重键, 需要由该出现位置调用的模型列表)；首次出现时为全部模型，
+            之前出错的模型需要重新调用，其余模型的结果已分发或等待分发
+        """
+        key = (template_name, normalize_sentence(sentence))
+        with self._lock:
+            self.total_sentences += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _UniqueSentence(models)
+                self.unique_sentences += 1
+                dispatch = list(entry.models)
+            else:
+                dispatch = [m for m in entry.models if m not in entry.results and m not in entry.in_flight]
+                self.redispatched += len(dispatch)
+            entry.in_flight.update(dispatch)
+            waiting = {m for m in entry.models if m not in entry.results}
+            if waiting:
+                entry.occurrences.append([record, index, waiting])
+                self._completed.pop(key, None)
+            elif key in self._completed:
+                self._completed.move_to_end(key)
+            ready = [(m, entry.results[m]) for m in entry.models if m in entry.results]
+        # 已经返回的模型结果直接分发给新的出现位置
+        for model_name, result in ready:
+            record(index, model_name, dict(result))
+        return key, dispatch
+
+    def resolve(self, key, model_name, result):
+        """记录唯一句子在某个模型上的结果，并分发给等待该模型结果的所有出现位置"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # 已完成并被淘汰的句子，登记时各出现位置已经取得结果
+                return
+            entry.in_flight.discard(model_name)
+            if result.get("status") != "error":
+                entry.results[model_name] = result
+            targets = []
+            for occurrence in entry.occurrences:
+                if model_name in occurrence[2]:
+                    occurrence[2].discard(model_name)
+                    targets.append((occurrence[0], occurrence[1]))
+            entry.occurrences = [occurrence for occurrence in entry.occurrences if occurrence[2]]
+            if not entry.in_flight and not entry.occurrences:
+                self._completed[key] = True
+                self._completed.move_to_end(key)
+                while len(self._completed) > self.max_completed:
+                    evicted, _ = self._completed.popitem(last=False)
+                    del self._entries[evicted]
+                    self.evicted += 1
+        for record, index in targets:
+            record(index, model_name, dict(result))
+
+    def stats(self, model_count=1):
+        """返回去重统计，包括去重比例和节省的调用数（扣除出错后重新调用的次数）"""
+        with self._lock:
+            unique = self.unique_sentences
+            total = self.total_sentences
+            redispatched = self.redispatched
+            evicted = self.evicted
+        return {
+            "total_sentences": total,
+            "unique_sentences": unique,
+            "dedup_ratio": round(1 - unique / total, 4) if total else 0.0,
+            "saved_calls": (total - unique) * model_count - redispatched,
+            "redispatched": redispatched,
+            "evicted": evicted
+        }
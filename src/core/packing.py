@@ -0,0 +1,92 @@
+"""
+多句打包
+将多个句子编号后放入同一个提示词，并根据token预算和解析失败情况为每个模型自适应调整每批句子数K
+"""
+
+import threading
+
+from src.config.prompt_templates import PACKED_TEMPLATES, PACKING_CONFIG
+from src.utils.response_parser import parse_packed_housing_elements
+
+
+def estimate_tokens(text):
+    """粗略估算文本的token数（中文约每字一个token）"""
+    return len(text)
+
+
+def render_packed_prompt(template_name, sentences):
+    """将句子编号后填入打包模板"""
+    numbered = "\n".join(f"[{i + 1}] {sentence}" for i, sentence in enumerate(sentences))
+    return PACKED_TEMPLATES[template_name].format(policy_text=numbered, sentence_count=len(sentences))
+
+
+def split_packed_response(content, count):
+    """将打包响应拆分为逐句结果，缺失或不完整的句子为None"""
+    return parse_packed_housing_elements(content, count)
+
+
+class AdaptivePacker:
+    def __init__(self, max_k=None, config=None):
+        """
+        初始化打包器
+
+        Args:
+            max_k: 每批最多句子数，如果为None则使用PACKING_CONFIG中的max_k
+            config: 打包配置，覆盖PACKING_CONFIG中的对应项
+        """
+        self.config = dict(PACKING_CONFIG)
+        self.config.update(config or {})
+        self.max_k = max(1, max_k or self.config["max_k"])
+        self._k = {}
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "packed_sentences": 0, "failed_items": 0}
+
+    def current_k(self, model_name):
+        """返回模型当前的K值"""
+        with self._lock:
+            return self._k.get(model_name, self.max_k)
+
+    def next_batch(self, model_name, items):
+        """
+        从待处理句子中取出下一批
+
+        Args:
+            model_name: 模型名称
+            items: (句子索引, 句子)列表，按顺序取用
+
+        Returns:
+            本批的(句子索引, 句子)列表，至少包含一个句子
+        """
+        k = self.current_k(model_name)
+        input_budget = self.config["max_input_tokens"]
+        output_limit = max(1, self.config["max_output_tokens"] // self.config["output_tokens_per_item"])
+
+        batch = []
+        used_tokens = 0
+        for index, sentence in items:
+            tokens = estimate_tokens(sentence)
+            if batch and (len(batch) >= min(k, output_limit) or used_tokens + tokens > input_budget):
+                break
+            batch.append((index, sentence))
+            used_tokens += tokens
+        return batch
+
+    def record(self, model_name, requested, failed):
+        """
+        记录一批的解析结果并调整K：失败比例超过阈值时减半，全部成功时加一
+
+        Args:
+            model_name: 模型名称
+            requested: 本批句子数
+            failed: 解析失败（需要重试）的句子数
+        """
+        with self._lock:
+            k = self._k.get(model_name, self.max_k)
+            if failed / max(requested, 1) > self.config["failure_threshold"]:
+                k = max(1, k // 2)
+            elif failed == 0 and requested >= k:
+                k = min(self.max_k, k + 1)
+            self._k[model_name] = k
+            self.stats["batches"] += 1
+            self.stats["packed_sentences"] += requested
+            self.stats["failed_items"] += failed
@@ -0,0 +1,155 @@
+"""
+相关性预筛选
+公文中的大部分句子（导语、落款、日期、抄送名单等）与住房政策要素无关，各模型都会回答"未匹配/未定义"。
+调用模型前先用housing模板中policy_object的各种写法和政策工具关键词构建的多模式自动机为句子打分，
+得分低于阈值的句子直接记为不相关，不再调用模型
+"""
+
+import json
+import threading
+
+from src.config.model_config import PREFILTER_CONFIG
+from src.config.prompt_templates import HOUSING_POLICY_OBJECTS, HOUSING_TOOL_KEYWORDS, HOUSING_CONTEXT_KEYWORDS
+from src.utils.aho_corasick import AhoCorasick
+
+# 支持预筛选的模板（输出为housing七要素格式）
+PREFILTER_TEMPLATES = ("housing", "housing_with_examples")
+
+# 不相关句子的合成答案，与模型回答"未匹配/未定义"时的格式一致
+NOT_RELEVANT_CONTENT = ("policy_object: 未匹配; policy_stage: 未确定; policy_type: 未确定; policy_tool: 未定义; "
+                        "policy_geo_scope: 未指定; policy_target_scope: 未指定; tool_parameter: 无")
+
+
+def is_relevant_answer(parsed):
+    """根据一个模型解析后的答案判断句子是否与住房政策相关：policy_object已匹配或policy_tool已定义"""
+    return (parsed.get("policy_object", "未提取") not in ("未匹配", "未提取")
+            or parsed.get("policy_tool", "未提取") not in ("未定义", "未提取"))
+
+
+class HousingPrefilter:
+    def __init__(self, threshold=None, config=None):
+        """
+        初始化预筛选器
+
+        Args:
+            threshold: 得分阈值，如果为None则使用PREFILTER_CONFIG中的threshold
+            config: 预筛选配置，覆盖PREFILTER_CONFIG中的对应项
+        """
+        self.config = dict(PREFILTER_CONFIG)
+        self.config.update(config or {})
+        self.threshold = self.config["threshold"] if threshold is None else threshold
+        self.automaton = AhoCorasick()
+        for keyword in HOUSING_CONTEXT_KEYWORDS:
+            self.automaton.add(keyword, self.config["context_weight"])
+        for keyword in HOUSING_TOOL_KEYWORDS:
+            self.automaton.add(keyword, self.config["tool_weight"])
+        for aliases in HOUSING_POLICY_OBJECTS.values():
+            for alias in aliases:
+                self.automaton.add(alias, self.config["object_weight"])
+        self.automaton.build()
+        self._lock = threading.Lock()
+        self._stats = {"sentences": 0, "filtered": 0, "skipped_calls": 0}
+
+    def score(self, sentence):
+        """
+        为句子打分
+
+        Returns:
+            (得分, 命中的关键词列表)，同一关键词多次出现只计一次
+        """
+        weights = {}
+        for start, end, weight in self.automaton.iter_matches(sentence):
+            weights[sentence[start:end]] = weight
+        return sum(weights.values()), list(weights)
+
+    def check(self, sentence, model_count=1):
+        """
+        判断句子是否需要调用模型，并计入统计
+
+        Args:
+            sentence: 句子原文
+            model_count: 该句子原本要调用的模型数，用于统计节省的调用数
+
+        Returns:
+            需要调用模型时返回None，否则返回不相关句子的合成结果
+        """
+        score, keywords = self.score(sentence)
+        relevant = score >= self.threshold
+        with self._lock:
+            self._stats["sentences"] += 1
+            if not relevant:
+                self._stats["filtered"] += 1
+                self._stats["skipped_calls"] += model_count
+        if relevant:
+            return None
+        return {
+            "content": NOT_RELEVANT_CONTENT,
+            "time": 0.0,
+            "status": "success",
+            "prefilter": {"score": score, "keywords": keywords}
+        }
+
+    def evaluate(self, samples):
+        """
+        在标注样本上评估预筛选效果，不计入运行统计
+
+        Args:
+            samples: (句子, 是否相关)的可迭代对象
+
+        Returns:
+            以"相关"为正类的precision、recall（相关句子被保留的比例）、f1，以及样本数和被筛掉的比例
+        """
+        counts = {"tp": 0, "fp": 0, "fn": 0, "tn": 0}
+        for sentence, relevant in samples:
+            kept = self.score(sentence)[0] >= self.threshold
+            counts[("t" if kept == relevant else "f") + ("p" if kept else "n")] += 1
+        total = sum(counts.values())
+        precision = counts["tp"] / (counts["tp"] + counts["fp"]) if counts["tp"] + counts["fp"] else 0.0
+        recall = counts["tp"] / (counts["tp"] + counts["fn"]) if counts["tp"] + counts["fn"] else 0.0
+        return {
+            "threshold": self.threshold,
+            "samples": total,
+            "relevant": counts["tp"] + counts["fn"],
+            "filtered_ratio": round((counts["fn"] + counts["tn"]) / total, 4) if total else 0.0,
+            "precision": round(precision, 4),
+            "recall": round(recall, 4),
+            "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+            **counts
+        }
+
+    def stats(self):
+        """返回预筛选统计：检查的句子数、判为不相关的句子数和因此省去的模型调用数"""
+        with self._lock:
+            return dict(self._stats)
+
+
+def labels_from_output(combined_results):
+    """
+    从已有运行的汇总结果（{filename}_sentences.json的内容）生成标注样本
+
+    任一模型的答案相关（policy_object已匹配或policy_tool已定义）时句子标为相关，
+    所有成功的模型都回答"未匹配/未定义"时标为不相关；没有成功答案或由预筛选合成的句子不作为样本
+
+    Yields:
+        (句子, 是否相关)
+    """
+    for entry in combined_results.get("sentences", []):
+        answers = [result for result in entry.get("models", {}).values()
+                   if isinstance(result, dict) and "policy_object" in result]
+        if not answers or any("prefilter" in answer for answer in answers):
+            continue
+        yield entry["text"], any(is_relevant_answer(answer) for answer in answers)
+
+
+def labels_from_jsonl(lines):
+    """
+    读取人工标注的样本，每行为{"text": 句子, "relevant": true/false}
+
+    Yields:
+        (句子, 是否相关)
+    """
+    for line in lines:
+        line = line.strip()
+        if line:
+            sample = json.loads(line)
+            yield sample["text"], bool(sample["relevant"])
@@ -0,0 +1,119 @@
+"""
+法定数提前结束
+同一句子同时调用多个模型时，七个要素都有足够多的模型取值一致后立即完成该句子，
+尚未返回的调用被取消并在输出中标记为"skipped by quorum"，慢模型不再拖住整个句子
+"""
+
+import time
+import logging
+import threading
+
+from src.config.model_config import QUORUM_CONFIG
+from src.core.scheduler import ModelTask
+from src.utils.response_parser import housing_quorum, QUORUM_SKIPPED
+
+logger = logging.getLogger(__name__)
+
+# 支持法定数提前结束的模板（输出为housing七要素格式）
+QUORUM_TEMPLATES = ("housing", "housing_with_examples")
+
+
+class SentenceQuorum:
+    """单个句子的投票状态，由Quorum.start创建"""
+
+    def __init__(self, quorum, models):
+        self.quorum = quorum
+        self.models = list(models)
+        self.answers = {}
+        self.decided = False
+        self.cancel_event = threading.Event()
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def on_result(self, model_name, result):
+        """
+        处理一个模型的结果
+
+        Returns:
+            需要记录的(模型名称, 结果)列表；达到法定数时包含其余模型的跳过标记，之后返回的结果不再记录
+        """
+        with self._lock:
+            if self.decided:
+                return []
+            self.answers[model_name] = result
+            records = [(model_name, result)]
+            outstanding = [m for m in self.models if m not in self.answers]
+            if not outstanding:
+                self.decided = True
+                self.quorum.record_sentence(early_exit=False, skipped=0)
+                return records
+            contents = [r.get("content") for r in self.answers.values() if r.get("status") == "success"]
+            if housing_quorum(contents, self.quorum.size, self.quorum.fields) is None:
+                return records
+            self.decided = True
+            self.cancel_event.set()
+        elapsed = time.time() - self.started_at
+        for other in outstanding:
+            records.append((other, {"content": None, "time": elapsed, "status": "skipped", "error": QUORUM_SKIPPED}))
+        self.quorum.record_sentence(early_exit=True, skipped=len(outstanding))
+        return records
+
+
+class Quorum:
+    def __init__(self, size=None, config=None):
+        """
+        初始化法定数提前结束
+
+        Args:
+            size: 法定数，如果为None则使用配置中的size
+            config: 结构同QUORUM_CONFIG，如果为None则使用QUORUM_CONFIG
+        """
+        self.config = config or QUORUM_CONFIG
+        self.size = size or self.config["size"]
+        self.fields = list(self.config["fields"])
+        self._lock = threading.Lock()
+        self._stats = {"sentences": 0, "early_exits": 0, "skipped_calls": 0}
+
+    def start(self, models):
+        return SentenceQuorum(self, models)
+
+    def record_sentence(self, early_exit, skipped):
+        with self._lock:
+            self._stats["sentences"] += 1
+            self._stats["early_exits"] += int(early_exit)
+            self._stats["skipped_calls"] += skipped
+
+    def submit(self, scheduler, file_id, items, prompts, models, template_name, record):
+        """
+        提交句子，每个句子的所有模型共享一个取消信号
+
+        Args:
+            scheduler: 调度器
+            file_id: 文件标识
+            items: (句子索引, 句子)列表
+            prompts: 句子 -> 提示词的函数
+            models: 模型列表
+            template_name: 模板名称
+            record: 结果记录函数，参数为(句子索引, 模型名称, 结果)
+        """
+        def make_callback(state):
+            def on_result(task, result):
+                if result["status"] == "success":
+                    result["prompt"] = task.prompt
+                for model_name, model_result in state.on_result(task.model_name, result):
+                    record(task.sentence_index, model_name, model_result)
+            return on_result
+
+        for index, sentence in items:
+            prompt = prompts(sentence)
+            deadline = scheduler.new_deadline()
+            state = self.start(models)
+            on_result = make_callback(state)
+            for model_name in models:
+                scheduler.submit(ModelTask(file_id, index, model_name, prompt, template_name, deadline,
+                                           state.cancel_event), on_result)
+
+    def stats(self):
+        """返回完成的句子数、提前结束的句子数和跳过的调用数"""
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,45 @@
+"""
+运行报告
+汇总一次分析运行中各组件的统计信息，输出到日志并保存为JSON文件
+"""
+
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RunReport:
+    def __init__(self):
+        self.started_at = time.time()
+        self.sections = {}
+
+    def add_section(self, name, data):
+        """添加或覆盖一个统计段落"""
+        self.sections[name] = data
+
+    def to_dict(self):
+        return {
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+            "elapsed_seconds": round(time.time() - self.started_at, 2),
+            **self.sections
+        }
+
+    def log_summary(self, log=None):
+        """将各统计段落逐条写入日志"""
+        log = log or logger
+        report = self.to_dict()
+        log.info(f"运行耗时: {report['elapsed_seconds']}秒")
+        for name, data in self.sections.items():
+            log.info(f"{name}: {data}")
+
+    def save(self, output_dir):
+        """保存报告到输出目录，返回文件路径"""
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(self.started_at))
+        report_file = os.path.join(output_dir, f"run_report_{timestamp}.json")
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+        return report_file
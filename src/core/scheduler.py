@@ -0,0 +1,179 @@
+"""
+全局任务调度器
+将(文件, 句子, 模型)任务放入有界的工作线程池，按服务商和全局两级限制并发
+"""
+
+import time
+import logging
+import threading
+from contextlib import ExitStack
+from collections import namedtuple, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config.model_config import GLOBAL_CONCURRENCY, PROVIDER_CONCURRENCY
+from src.services.llm_service import get_model_provider
+
+logger = logging.getLogger(__name__)
+
+# 单个模型调用任务，deadline为截止时间（time.monotonic()时间）或SentenceDeadline，None表示只受模型自身的超时预算约束；
+# cancel_event为取消信号(threading.Event)，被设置后尚未开始的任务直接跳过，进行中的调用不再重试
+ModelTask = namedtuple("ModelTask", ["file_id", "sentence_index", "model_name", "prompt", "template_name", "deadline",
+                                     "cancel_event"],
+                       defaults=(None, None, None))
+
+
+class SentenceDeadline:
+    """
+    句子截止时间，同一句子（或打包批次、级联）的所有模型任务共享
+
+    从第一个任务开始执行时计时，提交任务时因待处理任务达到上限而阻塞的时间和在线程池中排队的时间不计入
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._expires_at = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """开始计时（只有第一次调用生效），返回截止时间（time.monotonic()时间）"""
+        with self._lock:
+            if self._expires_at is None:
+                self._expires_at = time.monotonic() + self.seconds
+            return self._expires_at
+
+
+class AnalysisScheduler:
+    def __init__(self, llm_service, global_limit=None, provider_limits=None, max_pending=None,
+                 shared_limits=None, sentence_deadline=None):
+        """
+        初始化调度器
+
+        Args:
+            llm_service: 共享的LLMService实例
+            global_limit: 全局并发调用上限，如果为None则使用GLOBAL_CONCURRENCY
+            provider_limits: 各服务商并发上限，覆盖PROVIDER_CONCURRENCY中的对应项
+            max_pending: 已提交但未完成的任务上限，达到上限时submit阻塞，默认为全局上限的4倍
+            shared_limits: 跨进程共享的信号量字典（键为服务商名称或"global"），多进程运行时所有进程合计不超过该上限
+            sentence_deadline: 句子截止时间（秒），由new_deadline()用于生成任务的deadline，None或0表示不限制
+        """
+        self.llm_service = llm_service
+        self.global_limit = global_limit or GLOBAL_CONCURRENCY
+        self.provider_limits = dict(PROVIDER_CONCURRENCY)
+        self.provider_limits.update(provider_limits or {})
+        self.max_pending = max_pending or self.global_limit * 4
+        self.shared_limits = shared_limits or {}
+        self.sentence_deadline = sentence_deadline
+
+        self._global_slots = threading.BoundedSemaphore(self.global_limit)
+        self._pending_slots = threading.BoundedSemaphore(self.max_pending)
+        self._executors = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        self.stats = defaultdict(int)
+
+    def _get_executor(self, provider):
+        """获取服务商专用的线程池，线程数即该服务商的并发上限"""
+        with self._lock:
+            executor = self._executors.get(provider)
+            if executor is None:
+                workers = min(self.provider_limits.get(provider, self.global_limit), self.global_limit)
+                executor = ThreadPoolExecutor(max_workers=max(1, workers),
+                                              thread_name_prefix=f"llm-{provider}")
+                self._executors[provider] = executor
+        return executor
+
+    def new_deadline(self):
+        """为一个句子（或一个打包批次）的所有模型任务生成共同的截止时间，第一个任务开始执行时才开始计时"""
+        if not self.sentence_deadline:
+            return None
+        return SentenceDeadline(self.sentence_deadline)
+
+    def submit(self, task, callback, block=True):
+        """
+        提交一个模型调用任务
+
+        Args:
+            task: ModelTask实例
+            callback: 任务完成后在工作线程中调用的函数，参数为(task, result)
+            block: 待处理任务达到上限时是否阻塞；在回调中提交后续任务（如重试）时应传入False，避免死锁
+        """
+        if block:
+            self._pending_slots.acquire()
+        provider = get_model_provider(task.model_name) or "unknown"
+        with self._lock:
+            self._in_flight += 1
+            self.stats["submitted"] += 1
+        try:
+            self._get_executor(provider).submit(self._run, task, provider, callback, block)
+        except Exception:
+            self._finish(provider, "failed", block)
+            raise
+
+    def _run(self, task, provider, callback, holds_slot=True):
+        status = "failed"
+        deadline = task.deadline.start() if isinstance(task.deadline, SentenceDeadline) else task.deadline
+        try:
+            with ExitStack() as slots:
+                # 固定的获取顺序：共享服务商上限 -> 本进程全局上限 -> 共享全局上限
+                if provider in self.shared_limits:
+                    slots.enter_context(self.shared_limits[provider])
+                slots.enter_context(self._global_slots)
+                if "global" in self.shared_limits:
+                    slots.enter_context(self.shared_limits["global"])
+                result = self._call(task, deadline)
+            callback(task, result)
+            status = {"success": "completed", "skipped": "skipped"}.get(result.get("status"), "failed")
+        except Exception as e:
+            logger.error(f"处理任务 {task.file_id}#{task.sentence_index} ({task.model_name}) 时出错: {str(e)}")
+        finally:
+            self._finish(provider, status, holds_slot)
+
+    def _call(self, task, deadline):
+        """调用模型；任务在等待并发名额期间已超过截止时间或已被取消时不再发送请求"""
+        if task.cancel_event is not None and task.cancel_event.is_set():
+            return {"content": None, "time": 0.0, "status": "skipped", "error": "调用已取消",
+                    "not_sent": "cancelled"}
+        kwargs = {}
+        if deadline is not None:
+            if time.monotonic() >= deadline:
+                with self._lock:
+                    self.stats["cancelled"] += 1
+                return {"content": None, "time": 0.0, "status": "error", "error": "超过句子截止时间，已取消",
+                        "not_sent": "deadline"}
+            kwargs["deadline"] = deadline
+        if task.cancel_event is not None:
+            kwargs["cancel_event"] = task.cancel_event
+        return self.llm_service.call_model_result(task.model_name, task.prompt,
+                                                  template_name=task.template_name, **kwargs)
+
+    def _finish(self, provider, status, holds_slot=True):
+        if holds_slot:
+            self._pending_slots.release()
+        with self._idle:
+            self._in_flight -= 1
+            self.stats[status] += 1
+            self.stats[f"{provider}.{status}"] += 1
+            if self._in_flight == 0:
+                self._idle.notify_all()
+
+    def join(self):
+        """等待所有已提交的任务完成"""
+        with self._idle:
+            while self._in_flight > 0:
+                self._idle.wait()
+
+    def shutdown(self):
+        """等待任务完成并关闭所有线程池"""
+        self.join()
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
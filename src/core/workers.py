@@ -0,0 +1,151 @@
+"""
+多进程文件级并行
+将输入文件分片到多个工作进程，工作进程之间共享各服务商的并发上限，日志和进度统一汇总到主进程
+"""
+
+import os
+import logging
+import threading
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener
+
+logger = logging.getLogger(__name__)
+
+# 工作进程使用spawn方式启动，避免fork时复制主进程中持有锁的线程
+MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# 各工作进程中的共享状态，由init_worker设置
+_worker_state = {}
+
+
+def shard_files(file_paths, workers):
+    """
+    按文件大小将文件分配到各分片，每次把最大的剩余文件分给当前总大小最小的分片
+
+    Returns:
+        分片列表，去除空分片，分片内保持原有文件顺序
+    """
+    def size_of(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    shards = [[] for _ in range(max(1, workers))]
+    loads = [0] * len(shards)
+    order = {path: i for i, path in enumerate(file_paths)}
+    for path in sorted(file_paths, key=size_of, reverse=True):
+        target = loads.index(min(loads))
+        shards[target].append(path)
+        loads[target] += size_of(path)
+    return [sorted(shard, key=order.get) for shard in shards if shard]
+
+
+def create_shared_limits(global_limit, provider_limits):
+    """
+    创建跨进程共享的并发信号量
+
+    Args:
+        global_limit: 所有进程合计的并发调用上限
+        provider_limits: 服务商 -> 所有进程合计的并发调用上限
+
+    Returns:
+        字典，"global"对应全局信号量，其余键为服务商名称
+    """
+    limits = {"global": MP_CONTEXT.BoundedSemaphore(global_limit)}
+    for provider, limit in provider_limits.items():
+        limits[provider] = MP_CONTEXT.BoundedSemaphore(max(1, limit))
+    return limits
+
+
+def init_worker(log_queue, progress_queue, shared_limits):
+    """
+    工作进程初始化：日志改为发送到主进程，并保存共享的并发信号量和进度队列
+
+    作为ProcessPoolExecutor的initializer使用
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    handler = QueueHandler(log_queue)
+    # 主进程的处理器负责时间和级别等格式，这里只在消息前加上工作进程名称
+    handler.setFormatter(logging.Formatter("[%(processName)s] %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+    _worker_state["progress_queue"] = progress_queue
+    _worker_state["shared_limits"] = shared_limits
+
+
+def worker_shared_limits():
+    """返回当前工作进程的共享并发信号量，不在工作进程中时返回None"""
+    return _worker_state.get("shared_limits")
+
+
+def report_file_done(file_path, sentences):
+    """在工作进程中报告一个文件处理完成"""
+    progress_queue = _worker_state.get("progress_queue")
+    if progress_queue is not None:
+        progress_queue.put((multiprocessing.current_process().name, file_path, sentences))
+
+
+def start_log_listener(log_queue):
+    """在主进程中启动日志监听，将工作进程的日志交给主进程根日志记录器的处理器"""
+    listener = QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class ProgressMonitor:
+    """汇总所有进程的文件完成情况并定期写入日志"""
+
+    def __init__(self, total_files, log=None):
+        self.total_files = total_files
+        self.log = log or logger
+        self.files_done = 0
+        self.sentences_done = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def file_done(self, file_path, sentences, worker=None):
+        with self._lock:
+            self.files_done += 1
+            self.sentences_done += sentences
+            files_done, sentences_done = self.files_done, self.sentences_done
+        source = f" ({worker})" if worker else ""
+        self.log.info(f"进度: {files_done}/{self.total_files} 个文件完成，累计 {sentences_done} 个句子"
+                      f" - {os.path.basename(file_path)}{source}")
+
+    def watch(self, progress_queue):
+        """启动后台线程读取工作进程的进度消息，收到None时结束"""
+        def pump():
+            while True:
+                message = progress_queue.get()
+                if message is None:
+                    break
+                worker, file_path, sentences = message
+                self.file_done(file_path, sentences, worker)
+
+        self._thread = threading.Thread(target=pump, name="progress-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self, progress_queue):
+        if self._thread is not None:
+            progress_queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+
+def merge_stats(stats_list):
+    """合并多个进程的统计字典：数值相加，嵌套字典逐层合并，其他值取第一个"""
+    merged = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                merged[key] = merge_stats([merged.get(key, {}), value])
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] = merged.get(key, 0) + value
+            else:
+                merged.setdefault(key, value)
+    return merged
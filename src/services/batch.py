@@ -0,0 +1,275 @@
+"""
+批处理任务
+离线批量运行时不需要实时返回，将所有调用写成OpenAI兼容格式的批处理JSONL文件，
+通过服务商的批处理接口（阿里云百炼/DashScope和OpenAI均支持）上传、提交并轮询，完成后一次性读取结果；
+以更长的等待时间换取更高的吞吐量和更低的调用成本
+
+任务清单(manifest.json)记录已提交的任务和运行参数，等待超时或进程中断后可按清单继续轮询，不必重新提交
+"""
+
+import os
+import json
+import time
+import logging
+
+from src.config.model_config import BATCH_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 批处理任务调用的接口
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# 批处理任务的终止状态
+BATCH_FINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+
+def batch_custom_id(file_index, sentence_index, model_name):
+    """请求的custom_id，由文件序号、句子序号和模型名称组成"""
+    return f"{file_index}-{sentence_index}-{model_name}"
+
+
+def parse_custom_id(custom_id):
+    """batch_custom_id的逆过程，返回(文件序号, 句子序号, 模型名称)"""
+    file_index, sentence_index, model_name = custom_id.split("-", 2)
+    return int(file_index), int(sentence_index), model_name
+
+
+def read_custom_ids(path):
+    """读取批处理JSONL文件中各请求的custom_id"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line)["custom_id"] for line in f if line.strip()]
+
+
+def load_manifest(path):
+    """
+    读取任务清单
+
+    Returns:
+        包含context（提交时的运行参数）和jobs（各任务的服务商、文件、任务编号、请求数和状态）的字典
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_batch_file(path, requests):
+    """
+    将请求写成批处理JSONL文件
+
+    Args:
+        path: 文件路径
+        requests: (custom_id, 请求体)列表
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for custom_id, body in requests:
+            f.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body},
+                               ensure_ascii=False) + "\n")
+
+
+def parse_batch_output(text, elapsed=0.0):
+    """
+    解析批处理任务的输出或错误文件
+
+    Args:
+        text: JSONL文本，每行包含custom_id、response（status_code和body）及error
+        elapsed: 计入结果time的耗时（批处理没有单次调用的耗时，使用整个任务的耗时）
+
+    Returns:
+        custom_id -> 结果字典，格式同LLMService.call_model_result
+    """
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            custom_id = item["custom_id"]
+        except (ValueError, KeyError):
+            logger.warning(f"无法解析的批处理输出行: {line[:200]}")
+            continue
+        response = item.get("response") or {}
+        body = response.get("body") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            error = item.get("error") or body.get("error") or f"HTTP {response.get('status_code')}"
+            message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+            results[custom_id] = {"content": None, "time": elapsed, "status": "error",
+                                  "error": f"批处理请求失败: {message}"}
+            continue
+        try:
+            content = body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            results[custom_id] = {"content": None, "time": elapsed, "status": "error",
+                                  "error": "批处理响应中没有输出内容"}
+            continue
+        results[custom_id] = {"content": content, "time": elapsed, "status": "success"}
+    return results
+
+
+class BatchAdapter:
+    """一个服务商的批处理接口：上传JSONL文件、创建任务、轮询状态和下载结果"""
+
+    def __init__(self, provider, client, config=None):
+        """
+        Args:
+            provider: 服务商名称
+            client: 服务商的OpenAI客户端（LLMService.batch_client）
+            config: 结构同BATCH_CONFIG，如果为None则使用BATCH_CONFIG
+        """
+        self.provider = provider
+        self.client = client
+        self.config = config or BATCH_CONFIG
+
+    def submit(self, path):
+        """上传批处理文件并创建任务，返回任务编号"""
+        with open(path, 'rb') as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window=self.config["completion_window"])
+        logger.info(f"已提交{self.provider}批处理任务 {batch.id}: {path}")
+        return batch.id
+
+    def retrieve(self, batch_id):
+        return self.client.batches.retrieve(batch_id)
+
+    def download(self, file_id):
+        """读取结果文件的文本内容"""
+        return self.client.files.content(file_id).text
+
+
+class BatchRun:
+    def __init__(self, llm_service, work_dir, config=None, context=None):
+        """
+        初始化一次批处理运行
+
+        Args:
+            llm_service: LLMService实例，提供请求体和各服务商的客户端
+            work_dir: 批处理文件和任务清单的保存目录
+            config: 结构同BATCH_CONFIG，如果为None则使用BATCH_CONFIG
+            context: 随任务清单保存的运行参数（输入文件、模型、模板等），恢复运行时据此重建结果
+        """
+        self.llm_service = llm_service
+        self.work_dir = work_dir
+        self.config = config or BATCH_CONFIG
+        self.context = context or {}
+        self.resumed = False
+        self._requests = {}
+        self.jobs = []
+        self.stats = {"requests": 0, "unsupported": 0, "batches": 0, "succeeded": 0, "failed": 0, "missing": 0,
+                      "pending": 0, "poll_errors": 0}
+
+    @classmethod
+    def resume(cls, llm_service, manifest_path, config=None):
+        """按任务清单恢复此前提交的运行，之后直接调用wait继续轮询"""
+        manifest = load_manifest(manifest_path)
+        run = cls(llm_service, os.path.dirname(os.path.abspath(manifest_path)), config, manifest["context"])
+        run.resumed = True
+        adapters = {}
+        for job in manifest["jobs"]:
+            provider = job["provider"]
+            if provider not in adapters:
+                adapters[provider] = BatchAdapter(provider, llm_service.batch_client(provider), run.config)
+            run.jobs.append(dict(job, adapter=adapters[provider]))
+        run.stats["requests"] = sum(job["requests"] for job in run.jobs)
+        run.stats["batches"] = len(run.jobs)
+        logger.info(f"从任务清单 {manifest_path} 恢复 {len(run.jobs)} 个批处理任务")
+        return run
+
+    def add(self, custom_id, model_name, prompt, template_name=None):
+        """
+        添加一个调用；恢复的运行中请求已经提交，只检查模型是否支持批处理
+
+        Returns:
+            模型支持批处理时为True，否则为False（调用方应另行处理）
+        """
+        request = self.llm_service.batch_request_body(model_name, prompt, template_name)
+        if request is None:
+            self.stats["unsupported"] += 1
+            return False
+        if self.resumed:
+            return True
+        provider, body = request
+        self._requests.setdefault(provider, []).append((custom_id, body))
+        self.stats["requests"] += 1
+        return True
+
+    def submit(self):
+        """按服务商写出批处理文件（超过单文件请求数上限时拆分）并提交，任务清单保存在work_dir/manifest.json"""
+        limit = self.config["max_requests_per_file"]
+        for provider, requests in self._requests.items():
+            adapter = BatchAdapter(provider, self.llm_service.batch_client(provider), self.config)
+            for part, start in enumerate(range(0, len(requests), limit)):
+                path = os.path.join(self.work_dir, f"{provider}_{part}.jsonl")
+                write_batch_file(path, requests[start:start + limit])
+                self.jobs.append({"provider": provider, "path": path, "adapter": adapter,
+                                  "batch_id": adapter.submit(path), "requests": len(requests[start:start + limit]),
+                                  "status": "submitted"})
+        self.stats["batches"] = len(self.jobs)
+        self._save_manifest()
+
+    def wait(self):
+        """
+        轮询所有任务直到终止或超过等待时间，读取已完成任务的结果
+
+        查询状态出错（网络中断、服务端错误等）时记录并在下一轮继续轮询；超过等待时间仍未结束的任务保留在
+        任务清单中，可用BatchRun.resume继续等待
+
+        Returns:
+            custom_id -> 结果字典；未返回结果的请求（包括未结束任务中的请求）不在其中
+        """
+        started = time.monotonic()
+        pending = list(self.jobs)
+        while pending:
+            for job in list(pending):
+                try:
+                    batch = job["adapter"].retrieve(job["batch_id"])
+                except Exception as e:
+                    self.stats["poll_errors"] += 1
+                    logger.warning(f"查询批处理任务 {job['batch_id']} 状态出错，稍后重试: {str(e)}")
+                    continue
+                job["status"] = batch.status
+                if batch.status in BATCH_FINAL_STATES:
+                    job["batch"] = batch
+                    pending.remove(job)
+                    logger.info(f"批处理任务 {job['batch_id']} 结束，状态: {batch.status}")
+            if not pending:
+                break
+            if time.monotonic() - started > self.config["timeout"]:
+                logger.error(f"等待批处理任务超过 {self.config['timeout']} 秒，"
+                             f"未完成的任务: {[job['batch_id'] for job in pending]}")
+                break
+            time.sleep(self.config["poll_interval"])
+        self._save_manifest()
+
+        elapsed = time.monotonic() - started
+        results = {}
+        for job in self.jobs:
+            batch = job.get("batch")
+            if batch is None:
+                continue
+            # 过期或取消的任务也可能已完成部分请求
+            for file_id in (getattr(batch, "output_file_id", None), getattr(batch, "error_file_id", None)):
+                if file_id:
+                    results.update(parse_batch_output(job["adapter"].download(file_id), elapsed))
+        for result in results.values():
+            self.stats["succeeded" if result["status"] == "success" else "failed"] += 1
+        self.stats["pending"] = sum(job["requests"] for job in self.jobs if job["status"] not in BATCH_FINAL_STATES)
+        self.stats["missing"] = self.stats["requests"] - len(results) - self.stats["pending"]
+        return results
+
+    def pending_ids(self):
+        """未结束任务中各请求的custom_id，这些请求的结果需要恢复运行后才能得到"""
+        pending = set()
+        for job in self.jobs:
+            if job["status"] not in BATCH_FINAL_STATES:
+                pending.update(read_custom_ids(job["path"]))
+        return pending
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.work_dir, "manifest.json")
+
+    def _save_manifest(self):
+        os.makedirs(self.work_dir, exist_ok=True)
+        jobs = [{key: job[key] for key in ("provider", "path", "batch_id", "requests", "status")} for job in self.jobs]
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({"context": self.context, "jobs": jobs}, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,136 @@
+"""
+模型熔断器
+某个模型连续失败达到阈值后打开熔断器，打开期间直接快速失败；冷却时间过后只放行一个半开探测请求，
+探测成功则恢复，失败则重新打开
+"""
+
+import time
+import logging
+import threading
+
+from src.config.model_config import CIRCUIT_BREAKER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时调用被拒绝"""
+
+    def __init__(self, model_name, retry_in):
+        super().__init__(f"模型 {model_name} 熔断中，{retry_in:.0f}秒后重新探测")
+        self.model_name = model_name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        """
+        初始化熔断器
+
+        Args:
+            name: 模型名称
+            failure_threshold: 连续失败多少次后打开，如果为None则使用CIRCUIT_BREAKER_CONFIG中的配置
+            reset_timeout: 打开后多少秒放行半开探测，如果为None则使用CIRCUIT_BREAKER_CONFIG中的配置
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold or CIRCUIT_BREAKER_CONFIG["failure_threshold"]
+        self.reset_timeout = reset_timeout or CIRCUIT_BREAKER_CONFIG["reset_timeout"]
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    def allow(self):
+        """
+        判断是否放行本次调用
+
+        Raises:
+            CircuitOpenError: 熔断器打开，或处于半开状态且已有探测请求在进行中
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            retry_in = self.opened_at + self.reset_timeout - now
+            if self.state == OPEN and retry_in <= 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self.stats["probes"] += 1
+                logger.info(f"模型 {self.name} 熔断冷却结束，发送半开探测请求")
+                return
+            self.stats["rejected"] += 1
+        raise CircuitOpenError(self.name, max(retry_in, 0.0))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"模型 {self.name} 探测成功，熔断器关闭")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                # 打开前已经发出的调用在打开后失败时不重新计时，否则半开探测会被不断推迟
+                if self.state != OPEN:
+                    self.stats["opened"] += 1
+                    logger.warning(f"模型 {self.name} 连续失败 {self.consecutive_failures} 次，熔断器打开，"
+                                   f"{self.reset_timeout:.0f}秒内直接失败")
+                    self.state = OPEN
+                    self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def record_cancelled(self):
+        """调用被主动取消，不计入成功或失败，只释放半开探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures, **self.stats}
+
+
+class CircuitBreakerRegistry:
+    """按模型名称维护熔断器"""
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name):
+        with self._lock:
+            breaker = self._breakers.get(model_name)
+            if breaker is None:
+                breaker = CircuitBreaker(model_name, self.failure_threshold, self.reset_timeout)
+                self._breakers[model_name] = breaker
+        return breaker
+
+    def stats(self):
+        """返回各模型熔断器的状态和打开、拒绝、探测次数"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+_shared_registry = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_circuit_breakers():
+    """返回进程内共享的熔断器集合"""
+    global _shared_registry
+    with _shared_lock:
+        if _shared_registry is None:
+            _shared_registry = CircuitBreakerRegistry()
+        return _shared_registry
@@ -0,0 +1,102 @@
+"""
+调用截止时间
+一次模型调用（包括所有重试）共享一个截止时间，每次尝试的连接/读取超时都不超过剩余时间，
+截止时间过后不再重试，正在进行的请求也会因超时被中断
+"""
+
+import time
+import contextvars
+from contextlib import contextmanager
+
+from src.config.model_config import TIMEOUT_CONFIG
+
+
+class DeadlineExceeded(TimeoutError):
+    """调用已超过截止时间"""
+
+
+def get_timeouts(provider, model_name):
+    """
+    返回模型的超时配置（模型配置覆盖服务商配置，服务商配置覆盖默认配置）
+
+    Returns:
+        包含connect、read、total（秒）的字典
+    """
+    timeouts = dict(TIMEOUT_CONFIG["default"])
+    timeouts.update(TIMEOUT_CONFIG.get("providers", {}).get(provider, {}))
+    timeouts.update(TIMEOUT_CONFIG.get("models", {}).get(model_name, {}))
+    return timeouts
+
+
+class Deadline:
+    def __init__(self, expires_at, connect, read, cancel_event=None):
+        """
+        Args:
+            expires_at: 截止时间（time.monotonic()时间）
+            connect: 每次尝试的连接超时（秒）
+            read: 每次尝试的读取超时（秒）
+            cancel_event: 外部取消信号(threading.Event)，被设置后视为已取消
+        """
+        self.expires_at = expires_at
+        self.connect = connect
+        self.read = read
+        self.cancel_event = cancel_event
+        self._cancelled = False
+
+    @classmethod
+    def for_call(cls, timeouts, deadline=None, cancel_event=None):
+        """按模型的总预算创建截止时间，同时给出外部截止时间（如句子截止时间）时取较早者"""
+        expires_at = time.monotonic() + timeouts["total"]
+        if deadline is not None:
+            expires_at = min(expires_at, deadline)
+        return cls(expires_at, timeouts["connect"], timeouts["read"], cancel_event)
+
+    def child(self):
+        """创建截止时间相同、可单独取消的副本，用于同一调用中并行发送的多个请求"""
+        return Deadline(self.expires_at, self.connect, self.read, self.cancel_event)
+
+    @property
+    def cancelled(self):
+        return self._cancelled or (self.cancel_event is not None and self.cancel_event.is_set())
+
+    def cancel(self):
+        """取消调用：之后不再发起新的尝试或重试，正在等待的限流许可也会放弃"""
+        self._cancelled = True
+
+    def remaining(self):
+        if self.cancelled:
+            return 0.0
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def attempt_timeout(self):
+        """
+        返回本次尝试的(连接超时, 读取超时)，均不超过剩余时间
+
+        Raises:
+            DeadlineExceeded: 已超过截止时间
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("调用已取消" if self.cancelled else "调用已超过截止时间")
+        return min(self.connect, remaining), min(self.read, remaining)
+
+
+_current_deadline = contextvars.ContextVar("llm_call_deadline", default=None)
+
+
+def current_deadline():
+    """返回当前调用的截止时间，不在deadline_scope中时返回None"""
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """在with块内将deadline设为当前调用的截止时间，各调用路径据此计算每次尝试的超时"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
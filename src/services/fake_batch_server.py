@@ -0,0 +1,188 @@
+"""
+本地模拟的批处理接口
+实现OpenAI兼容批处理接口中用到的部分（上传文件、创建和查询任务、下载结果），
+用于离线测试批处理模式；任务创建后经过delay秒完成，每个请求的输出由responder生成
+
+用法：
+    python -m src.services.fake_batch_server --port 18010
+    ALICLOUD_COMPATIBLE_URL=http://127.0.0.1:18010/v1 API_KEY=test python scripts/run_analysis.py --batch
+"""
+
+import re
+import json
+import time
+import argparse
+import threading
+from email import policy
+from email.parser import BytesParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 默认对每个请求返回的housing格式输出
+DEFAULT_ANSWER = ("policy_object: 公租房; policy_stage: 需求端; policy_type: 激励型; policy_tool: 租赁补贴; "
+                  "policy_geo_scope: 全市; policy_target_scope: 本市户籍家庭; tool_parameter: 无;")
+
+
+def default_responder(body):
+    return DEFAULT_ANSWER
+
+
+class FakeBatchHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/files"):
+            # 按multipart/form-data解析上传的文件
+            header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8")
+            message = BytesParser(policy=policy.default).parsebytes(header + data)
+            upload = next(part for part in message.iter_parts()
+                          if part.get_param("name", header="content-disposition") == "file")
+            self._send(self.server.state.add_file(upload.get_filename() or "batch.jsonl",
+                                                  upload.get_payload(decode=True)))
+        elif self.path.endswith("/batches"):
+            request = json.loads(data)
+            if request["input_file_id"] not in self.server.state.files:
+                self._send({"error": {"message": "input file not found"}}, 404)
+                return
+            self._send(self.server.state.create_batch(request))
+        else:
+            self._send({"error": {"message": "not found"}}, 404)
+
+    def do_GET(self):
+        state = self.server.state
+        match = re.search(r"/batches/([^/]+)$", self.path)
+        if match and match.group(1) in state.batches:
+            self._send(state.retrieve_batch(match.group(1)))
+            return
+        match = re.search(r"/files/([^/]+)/content$", self.path)
+        if match and match.group(1) in state.files:
+            content = state.files[match.group(1)]["content"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        self._send({"error": {"message": "not found"}}, 404)
+
+    def _send(self, payload, status=200):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeBatchState:
+    """模拟服务端保存的文件和任务"""
+
+    def __init__(self, responder, delay):
+        self.responder = responder
+        self.delay = delay
+        self.files = {}
+        self.batches = {}
+        self.retrievals = 0
+        self._lock = threading.Lock()
+
+    def add_file(self, filename, content, purpose="batch"):
+        with self._lock:
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = {"content": content}
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+
+    def create_batch(self, request):
+        with self._lock:
+            batch_id = f"batch-{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                "status": "validating", "created_at": int(time.time()), "ready_at": time.monotonic() + self.delay,
+            }
+        return self._public(self.batches[batch_id])
+
+    def retrieve_batch(self, batch_id):
+        with self._lock:
+            self.retrievals += 1
+            batch = self.batches[batch_id]
+            if batch["status"] == "validating":
+                batch["status"] = "in_progress"
+            elif batch["status"] == "in_progress" and time.monotonic() >= batch["ready_at"]:
+                self._complete(batch)
+            return self._public(batch)
+
+    def _complete(self, batch):
+        outputs, errors = [], []
+        lines = self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+        for number, line in enumerate(line for line in lines if line.strip()):
+            request = json.loads(line)
+            request_id = f"{batch['id']}-req-{number}"
+            try:
+                content = self.responder(request["body"])
+            except Exception as e:
+                errors.append({"id": request_id, "custom_id": request["custom_id"], "response": None,
+                               "error": {"code": "invalid_request", "message": str(e)}})
+                continue
+            body = {"id": request_id, "object": "chat.completion", "created": int(time.time()),
+                    "model": request["body"]["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}]}
+            outputs.append({"id": request_id, "custom_id": request["custom_id"],
+                            "response": {"status_code": 200, "request_id": request_id, "body": body}, "error": None})
+        for key, items in (("output_file_id", outputs), ("error_file_id", errors)):
+            if items:
+                file_id = f"file-{len(self.files) + 1}"
+                content = "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+                self.files[file_id] = {"content": content.encode("utf-8")}
+                batch[key] = file_id
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+        batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs),
+                                   "failed": len(errors)}
+
+    @staticmethod
+    def _public(batch):
+        return {key: value for key, value in batch.items() if key != "ready_at"}
+
+
+class FakeBatchServer:
+    def __init__(self, port=0, responder=None, delay=0.0):
+        """
+        Args:
+            port: 监听端口，0表示自动分配
+            responder: 请求体 -> 输出文本的函数，抛出异常时该请求记为失败；如果为None则返回DEFAULT_ANSWER
+            delay: 任务创建后经过多少秒完成
+        """
+        self.state = FakeBatchState(responder or default_responder, delay)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), FakeBatchHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟的OpenAI兼容批处理接口')
+    parser.add_argument('--port', type=int, default=18010, help='监听端口')
+    parser.add_argument('--delay', type=float, default=2.0, help='任务创建后经过多少秒完成')
+    args = parser.parse_args()
+    server = FakeBatchServer(args.port, delay=args.delay)
+    print(f"模拟批处理接口: {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
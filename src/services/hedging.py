@@ -0,0 +1,109 @@
+"""
+对冲请求
+一次调用超过该模型近期的p95延迟仍未返回时，再发送一个相同的请求（可使用备用端点或API密钥），
+先成功返回的结果生效，另一个请求被取消；对冲请求占总调用数的比例有上限，避免成本失控
+"""
+
+import math
+import logging
+import threading
+from collections import deque
+
+from src.config.model_config import HEDGE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """记录一个模型最近若干次成功调用的延迟"""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+
+    def add(self, latency):
+        self.samples.append(latency)
+
+    def percentile(self, p):
+        """返回第p百分位的延迟（最近邻法），没有样本时返回None"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class HedgePolicy:
+    def __init__(self, config=None):
+        """
+        初始化对冲策略
+
+        Args:
+            config: 对冲配置，结构同HEDGE_CONFIG，如果为None则使用HEDGE_CONFIG
+        """
+        self.config = config or HEDGE_CONFIG
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def _model_stats(self, model_name):
+        stats = self.stats.get(model_name)
+        if stats is None:
+            stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "capped": 0,
+                     "losers_cancelled": 0, "saved_seconds": 0.0}
+            self.stats[model_name] = stats
+        return stats
+
+    def model_settings(self, model_name):
+        """模型的对冲设置（models中的配置覆盖默认配置）"""
+        settings = {"endpoints": {}, "api_key_env": None}
+        settings.update(self.config.get("models", {}).get(model_name, {}))
+        return settings
+
+    def record_latency(self, model_name, latency):
+        with self._lock:
+            tracker = self._trackers.get(model_name)
+            if tracker is None:
+                tracker = LatencyTracker(self.config["window"])
+                self._trackers[model_name] = tracker
+            tracker.add(latency)
+
+    def hedge_delay(self, model_name):
+        """
+        发送对冲请求前的等待秒数：近期成功调用延迟的p95（不小于min_delay）
+
+        Returns:
+            等待秒数；样本数不足min_samples时返回None，表示不对冲
+        """
+        with self._lock:
+            self._model_stats(model_name)["calls"] += 1
+            tracker = self._trackers.get(model_name)
+            if tracker is None or len(tracker.samples) < self.config["min_samples"]:
+                return None
+            return max(tracker.percentile(self.config["percentile"]), self.config["min_delay"])
+
+    def try_hedge(self, model_name):
+        """等待hedge_delay后调用仍未返回时调用，对冲比例未超过上限时返回True并计数"""
+        with self._lock:
+            stats = self._model_stats(model_name)
+            if stats["hedged"] + 1 > stats["calls"] * self.config["max_hedge_ratio"]:
+                stats["capped"] += 1
+                return False
+            stats["hedged"] += 1
+            return True
+
+    def record_outcome(self, model_name, hedge_won, loser_cancelled):
+        with self._lock:
+            stats = self._model_stats(model_name)
+            stats["hedge_wins"] += int(hedge_won)
+            stats["losers_cancelled"] += int(loser_cancelled)
+
+    def record_saving(self, model_name, seconds):
+        """对冲请求胜出后，未能取消的原请求最终完成时记录实际节省的时间"""
+        with self._lock:
+            self._model_stats(model_name)["saved_seconds"] += max(0.0, seconds)
+
+    def snapshot(self):
+        """返回各模型的调用数、对冲数、对冲胜出数、因比例上限未对冲数、取消数和节省时间"""
+        with self._lock:
+            return {model_name: {**stats, "saved_seconds": round(stats["saved_seconds"], 2)}
+                    for model_name, stats in self.stats.items()}
+
@@ -0,0 +1,132 @@
+"""
+HTTP连接池管理
+为每个服务商和基础地址维护长连接的requests.Session与OpenAI客户端，在工作线程之间共享
+"""
+
+import asyncio
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from openai import OpenAI
+
+from src.config.model_config import HTTP_POOL_CONFIG
+
+
+def _origin(url):
+    """返回URL的协议+主机部分，同一主机的不同路径共用一个连接池"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class ConnectionPoolManager:
+    def __init__(self, pool_config=None):
+        """
+        初始化连接池管理器
+
+        Args:
+            pool_config: 连接池配置字典，键为服务商名称或"default"，如果为None则使用HTTP_POOL_CONFIG
+        """
+        self.pool_config = pool_config if pool_config is not None else HTTP_POOL_CONFIG
+        self._sessions = {}
+        self._openai_clients = {}
+        # aiohttp会话绑定事件循环，按事件循环分别缓存
+        self._async_sessions = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get_pool_settings(self, provider):
+        """获取指定服务商的连接池参数（服务商配置覆盖默认配置）"""
+        settings = {"pool_connections": 10, "pool_maxsize": 10, "pool_block": False, "async_limit": 100}
+        settings.update(self.pool_config.get("default", {}))
+        settings.update(self.pool_config.get(provider, {}))
+        return settings
+
+    def get_session(self, provider, url):
+        """
+        获取服务商对应的长连接Session
+
+        Args:
+            provider: 服务商名称，如alicloud、baidu、local
+            url: 请求地址，按协议和主机区分连接池
+
+        Returns:
+            可在多个线程间共享的requests.Session
+        """
+        key = (provider, _origin(url))
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                settings = self.get_pool_settings(provider)
+                adapter = HTTPAdapter(
+                    pool_connections=settings["pool_connections"],
+                    pool_maxsize=settings["pool_maxsize"],
+                    pool_block=settings["pool_block"]
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[key] = session
+        return session
+
+    def get_openai_client(self, provider, base_url, api_key):
+        """
+        获取服务商对应的OpenAI客户端，客户端内部的HTTP连接会被复用
+
+        Args:
+            provider: 服务商名称，如alicloud、openai
+            base_url: OpenAI兼容接口的基础地址
+            api_key: API密钥
+
+        Returns:
+            OpenAI客户端实例
+        """
+        key = (provider, base_url, api_key)
+        with self._lock:
+            client = self._openai_clients.get(key)
+            if client is None:
+                # 关闭客户端内置的重试，429/503交给限流器处理，避免重试在限流器之外发生
+                client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+                self._openai_clients[key] = client
+        return client
+
+    def get_async_session(self, provider):
+        """
+        获取当前事件循环中服务商对应的aiohttp会话，必须在协程中调用
+
+        Args:
+            provider: 服务商名称
+
+        Returns:
+            aiohttp.ClientSession，连接数上限为该服务商的async_limit
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            sessions = self._async_sessions.setdefault(loop, {})
+            session = sessions.get(provider)
+            if session is None or session.closed:
+                settings = self.get_pool_settings(provider)
+                connector = aiohttp.TCPConnector(limit=settings["async_limit"])
+                session = aiohttp.ClientSession(connector=connector)
+                sessions[provider] = session
+        return session
+
+    async def aclose(self):
+        """关闭当前事件循环中的所有aiohttp会话"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            sessions = self._async_sessions.pop(loop, {})
+        for session in sessions.values():
+            await session.close()
+
+    def close(self):
+        """关闭所有连接"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            for client in self._openai_clients.values():
+                client.close()
+            self._sessions.clear()
+            self._openai_clients.clear()
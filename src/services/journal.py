@@ -0,0 +1,111 @@
+"""
+运行进度日志
+以只追加的JSONL文件记录每个已完成的(文件, 句子索引, 模型)结果，进程中断后可据此恢复运行
+"""
+
+import os
+import json
+import glob
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def sentence_digest(sentence):
+    """句子文本的摘要，用于恢复时确认句子未发生变化"""
+    return hashlib.sha1(sentence.encode("utf-8")).hexdigest()[:16]
+
+
+class ProgressJournal:
+    def __init__(self, path, replay=False):
+        """
+        打开进度日志
+
+        Args:
+            path: 日志文件路径，不存在时创建
+            replay: 是否读取已有记录用于恢复运行
+        """
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"replayed": 0, "appended": 0}
+
+        if replay and os.path.exists(path):
+            self._load()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # 以O_APPEND方式打开并且每条记录只调用一次write，多个工作进程可以安全地追加到同一个日志
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # 上次中断时写了一半的行需要换行结束，避免与新记录粘连
+        if os.fstat(self._fd).st_size > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    os.write(self._fd, b"\n")
+
+    @staticmethod
+    def new_path(journal_dir):
+        """生成以当前时间命名的新日志路径"""
+        return os.path.join(journal_dir, f"run_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+
+    @staticmethod
+    def latest_path(journal_dir):
+        """返回目录中最新的日志路径，没有时返回None"""
+        paths = sorted(glob.glob(os.path.join(journal_dir, "run_*.jsonl")))
+        return paths[-1] if paths else None
+
+    def _load(self):
+        skipped = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程中断时最后一行可能不完整
+                    skipped += 1
+                    continue
+                key = (entry["file"], entry["index"], entry["model"])
+                self._entries[key] = (entry["digest"], entry["result"])
+        logger.info(f"从 {self.path} 读取了 {len(self._entries)} 条已完成记录"
+                    + (f"，跳过 {skipped} 行损坏记录" if skipped else ""))
+
+    def replay(self, file_key, index, sentence, models):
+        """
+        返回句子已完成的模型结果
+
+        Returns:
+            模型名称 -> 结果字典；句子内容与记录不一致时忽略该记录
+        """
+        digest = sentence_digest(sentence)
+        replayed = {}
+        for model_name in models:
+            entry = self._entries.get((file_key, index, model_name))
+            if entry is not None and entry[0] == digest:
+                replayed[model_name] = entry[1]
+        self.stats["replayed"] += len(replayed)
+        return replayed
+
+    def append(self, file_key, index, sentence, model_name, result):
+        """追加一条已完成的结果并立即落盘"""
+        record = {k: v for k, v in result.items() if k != "prompt"}
+        line = json.dumps({
+            "file": file_key,
+            "index": index,
+            "digest": sentence_digest(sentence),
+            "model": model_name,
+            "result": record
+        }, ensure_ascii=False)
+        data = (line + "\n").encode("utf-8")
+        with self._lock:
+            os.write(self._fd, data)
+            os.fsync(self._fd)
+            self.stats["appended"] += 1
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
@@ -1,10 +1,42 @@
 import os
+import copy
 import json
+import contextvars
+import asyncio
 import threading
-import requests
 import time
 import logging
-from openai import OpenAI
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+import aiohttp
+
+from src.services.http_pool import ConnectionPoolManager
+from src.services.response_cache import make_cache_key
+from src.services.token_manager import BAIDU_TOKEN_URL, BAIDU_TOKEN_ERROR_CODES, get_baidu_token_manager
+from src.services.rate_limiter import ThrottledError, get_shared_rate_limiter
+from src.services.circuit_breaker import CircuitOpenError, get_shared_circuit_breakers
+from src.services.deadline import Deadline, DeadlineExceeded, deadline_scope, current_deadline, get_timeouts
+from src.services.streaming import StreamStats, stop_condition_scope, current_stop_condition
+from src.services.output_budget import (OutputBudget, max_tokens_scope, current_max_tokens, truncation_scope,
+                                        mark_truncated)
+from src.services.single_flight import SingleFlight, WaitTimeout
+from src.utils.response_parser import housing_quorum, QUORUM_SKIPPED
+
+# 各服务商的默认接口地址，可通过model_endpoints覆盖
+ALIYUN_COMPATIBLE_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+ALIYUN_NATIVE_API_URL = "https://dashscope.aliyuncs.com/api/v1/services/foundation-models/text-generation/generation"
+BAIDU_CHAT_BASE_URL = "https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat"
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+CHATGLM_DEFAULT_URL = "http://0.0.0.0:8002/chat"
+
+# OpenAI模型的max_tokens上限，实际值由模板的输出预算决定
+OPENAI_MAX_TOKENS = 4000
+
+# 百度接口表示请求过于频繁（QPS或每日请求量超限）的错误码
+BAIDU_RATE_LIMIT_ERROR_CODES = (4, 17, 18)
+
+# 等待对冲请求或异步调用时检查取消信号的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.05
 
 def setup_logger(name):
     """创建并配置一个日志记录器"""
@@ -17,24 +49,70 @@ def setup_logger(name):
         logger.setLevel(logging.INFO)
     return logger
 
+def get_model_provider(model_name):
+    """
+    根据模型名称判断所属服务商
+    
+    Returns:
+        "alicloud"、"local"、"baidu"、"openai"之一，无法识别时返回None
+    """
+    if model_name.startswith("qwen") or model_name.startswith("deepseek"):
+        return "alicloud"
+    elif "chatglm" in model_name.lower():
+        return "local"
+    elif "ernie" in model_name.lower():
+        return "baidu"
+    elif "gpt" in model_name.lower():
+        return "openai"
+    return None
+
 class LLMService:
-    def __init__(self, model_endpoints=None):
+    def __init__(self, model_endpoints=None, pool_manager=None, response_cache=None, rate_limiter=None,
+                 circuit_breakers=None, hedging=None, streaming=False, output_budget=None):
         """
         初始化LLM服务
         
         Args:
             model_endpoints: 字典，包含模型名称和对应的API端点，如果为None则使用默认端点
+            pool_manager: 连接池管理器，如果为None则创建新的ConnectionPoolManager
+            response_cache: 响应缓存(ResponseCache)，为None时不使用缓存
+            rate_limiter: 限流器(RateLimiter)，如果为None则使用进程内共享的限流器
+            circuit_breakers: 熔断器集合(CircuitBreakerRegistry)，如果为None则使用进程内共享的熔断器
+            hedging: 对冲策略(HedgePolicy)，为None时不发送对冲请求
+            streaming: 是否以流式方式调用OpenAI兼容接口（阿里云兼容模式和OpenAI）
+            output_budget: 输出token预算(OutputBudget)，如果为None则只使用各模板的默认预算
         """
         if model_endpoints is None:
             # 默认端点配置
             self.model_endpoints = {
-                "model_chatglm": "http://0.0.0.0:8002/chat",
-                "model_deepseek": "https://dashscope.aliyuncs.com/compatible-mode/v1",
-                "model_baidu": "https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat",
-                "model_openai": "https://api.openai.com/v1"
+                "model_chatglm": CHATGLM_DEFAULT_URL,
+                "model_deepseek": ALIYUN_COMPATIBLE_BASE_URL,
+                "model_alicloud_compatible": ALIYUN_COMPATIBLE_BASE_URL,
+                "model_alicloud_native": ALIYUN_NATIVE_API_URL,
+                "model_baidu": BAIDU_CHAT_BASE_URL,
+                "model_openai": OPENAI_BASE_URL
             }
         else:
             self.model_endpoints = model_endpoints
+        
+        # 同一服务商的请求复用长连接，避免每次调用都重新进行TCP和TLS握手
+        self.pools = pool_manager or ConnectionPoolManager()
+        self.response_cache = response_cache
+        # 所有调用路径在发送请求前都需要从限流器获取许可
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
+        # 连续失败的模型会被熔断，熔断期间直接失败而不再重试
+        self.circuit_breakers = circuit_breakers or get_shared_circuit_breakers()
+        # 超过模型近期p95延迟仍未返回的调用会再发送一个对冲请求，先成功的结果生效
+        self.hedging = hedging
+        self._hedge_executor = None
+        self._hedge_targets = {}
+        # 流式调用记录首token时间，结构化模板的输出完整后提前结束
+        self.streaming = streaming
+        self.stream_stats = StreamStats()
+        # 每次调用的max_tokens按模板和模型确定，并记录输出长度供后续运行调整预算
+        self.output_budget = output_budget or OutputBudget()
+        # 同一时刻相同的调用只发送一次，其余调用方共享结果
+        self.single_flight = SingleFlight()
             
         self.api_key = os.getenv("API_KEY", "")
         self.openai_api_key = os.getenv("OPENAI_API_KEY", "")
@@ -42,73 +120,452 @@ class LLMService:
         self.baidu_secret_key = os.getenv("BAIDU_SECRET_KEY", "")
         self.lock = threading.Lock()
         
-        # 获取百度访问令牌(如果配置了百度API)
-        self.baidu_access_token = None
-        if self.baidu_api_key and self.baidu_secret_key:
-            self._get_baidu_access_token()
+        # 百度访问令牌由进程内共享的令牌管理器按需获取和刷新，构造服务时不再发起请求
+        self.baidu_tokens = get_baidu_token_manager(
+            self.baidu_api_key, self.baidu_secret_key,
+            session=self.pools.get_session("baidu", BAIDU_TOKEN_URL)
+        )
+    
+    @property
+    def baidu_access_token(self):
+        """当前有效的百度访问令牌，未配置或获取失败时为None"""
+        return self.baidu_tokens.get_token()
+    
+    @baidu_access_token.setter
+    def baidu_access_token(self, token):
+        self.baidu_tokens.set_token(token)
     
     def _get_baidu_access_token(self):
         """获取百度API访问令牌"""
-        try:
-            token_url = f"https://aip.baidubce.com/oauth/2.0/token?grant_type=client_credentials&client_id={self.baidu_api_key}&client_secret={self.baidu_secret_key}"
-            response = requests.post(token_url)
-            if response.status_code == 200:
-                self.baidu_access_token = response.json().get("access_token")
-                logger = setup_logger("baidu")
-                logger.info("成功获取百度访问令牌")
-            else:
-                logger = setup_logger("baidu")
-                logger.error(f"获取百度访问令牌失败: {response.text}")
-        except Exception as e:
-            logger = setup_logger("baidu")
-            logger.error(f"获取百度访问令牌出错: {str(e)}")
+        return self.baidu_tokens.get_token()
+    
+    @staticmethod
+    def _is_baidu_token_error(status_code, result):
+        """判断百度接口响应是否表示访问令牌无效或过期"""
+        if status_code == 401:
+            return True
+        return isinstance(result, dict) and result.get("error_code") in BAIDU_TOKEN_ERROR_CODES
+    
+    @staticmethod
+    def _check_baidu_rate_limit(result):
+        """百度接口以HTTP 200加错误码的方式表示限流，转换为ThrottledError交给限流器处理"""
+        if isinstance(result, dict) and result.get("error_code") in BAIDU_RATE_LIMIT_ERROR_CODES:
+            raise ThrottledError(f"百度接口限流: {result.get('error_msg', '')}")
+    
+    @staticmethod
+    def _response_truncated(result):
+        """判断OpenAI兼容接口或阿里云原生接口的响应是否因达到max_tokens而被截断"""
+        if not isinstance(result, dict):
+            return False
+        choices = result.get("choices") or [{}]
+        output = result.get("output") or {}
+        return choices[0].get("finish_reason") == "length" or output.get("finish_reason") == "length"
+    
+    def _attempt_timeout(self):
+        """本次尝试的(连接超时, 读取超时)，不超过当前调用截止时间的剩余时间"""
+        deadline = current_deadline()
+        if deadline is None:
+            timeouts = get_timeouts(None, None)
+            return timeouts["connect"], timeouts["read"]
+        return deadline.attempt_timeout()
+    
+    def _acquire_permit(self, provider, model, prompt):
+        """获取限流许可，等待时间不超过当前调用截止时间的剩余时间"""
+        deadline = current_deadline()
+        timeout = max(deadline.remaining(), 0) if deadline is not None else None
+        return self.rate_limiter.acquire(provider, model, prompt, timeout=timeout)
+    
+    def _retry_delay(self, error, attempt):
+        """重试前的等待秒数；剩余时间不够等待后再尝试一次时返回None"""
+        delay = self.rate_limiter.backoff(error, attempt)
+        deadline = current_deadline()
+        if deadline is not None and deadline.remaining() <= delay:
+            return None
+        return delay
+    
+    def _sleep_before_retry(self, error, attempt):
+        """重试前等待；剩余时间不够等待后再尝试一次时返回False，调用方应放弃重试"""
+        delay = self._retry_delay(error, attempt)
+        if delay is None:
+            return False
+        time.sleep(delay)
+        return True
+    
+    async def _asleep_before_retry(self, error, attempt):
+        """_sleep_before_retry的异步版本"""
+        delay = self._retry_delay(error, attempt)
+        if delay is None:
+            return False
+        await asyncio.sleep(delay)
+        return True
+    
+    def get_generation_params(self, model_name, template_name=None):
+        """
+        返回模型调用使用的生成参数；各调用路径按其中的max_tokens设置请求
+        
+        max_tokens取模板的输出预算，不超过模型本身的上限；没有模板时为模型本身的上限
+        """
+        provider = get_model_provider(model_name)
+        if provider == "alicloud":
+            _, max_tokens, _ = self._resolve_aliyun_model(model_name)
+            return {"temperature": 0.1, "top_p": 0.7,
+                    "max_tokens": self.output_budget.max_tokens(template_name, model_name, max_tokens)}
+        elif provider == "local":
+            return {"temperature": 0.01, "top_p": 0.3, "max_tokens": None}
+        elif provider == "openai":
+            return {"temperature": 0.1, "top_p": 0.7,
+                    "max_tokens": self.output_budget.max_tokens(template_name, model_name, OPENAI_MAX_TOKENS)}
+        return {"temperature": 0.1, "top_p": 0.7, "max_tokens": None}
     
-    def call_model(self, model_name, prompt, max_retries=3):
+    def call_model(self, model_name, prompt, max_retries=3, template_name=None, deadline=None, cancel_event=None):
         """
-        调用指定的模型
+        调用指定的模型，配置了响应缓存时优先读取缓存
+        
+        模型、提示词和生成参数都相同的调用正在进行时不再发送请求，等待并共享其结果
+        （发起方被取消或超过其自身截止时间时，结果和异常都不共享，等待方按自己的截止时间重新调用）
         
         Args:
             model_name: 模型名称
             prompt: 发送给模型的文本
             max_retries: 最大重试次数
+            template_name: 提示词模板名称，作为缓存键的一部分
+            deadline: 外部截止时间（time.monotonic()时间），与模型的总超时预算取较早者
+            cancel_event: 取消信号(threading.Event)，被设置后不再发起新的尝试，正在读取的流式输出立即关闭
         
         Returns:
             模型返回的文本内容
+        
+        Raises:
+            DeadlineExceeded: 超过截止时间，包括等待相同调用的结果超过截止时间
+        """
+        cache_key = self._cache_key(model_name, prompt, template_name)
+        try:
+            return self.single_flight.do(
+                cache_key,
+                lambda: self._call_model_once(model_name, prompt, max_retries, template_name, deadline,
+                                              cancel_event, cache_key),
+                **self._coalesce_options(model_name, deadline, cancel_event)
+            )
+        except WaitTimeout:
+            raise DeadlineExceeded(f"等待模型 {model_name} 的相同调用超过截止时间")
+    
+    def _cache_key(self, model_name, prompt, template_name):
+        """响应缓存和相同调用合并共用的键"""
+        # 被截断的输出不写入缓存，缓存中的输出与max_tokens无关，因此缓存键不包含按历史输出长度调整的max_tokens
+        params = self.get_generation_params(model_name, template_name)
+        return make_cache_key(model_name, template_name, prompt,
+                              {k: v for k, v in params.items() if k != "max_tokens"})
+    
+    @staticmethod
+    def _coalesce_options(model_name, deadline, cancel_event):
+        """
+        single_flight.do/ado的参数：等待时间以deadline为限；
+        发起方被取消时的None和超过其自身截止时间的异常不共享
+        """
+        cancelled = lambda result: result is None and cancel_event is not None and cancel_event.is_set()
+        return {
+            "label": model_name,
+            "timeout": None if deadline is None else max(deadline - time.monotonic(), 0),
+            "shareable": lambda result: not cancelled(result),
+            "shareable_error": lambda error: not isinstance(error, DeadlineExceeded)
+        }
+    
+    def _call_model_once(self, model_name, prompt, max_retries, template_name, deadline, cancel_event, cache_key):
+        """实际执行一次调用（读取缓存或请求服务商），记录输出长度并写入缓存；被截断的输出既不记录也不缓存"""
+        cached = self._cached_response(model_name, cache_key)
+        if cached is not None:
+            return cached
+        
+        start_time = time.time()
+        with truncation_scope() as truncation:
+            result = self._call_with_breaker(model_name, prompt, max_retries, deadline, template_name, cancel_event)
+        self._record_output(model_name, template_name, cache_key, result, truncation.truncated,
+                            time.time() - start_time)
+        return result
+    
+    def _cached_response(self, model_name, cache_key):
+        """读取响应缓存，未配置缓存或未命中时返回None"""
+        if self.response_cache is None:
+            return None
+        cached = self.response_cache.get(cache_key)
+        if cached is None:
+            return None
+        setup_logger(model_name).info(f"命中响应缓存: {model_name}")
+        return cached["response"]
+    
+    def _record_output(self, model_name, template_name, cache_key, result, truncated, elapsed):
+        """记录输出长度并写入缓存，被截断的输出既不记录也不缓存"""
+        if truncated:
+            setup_logger(model_name).warning(f"{model_name} 的输出达到max_tokens上限被截断，不写入缓存")
+            return
+        self.output_budget.observe(template_name, model_name, result)
+        if result is not None and self.response_cache is not None:
+            self.response_cache.put(cache_key, model_name, template_name, result, elapsed)
+    
+    def _output_limits(self, model_name, template_name):
+        """返回(模板的输出token预算, 模型本身的上限)"""
+        return (self.get_generation_params(model_name, template_name)["max_tokens"],
+                self.get_generation_params(model_name)["max_tokens"])
+    
+    @staticmethod
+    def _should_retry_truncated(model_name, result, truncation, max_tokens, model_limit):
+        """输出在低于模型上限的预算处被截断时返回True，并清除截断标记以便记录重试的结果"""
+        if result is None or not truncation.truncated or not max_tokens or not model_limit \
+                or max_tokens >= model_limit:
+            return False
+        setup_logger(model_name).warning(
+            f"{model_name} 的输出在 {max_tokens} tokens处被截断，按模型上限 {model_limit} 重试")
+        truncation.truncated = False
+        return True
+    
+    @staticmethod
+    def _record_breaker_outcome(breaker, call_deadline, result):
+        """按调用结果更新熔断器，被取消的调用不计为失败"""
+        if result is None and call_deadline.cancelled:
+            breaker.record_cancelled()
+        elif result is None:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    
+    def _call_with_breaker(self, model_name, prompt, max_retries=3, deadline=None, template_name=None,
+                           cancel_event=None):
+        """
+        经过模型熔断器调用服务商接口，所有重试共享模型的总超时预算；
+        按template_name确定输出token预算和流式调用提前结束的条件；被取消的调用不计为模型失败；
+        输出在预算处被截断时按模型本身的上限重试一次
+        
+        Raises:
+            DeadlineExceeded: 开始调用前已超过截止时间
+            CircuitOpenError: 模型熔断中
         """
+        call_deadline = Deadline.for_call(get_timeouts(get_model_provider(model_name), model_name), deadline,
+                                          cancel_event)
+        if call_deadline.expired():
+            raise DeadlineExceeded(f"模型 {model_name} 的调用已超过截止时间，未发送")
+        breaker = self.circuit_breakers.get(model_name)
+        breaker.allow()
+        try:
+            max_tokens, model_limit = self._output_limits(model_name, template_name)
+            call = self._call_hedged if self.hedging is not None else self._call_provider
+            with deadline_scope(call_deadline), stop_condition_scope(template_name), \
+                    truncation_scope() as truncation:
+                with max_tokens_scope(max_tokens):
+                    result = call(model_name, prompt, max_retries)
+                if self._should_retry_truncated(model_name, result, truncation, max_tokens, model_limit):
+                    with max_tokens_scope(model_limit):
+                        retried = call(model_name, prompt, max_retries)
+                    if retried is not None:
+                        result = retried
+                    else:
+                        truncation.truncated = True
+        except Exception:
+            if call_deadline.cancelled:
+                breaker.record_cancelled()
+            else:
+                breaker.record_failure()
+            raise
+        self._record_breaker_outcome(breaker, call_deadline, result)
+        return result
+    
+    def _hedge_target(self, model_name):
+        """
+        返回发送对冲请求的服务对象
+
+        配置了备用端点或备用API密钥时返回替换了这些设置的浅拷贝（共享连接池、限流器和熔断器），否则返回自身
+        """
+        target = self._hedge_targets.get(model_name)
+        if target is not None:
+            return target
+        settings = self.hedging.model_settings(model_name)
+        api_key = os.getenv(settings["api_key_env"], "") if settings["api_key_env"] else ""
+        if not settings["endpoints"] and not api_key:
+            target = self
+        else:
+            target = copy.copy(self)
+            target.model_endpoints = {**self.model_endpoints, **settings["endpoints"]}
+            if api_key:
+                target.api_key = target.openai_api_key = api_key
+        self._hedge_targets[model_name] = target
+        return target
+    
+    def _timed_call(self, target, model_name, prompt, max_retries, deadline):
+        """在deadline范围内通过target调用模型，成功时记录延迟，返回(结果, 完成时间)"""
+        start_time = time.monotonic()
+        with deadline_scope(deadline):
+            try:
+                result = target._call_provider(model_name, prompt, max_retries)
+            except Exception as e:
+                setup_logger(model_name).warning(f"{model_name} 调用异常: {str(e)}")
+                result = None
+        finished_at = time.monotonic()
+        if result is not None:
+            self.hedging.record_latency(model_name, finished_at - start_time)
+        return result, finished_at
+    
+    def _call_hedged(self, model_name, prompt, max_retries=3):
+        """
+        带对冲的同步调用：原请求超过模型近期p95延迟仍未返回时发送对冲请求，先成功的结果生效
+        
+        原请求在单独的线程中执行，不占用也不排队等待对冲线程池；调用方得到先成功的结果后立即返回，
+        另一个请求被取消：流式输出立即关闭，已经发出的非流式HTTP请求在后台读取结束后丢弃其结果
+        """
+        logger = setup_logger(model_name)
+        parent = current_deadline()
+        delay = self.hedging.hedge_delay(model_name)
+        if delay is None:
+            return self._timed_call(self, model_name, prompt, max_retries, parent)[0]
+        
+        deadlines = {"primary": parent.child(), "hedge": parent.child()}
+        primary = self._start_thread("llm-hedge-primary", self._timed_call, self, model_name, prompt, max_retries,
+                                     deadlines["primary"])
+        winner, result = self._wait_success({primary}, parent, delay)
+        if primary.done() or parent.expired() or not self.hedging.try_hedge(model_name):
+            if not primary.done():
+                winner, result = self._wait_success({primary}, parent)
+            if winner is None:
+                deadlines["primary"].cancel()
+            return result
+        
+        if self._hedge_executor is None:
+            with self.lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(max_workers=self.hedging.config["max_workers"],
+                                                              thread_name_prefix="llm-hedge")
+        logger.info(f"{model_name} 超过 {delay:.1f} 秒未返回，发送对冲请求")
+        # 对冲请求在调用方的上下文副本中执行，保留流式调用的提前结束条件等上下文变量
+        hedge = self._hedge_executor.submit(contextvars.copy_context().run, self._timed_call,
+                                            self._hedge_target(model_name), model_name, prompt, max_retries,
+                                            deadlines["hedge"])
+        winner, result = self._wait_success({primary, hedge}, parent)
+        returned_at = time.monotonic()
+        for deadline in deadlines.values():
+            deadline.cancel()
+        if winner is None:
+            self.hedging.record_outcome(model_name, hedge_won=False, loser_cancelled=False)
+            return None
+        
+        loser = primary if winner is hedge else hedge
+        loser_cancelled = not loser.done()
+        self.hedging.record_outcome(model_name, hedge_won=winner is hedge, loser_cancelled=loser_cancelled)
+        if winner is hedge:
+            logger.info(f"{model_name} 对冲请求先返回")
+            if loser_cancelled:
+                primary.add_done_callback(lambda future: self._record_primary_saving(model_name, future, returned_at))
+        return result
+    
+    def _record_primary_saving(self, model_name, future, returned_at):
+        """无法中断的原请求在对冲结果返回后仍然成功时，调用方比不对冲提前了这段时间返回"""
+        result, finished_at = future.result()
+        if result is not None:
+            self.hedging.record_saving(model_name, finished_at - returned_at)
+    
+    @staticmethod
+    def _start_thread(name, fn, *args):
+        """在调用方上下文的副本中用新的守护线程执行fn，返回其Future"""
+        future = Future()
+        context = contextvars.copy_context()
+        
+        def run():
+            try:
+                future.set_result(context.run(fn, *args))
+            except BaseException as e:
+                future.set_exception(e)
+        
+        threading.Thread(target=run, name=name, daemon=True).start()
+        return future
+    
+    @staticmethod
+    def _wait_success(futures, parent, timeout=None):
+        """
+        等待futures（结果为_timed_call的返回值）中第一个成功的请求，每隔CANCEL_POLL_INTERVAL秒检查一次取消信号
+        
+        Returns:
+            (成功的Future, 结果)；全部失败、超过timeout或parent过期、被取消时返回(None, None)
+        """
+        pending = set(futures)
+        until = None if timeout is None else time.monotonic() + timeout
+        while pending:
+            remaining = parent.remaining() if until is None else min(parent.remaining(), until - time.monotonic())
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=min(remaining, CANCEL_POLL_INTERVAL), return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()[0]
+                if result is not None:
+                    return future, result
+        return None, None
+    
+    def _call_provider(self, model_name, prompt, max_retries=3):
+        """根据模型所属服务商调用对应的接口"""
         logger = setup_logger(model_name)
         
         # 根据模型名称确定调用方法
-        if model_name.startswith("qwen") or model_name.startswith("deepseek"):
+        provider = get_model_provider(model_name)
+        if provider == "alicloud":
             logger.info(f"使用 阿里云API 调用: {model_name}")
             return self.call_aliyun_api(prompt, max_retries, model_name)
-        elif "chatglm" in model_name.lower():
+        elif provider == "local":
             logger.info(f"使用 ChatGLM API 调用: {model_name}")
             return self.call_chatglm_api(prompt, max_retries, model_name)
-        elif "ernie" in model_name.lower():
+        elif provider == "baidu":
             logger.info(f"使用百度文心 API 调用: {model_name}")
             return self.call_baidu_api(prompt, max_retries, model_name)
-        elif "gpt" in model_name.lower() and self.openai_api_key:
+        elif provider == "openai" and self.openai_api_key:
             logger.info(f"使用 OpenAI API 调用: {model_name}")
             return self.call_openai_api(prompt, max_retries, model_name)
         else:
             error_msg = f"未识别的模型名称: {model_name}，请检查配置"
             logger.error(error_msg)
             return None
-    
-    def call_aliyun_api(self, prompt, max_retries=3, model="qwen-turbo"):
+
+    def batch_request_body(self, model_name, prompt, template_name=None):
         """
-        调用阿里云API（支持Qwen, DeepSeek等模型）
-        
-        Args:
-            prompt: 发送给模型的文本
-            max_retries: 最大重试次数
-            model: 具体模型名称
-        
+        返回批处理任务中一次调用的请求体（OpenAI chat completions格式），参数与实时调用相同
+
         Returns:
-            模型返回的文本内容
+            (服务商名称, 请求体)；模型不支持OpenAI兼容的批处理接口时返回None
         """
-        logger = setup_logger(model)
+        provider = get_model_provider(model_name)
+        if provider == "alicloud":
+            model_id, _, use_compatible = self._resolve_aliyun_model(model_name)
+            if not use_compatible:
+                return None
+        elif provider == "openai":
+            model_id = model_name
+        else:
+            return None
+        params = self.get_generation_params(model_name, template_name)
+        body = {
+            "model": model_id,
+            "messages": [
+                {"role": "system", "content": "你是一个善于分析政策文本的助手。"},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": params["temperature"],
+            "top_p": params["top_p"]
+        }
+        if params["max_tokens"]:
+            body["max_tokens"] = params["max_tokens"]
+        return provider, body
+
+    def batch_client(self, provider):
+        """返回服务商批处理接口（文件上传和批处理任务）使用的OpenAI客户端"""
+        if provider == "alicloud":
+            base_url = self.model_endpoints.get("model_alicloud_compatible", ALIYUN_COMPATIBLE_BASE_URL)
+            return self.pools.get_openai_client("alicloud", base_url, self.api_key)
+        if provider == "openai":
+            base_url = self.model_endpoints.get("model_openai", OPENAI_BASE_URL)
+            return self.pools.get_openai_client("openai", base_url, self.openai_api_key)
+        raise ValueError(f"服务商 {provider} 不支持批处理接口")
+
+    def _resolve_aliyun_model(self, model):
+        """
+        解析阿里云模型的调用参数
         
+        Returns:
+            (实际模型ID, max_tokens, 是否使用OpenAI兼容模式)
+        """
         # 1. 根据模型类型定义正确的模型ID映射
         model_mapping = {
             # 通义千问系列模型映射
@@ -151,7 +608,25 @@ class LLMService:
 
         # 2. 确定使用的API调用方式
         # 对于通义千问系列和deepseek系列可以使用OpenAI兼容模式
-        if model.startswith("qwen") or model == "deepseek-v3" or model == "qwen-long" or model == "deepseek-r1":
+        use_compatible = model.startswith("qwen") or model == "deepseek-v3" or model == "qwen-long" or model == "deepseek-r1"
+        return actual_model_id, max_tokens_value, use_compatible
+    
+    def call_aliyun_api(self, prompt, max_retries=3, model="qwen-turbo"):
+        """
+        调用阿里云API（支持Qwen, DeepSeek等模型）
+        
+        Args:
+            prompt: 发送给模型的文本
+            max_retries: 最大重试次数
+            model: 具体模型名称
+        
+        Returns:
+            模型返回的文本内容
+        """
+        actual_model_id, max_tokens_value, use_compatible = self._resolve_aliyun_model(model)
+        # 通过call_model调用时使用按模板确定的输出预算
+        max_tokens_value = current_max_tokens() or max_tokens_value
+        if use_compatible:
             # 使用OpenAI兼容模式
             return self._call_aliyun_openai_compatible(prompt, actual_model_id, max_retries, max_tokens_value)
         else:
@@ -162,46 +637,112 @@ class LLMService:
         """使用OpenAI兼容模式调用阿里云API (适用于通义千问系列)"""
         logger = setup_logger(model)
         
+        base_url = self.model_endpoints.get("model_alicloud_compatible", ALIYUN_COMPATIBLE_BASE_URL)
+        
         for attempt in range(max_retries):
             try:
-                client = OpenAI(
-                    api_key=self.api_key,
-                    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-                )
+                client = self.pools.get_openai_client("alicloud", base_url, self.api_key)
                 
                 start_time = time.time()
                 logger.info(f"开始使用OpenAI兼容模式调用阿里云API: {model}")
                 
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": "你是一个善于分析政策文本的助手。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.1,
-                    top_p=0.7,
-                    max_tokens=max_tokens
-                )
+                messages = [
+                    {"role": "system", "content": "你是一个善于分析政策文本的助手。"},
+                    {"role": "user", "content": prompt}
+                ]
+                with self._acquire_permit("alicloud", model, prompt) as permit:
+                    if self.streaming:
+                        content = self._stream_chat_completion(client, model, messages, max_tokens, permit)
+                    else:
+                        response = client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            temperature=0.1,
+                            top_p=0.7,
+                            max_tokens=max_tokens,
+                            timeout=self._attempt_timeout()[1]
+                        )
+                        if getattr(response, "usage", None) is not None:
+                            permit.record_tokens(response.usage.total_tokens)
+                        if response.choices[0].finish_reason == "length":
+                            mark_truncated()
+                        content = response.choices[0].message.content
                 
                 elapsed_time = time.time() - start_time
                 logger.info(f"阿里云API响应时间: {elapsed_time:.2f}秒")
                 
-                return response.choices[0].message.content
+                return content
             
             except Exception as e:
                 logger.warning(f"调用阿里云API错误: {str(e)} (第{attempt+1}次重试)")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
+                if attempt < max_retries - 1 and self._sleep_before_retry(e, attempt):
+                    continue
                 else:
-                    logger.error(f"达到最大重试次数，放弃调用阿里云API，错误信息: {str(e)}")
+                    logger.error(f"达到最大重试次数或超过截止时间，放弃调用阿里云API，错误信息: {str(e)}")
                     return None
     
+    def _stream_chat_completion(self, client, model, messages, max_tokens, permit):
+        """
+        以流式方式调用OpenAI兼容接口，逐块拼接输出
+        
+        当前调用设置了提前结束条件（如housing模板的七个要素已完整）时，条件满足后立即关闭流；
+        调用被取消（如同一句子已达到法定数）时也立即关闭流；首个token（包括推理模型的思考内容）的到达时间记入stream_stats
+        
+        Returns:
+            拼接后的输出文本
+        """
+        start_time = time.monotonic()
+        stop_condition = current_stop_condition()
+        deadline = current_deadline()
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.1,
+            top_p=0.7,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=self._attempt_timeout()[1]
+        )
+        parts = []
+        first_token_seconds = None
+        stopped_early = False
+        try:
+            for chunk in stream:
+                if deadline is not None and deadline.cancelled:
+                    raise DeadlineExceeded(f"模型 {model} 的调用已取消")
+                if getattr(chunk, "usage", None) is not None:
+                    permit.record_tokens(chunk.usage.total_tokens)
+                if not chunk.choices:
+                    continue
+                if getattr(chunk.choices[0], "finish_reason", None) == "length":
+                    mark_truncated()
+                delta = chunk.choices[0].delta
+                text = delta.content or ""
+                if first_token_seconds is None and (text or getattr(delta, "reasoning_content", None)):
+                    first_token_seconds = time.monotonic() - start_time
+                if text:
+                    parts.append(text)
+                    if stop_condition is not None and stop_condition("".join(parts)):
+                        stopped_early = True
+                        break
+        finally:
+            # 提前结束时关闭连接，服务端随之停止生成
+            stream.close()
+        
+        content = "".join(parts)
+        self.stream_stats.record(model, first_token_seconds, stopped_early, len(content))
+        if stopped_early:
+            setup_logger(model).info(f"{model} 输出已完整，提前结束流式输出（首token {first_token_seconds:.2f}秒）")
+        return content
+    
     def _call_aliyun_native_api(self, prompt, model, max_retries=3, max_tokens=4000):
         """使用原生API调用阿里云API (适用于Baichuan、Llama等基础模型)"""
         logger = setup_logger(model)
         
         # 确定API路径
-        api_url = "https://dashscope.aliyuncs.com/api/v1/services/foundation-models/text-generation/generation"
+        api_url = self.model_endpoints.get("model_alicloud_native", ALIYUN_NATIVE_API_URL)
+        session = self.pools.get_session("alicloud", api_url)
         
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -229,13 +770,18 @@ class LLMService:
                     }
                 }
                 
-                response = requests.post(api_url, headers=headers, json=data)
-                response.raise_for_status()  # 如果请求失败，会抛出异常
+                with self._acquire_permit("alicloud", model, prompt) as permit:
+                    response = session.post(api_url, headers=headers, json=data, timeout=self._attempt_timeout())
+                    response.raise_for_status()  # 如果请求失败，会抛出异常
+                    result = response.json()
+                    if "total_tokens" in result.get("usage", {}):
+                        permit.record_tokens(result["usage"]["total_tokens"])
+                if self._response_truncated(result):
+                    mark_truncated()
                 
                 elapsed_time = time.time() - start_time
                 logger.info(f"阿里云API响应时间: {elapsed_time:.2f}秒")
                 
-                result = response.json()
                 # 根据阿里云API返回格式提取内容
                 if "output" in result and "text" in result["output"]:
                     return result["output"]["text"]
@@ -247,16 +793,17 @@ class LLMService:
                 
             except Exception as e:
                 logger.warning(f"调用阿里云API错误: {str(e)} (第{attempt+1}次重试)")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
+                if attempt < max_retries - 1 and self._sleep_before_retry(e, attempt):
+                    continue
                 else:
-                    logger.error(f"达到最大重试次数，放弃调用阿里云API，错误信息: {str(e)}")
+                    logger.error(f"达到最大重试次数或超过截止时间，放弃调用阿里云API，错误信息: {str(e)}")
                     return None
     
     def call_chatglm_api(self, prompt, max_retries=3, model="chatglm-local"):
         """调用本地ChatGLM API"""
         logger = setup_logger(model)
-        endpoint = self.model_endpoints.get("model_chatglm", "http://0.0.0.0:8002/chat")
+        endpoint = self.model_endpoints.get("model_chatglm", CHATGLM_DEFAULT_URL)
+        session = self.pools.get_session("local", endpoint)
         
         for attempt in range(max_retries):
             try:
@@ -271,34 +818,28 @@ class LLMService:
                 start_time = time.time()
                 logger.info(f"开始调用ChatGLM API...")
                 
-                response = requests.post(endpoint, headers=headers, json=data)
-                response.raise_for_status()
+                with self._acquire_permit("local", model, prompt):
+                    response = session.post(endpoint, headers=headers, json=data, timeout=self._attempt_timeout())
+                    response.raise_for_status()
+                    result = response.json()
                 
                 elapsed_time = time.time() - start_time
                 logger.info(f"ChatGLM API响应时间: {elapsed_time:.2f}秒")
                 
-                result = response.json()
                 return result.get("response", "")
             
             except Exception as e:
                 logger.warning(f"调用ChatGLM API错误: {str(e)} (第{attempt+1}次重试)")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
+                if attempt < max_retries - 1 and self._sleep_before_retry(e, attempt):
+                    continue
                 else:
-                    logger.error(f"达到最大重试次数，放弃调用ChatGLM API")
+                    logger.error(f"达到最大重试次数或超过截止时间，放弃调用ChatGLM API")
                     return None
     
     def call_baidu_api(self, prompt, max_retries=3, model="ernie-bot"):
         """调用百度文心API"""
         logger = setup_logger(model)
         
-        # 如果没有访问令牌，尝试获取
-        if not self.baidu_access_token:
-            self._get_baidu_access_token()
-            if not self.baidu_access_token:
-                logger.error("无法获取百度访问令牌，无法调用百度模型")
-                return None
-        
         # 根据模型名称选择合适的API端点
         model_map = {
             "ernie-bot-4": "/ernie-bot-4",
@@ -308,9 +849,16 @@ class LLMService:
         
         # 默认使用ernie-bot
         model_endpoint = model_map.get(model.lower(), "/ernie-bot")
-        api_url = f"https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat{model_endpoint}?access_token={self.baidu_access_token}"
+        base_url = self.model_endpoints.get("model_baidu", BAIDU_CHAT_BASE_URL)
+        session = self.pools.get_session("baidu", base_url)
         
         for attempt in range(max_retries):
+            # 每次尝试都从令牌管理器取令牌，过期或被刷新后自动使用新令牌
+            access_token = self.baidu_tokens.get_token()
+            if not access_token:
+                logger.error("无法获取百度访问令牌，无法调用百度模型")
+                return None
+            api_url = f"{base_url}{model_endpoint}?access_token={access_token}"
             try:
                 headers = {"Content-Type": "application/json"}
                 data = {
@@ -325,125 +873,494 @@ class LLMService:
                 start_time = time.time()
                 logger.info(f"开始调用百度文心API: {model}")
                 
-                response = requests.post(api_url, headers=headers, json=data)
-                response.raise_for_status()
+                with self._acquire_permit("baidu", model, prompt) as permit:
+                    response = session.post(api_url, headers=headers, json=data, timeout=self._attempt_timeout())
+                    result = response.json() if response.status_code in (200, 401) else None
+                    if self._is_baidu_token_error(response.status_code, result):
+                        # 令牌被拒绝：并发请求只会触发一次刷新，随后用新令牌重试
+                        logger.warning("百度访问令牌无效或已过期，刷新后重试")
+                        permit.release("error")
+                        self.baidu_tokens.invalidate(access_token)
+                        continue
+                    self._check_baidu_rate_limit(result)
+                    response.raise_for_status()
+                    if "total_tokens" in result.get("usage", {}):
+                        permit.record_tokens(result["usage"]["total_tokens"])
                 
                 elapsed_time = time.time() - start_time
                 logger.info(f"百度文心API响应时间: {elapsed_time:.2f}秒")
                 
-                result = response.json()
                 return result.get("result", "")
             
             except Exception as e:
                 logger.warning(f"调用百度文心API错误: {str(e)} (第{attempt+1}次重试)")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                else:
-                    logger.error(f"达到最大重试次数，放弃调用百度文心API")
-                    return None
+                if attempt < max_retries - 1 and not self._sleep_before_retry(e, attempt):
+                    break
+        
+        logger.error(f"达到最大重试次数或超过截止时间，放弃调用百度文心API")
+        return None
     
     def call_openai_api(self, prompt, max_retries=3, model="gpt-3.5-turbo"):
         """调用OpenAI API"""
         logger = setup_logger(model)
+        base_url = self.model_endpoints.get("model_openai", OPENAI_BASE_URL)
         
         for attempt in range(max_retries):
             try:
-                client = OpenAI(
-                    api_key=self.openai_api_key
-                )
+                client = self.pools.get_openai_client("openai", base_url, self.openai_api_key)
                 
                 start_time = time.time()
                 logger.info(f"开始调用OpenAI API: {model}")
                 
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": "你是一个善于分析政策文本的助手。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.1,
-                    top_p=0.7,
-                    max_tokens=4000
-                )
+                messages = [
+                    {"role": "system", "content": "你是一个善于分析政策文本的助手。"},
+                    {"role": "user", "content": prompt}
+                ]
+                max_tokens = current_max_tokens() or OPENAI_MAX_TOKENS
+                with self._acquire_permit("openai", model, prompt) as permit:
+                    if self.streaming:
+                        content = self._stream_chat_completion(client, model, messages, max_tokens, permit)
+                    else:
+                        response = client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            temperature=0.1,
+                            top_p=0.7,
+                            max_tokens=max_tokens,
+                            timeout=self._attempt_timeout()[1]
+                        )
+                        if getattr(response, "usage", None) is not None:
+                            permit.record_tokens(response.usage.total_tokens)
+                        if response.choices[0].finish_reason == "length":
+                            mark_truncated()
+                        content = response.choices[0].message.content
                 
                 elapsed_time = time.time() - start_time
                 logger.info(f"OpenAI API响应时间: {elapsed_time:.2f}秒")
                 
-                return response.choices[0].message.content
+                return content
             
             except Exception as e:
                 logger.warning(f"调用OpenAI API错误: {str(e)} (第{attempt+1}次重试)")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
+                if attempt < max_retries - 1 and self._sleep_before_retry(e, attempt):
+                    continue
                 else:
-                    logger.error(f"达到最大重试次数，放弃调用OpenAI API")
+                    logger.error(f"达到最大重试次数或超过截止时间，放弃调用OpenAI API")
                     return None
     
-    def process_prompts_parallel(self, models, prompt):
-        """并行处理同一个提示使用不同模型"""
-        threads = []
-        results = {}
-        self.lock = threading.Lock()
-
-        def worker(model_name):
+    def call_model_result(self, model_name, prompt, template_name=None, deadline=None, cancel_event=None):
+        """
+        调用模型并将结果包装为带状态和耗时的字典
+        
+        Returns:
+            包含content、time、status（以及失败时的error）的字典；cancel_event被设置导致调用未完成时status为skipped；
+            模型熔断中、请求没有发出时not_sent为"circuit_open"
+        """
+        logger = setup_logger(model_name)
+        start_time = time.time()
+        cancelled = lambda: cancel_event is not None and cancel_event.is_set()
+        try:
+            logger.info(f"开始处理模型 {model_name} 的请求...")
+            result = self.call_model(model_name, prompt, template_name=template_name, deadline=deadline,
+                                     cancel_event=cancel_event)
+            elapsed_time = time.time() - start_time
+            
+            if result is None and cancelled():
+                logger.info(f"模型 {model_name} 的调用已取消")
+                return {
+                    "content": None,
+                    "time": elapsed_time,
+                    "status": "skipped",
+                    "error": "调用已取消"
+                }
+            if result is None:
+                logger.error(f"模型 {model_name} 调用失败")
+                return {
+                    "content": None,
+                    "time": elapsed_time,
+                    "status": "error",
+                    "error": f"未识别的模型名称或API调用失败: {model_name}"
+                }
+            logger.info(f"模型 {model_name} 处理成功，耗时: {elapsed_time:.2f}秒")
+            return {
+                "content": result,
+                "time": elapsed_time,
+                "status": "success"
+            }
+        except CircuitOpenError as e:
+            return {
+                "content": None,
+                "time": time.time() - start_time,
+                "status": "error",
+                "error": str(e),
+                "not_sent": "circuit_open"
+            }
+        except DeadlineExceeded as e:
+            return {
+                "content": None,
+                "time": time.time() - start_time,
+                "status": "skipped" if cancelled() else "error",
+                "error": str(e)
+            }
+        except Exception as e:
+            error_msg = f"处理时发生异常: {str(e)}"
+            logger.error(f"模型 {model_name} {error_msg}")
+            return {
+                "content": None,
+                "time": time.time() - start_time,
+                "status": "error",
+                "error": error_msg
+            }
+    
+    def process_prompts_parallel(self, models, prompt, deadline=None, quorum=None):
+        """
+        并行处理同一个提示使用不同模型
+        
+        每个调用都受超时预算和deadline约束，超时的请求会被中断而不是留在后台继续运行；
+        给出quorum时，七个要素都有至少quorum个模型的输出一致后立即返回，尚未返回的调用被取消
+        （不再重试，流式输出立即关闭），在结果中标记为skipped
+        """
+        cancel_event = threading.Event() if quorum else None
+        executor = ThreadPoolExecutor(max_workers=max(1, len(models)), thread_name_prefix="llm-parallel")
+        try:
+            futures = {
+                executor.submit(self.call_model_result, model_name, prompt, deadline=deadline,
+                                cancel_event=cancel_event): model_name
+                for model_name in models
+            }
+            start_time = time.time()
+            results = {}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if quorum and len(results) < len(models) and housing_quorum(
+                        [r["content"] for r in results.values() if r["status"] == "success"], quorum) is not None:
+                    cancel_event.set()
+                    break
+        finally:
+            executor.shutdown(wait=cancel_event is None or not cancel_event.is_set(), cancel_futures=True)
+        for model_name in models:
+            if model_name not in results:
+                results[model_name] = {"content": None, "time": time.time() - start_time, "status": "skipped",
+                                       "error": QUORUM_SKIPPED}
+        return {model_name: results[model_name] for model_name in models}
+    
+    async def acall_model(self, model_name, prompt, max_retries=3, deadline=None, template_name=None,
+                          cancel_event=None):
+        """
+        call_model的异步版本，使用非阻塞HTTP请求调用指定的模型
+        
+        与call_model共用响应缓存、相同调用合并（同步和异步调用方之间也会合并）、输出token预算及截断重试、
+        熔断器和取消信号；异步调用不使用流式输出
+        
+        Args:
+            model_name: 模型名称
+            prompt: 发送给模型的文本
+            max_retries: 最大重试次数
+            deadline: 外部截止时间（time.monotonic()时间），与模型的总超时预算取较早者
+            template_name: 提示词模板名称，作为缓存键的一部分并用于确定输出token预算
+            cancel_event: 取消信号(threading.Event)，被设置后正在进行的请求所在的协程被取消
+        
+        Returns:
+            模型返回的文本内容，失败、被取消或超过截止时间时返回None
+        
+        Raises:
+            DeadlineExceeded: 开始调用前已超过截止时间，包括等待相同调用的结果超过截止时间
+            CircuitOpenError: 模型熔断中
+        """
+        cache_key = self._cache_key(model_name, prompt, template_name)
+        try:
+            return await self.single_flight.ado(
+                cache_key,
+                lambda: self._acall_model_once(model_name, prompt, max_retries, template_name, deadline,
+                                               cancel_event, cache_key),
+                **self._coalesce_options(model_name, deadline, cancel_event)
+            )
+        except WaitTimeout:
+            raise DeadlineExceeded(f"等待模型 {model_name} 的相同调用超过截止时间")
+    
+    async def _acall_model_once(self, model_name, prompt, max_retries, template_name, deadline, cancel_event,
+                                cache_key):
+        """_call_model_once的异步版本，缓存读写在线程中进行"""
+        cached = await asyncio.to_thread(self._cached_response, model_name, cache_key)
+        if cached is not None:
+            return cached
+        
+        start_time = time.time()
+        with truncation_scope() as truncation:
+            result = await self._acall_with_breaker(model_name, prompt, max_retries, deadline, template_name,
+                                                    cancel_event)
+        await asyncio.to_thread(self._record_output, model_name, template_name, cache_key, result,
+                                truncation.truncated, time.time() - start_time)
+        return result
+    
+    async def _acall_with_breaker(self, model_name, prompt, max_retries=3, deadline=None, template_name=None,
+                                  cancel_event=None):
+        """_call_with_breaker的异步版本，超过截止时间或被取消时取消正在进行的请求所在的协程"""
+        call_deadline = Deadline.for_call(get_timeouts(get_model_provider(model_name), model_name), deadline,
+                                          cancel_event)
+        if call_deadline.expired():
+            raise DeadlineExceeded(f"模型 {model_name} 的调用已超过截止时间，未发送")
+        breaker = self.circuit_breakers.get(model_name)
+        breaker.allow()
+        max_tokens, model_limit = self._output_limits(model_name, template_name)
+        call = self._acall_hedged if self.hedging is not None else self._acall_provider
+        try:
+            with deadline_scope(call_deadline), truncation_scope() as truncation:
+                with max_tokens_scope(max_tokens):
+                    result = await self._await_cancellable(call(model_name, prompt, max_retries), call_deadline)
+                if self._should_retry_truncated(model_name, result, truncation, max_tokens, model_limit):
+                    with max_tokens_scope(model_limit):
+                        retried = await self._await_cancellable(call(model_name, prompt, max_retries),
+                                                                call_deadline)
+                    if retried is not None:
+                        result = retried
+                    else:
+                        truncation.truncated = True
+        except asyncio.CancelledError:
+            breaker.record_cancelled()
+            raise
+        except asyncio.TimeoutError:
+            if call_deadline.cancelled:
+                setup_logger(model_name).info(f"异步调用 {model_name} 已取消")
+            else:
+                setup_logger(model_name).error(f"异步调用 {model_name} 超过截止时间，已取消")
+            result = None
+        except Exception:
+            if call_deadline.cancelled:
+                breaker.record_cancelled()
+            else:
+                breaker.record_failure()
+            raise
+        self._record_breaker_outcome(breaker, call_deadline, result)
+        return result
+    
+    @staticmethod
+    async def _await_cancellable(coroutine, call_deadline):
+        """
+        等待协程完成；超过截止时间或取消信号被设置时取消协程并抛出asyncio.TimeoutError
+        
+        取消信号是threading.Event，无法直接等待，每隔CANCEL_POLL_INTERVAL秒检查一次
+        """
+        task = asyncio.ensure_future(coroutine)
+        try:
+            while True:
+                remaining = call_deadline.remaining()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                done, _ = await asyncio.wait({task}, timeout=min(remaining, CANCEL_POLL_INTERVAL))
+                if done:
+                    return task.result()
+        finally:
+            task.cancel()
+    
+    async def _atimed_call(self, target, model_name, prompt, max_retries):
+        """_timed_call的异步版本"""
+        start_time = time.monotonic()
+        try:
+            result = await target._acall_provider(model_name, prompt, max_retries)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            setup_logger(model_name).warning(f"{model_name} 异步调用异常: {str(e)}")
+            result = None
+        if result is not None:
+            self.hedging.record_latency(model_name, time.monotonic() - start_time)
+        return result
+    
+    async def _acall_hedged(self, model_name, prompt, max_retries=3):
+        """_call_hedged的异步版本，落败的请求所在的协程被直接取消"""
+        delay = self.hedging.hedge_delay(model_name)
+        if delay is None:
+            return await self._atimed_call(self, model_name, prompt, max_retries)
+        
+        primary = asyncio.create_task(self._atimed_call(self, model_name, prompt, max_retries))
+        tasks = {primary: "primary"}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self.hedging.try_hedge(model_name):
+                return await primary
+            
+            setup_logger(model_name).info(f"{model_name} 超过 {delay:.1f} 秒未返回，发送对冲请求")
+            hedge = asyncio.create_task(self._atimed_call(self._hedge_target(model_name), model_name, prompt,
+                                                          max_retries))
+            tasks[hedge] = "hedge"
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        self.hedging.record_outcome(model_name, hedge_won=tasks[task] == "hedge",
+                                                    loser_cancelled=bool(pending))
+                        return result
+            self.hedging.record_outcome(model_name, hedge_won=False, loser_cancelled=False)
+            return None
+        finally:
+            # 返回、异常或外层超时取消时，取消仍未完成的请求
+            for task in tasks:
+                task.cancel()
+    
+    async def _acall_provider(self, model_name, prompt, max_retries=3):
+        """根据模型所属服务商构造请求并异步发送"""
+        logger = setup_logger(model_name)
+        provider = get_model_provider(model_name)
+        messages = [
+            {"role": "system", "content": "你是一个善于分析政策文本的助手。"},
+            {"role": "user", "content": prompt}
+        ]
+        
+        if provider == "alicloud":
+            actual_model_id, max_tokens, use_compatible = self._resolve_aliyun_model(model_name)
+            max_tokens = current_max_tokens() or max_tokens
+            headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+            if use_compatible:
+                base_url = self.model_endpoints.get("model_alicloud_compatible", ALIYUN_COMPATIBLE_BASE_URL)
+                url = f"{base_url.rstrip('/')}/chat/completions"
+                data = {"model": actual_model_id, "messages": messages,
+                        "temperature": 0.1, "top_p": 0.7, "max_tokens": max_tokens}
+                extract = lambda result: result["choices"][0]["message"]["content"]
+            else:
+                url = self.model_endpoints.get("model_alicloud_native", ALIYUN_NATIVE_API_URL)
+                data = {"model": actual_model_id, "input": {"messages": messages},
+                        "parameters": {"temperature": 0.1, "top_p": 0.7, "max_tokens": max_tokens}}
+                extract = lambda result: result["output"].get("text") or result["output"].get("message")
+        elif provider == "local":
+            url = self.model_endpoints.get("model_chatglm", CHATGLM_DEFAULT_URL)
+            headers = {"Content-Type": "application/json"}
+            data = {"prompt": prompt, "history": [], "temperature": 0.01, "top_p": 0.3}
+            extract = lambda result: result.get("response", "")
+        elif provider == "baidu":
+            access_token = await asyncio.to_thread(self.baidu_tokens.get_token)
+            if not access_token:
+                logger.error("无法获取百度访问令牌，无法调用百度模型")
+                return None
+            model_map = {
+                "ernie-bot-4": "/ernie-bot-4",
+                "ernie-bot": "/ernie-bot",
+                "ernie-bot-turbo": "/ernie-bot-turbo"
+            }
+            base_url = self.model_endpoints.get("model_baidu", BAIDU_CHAT_BASE_URL)
+            url = f"{base_url}{model_map.get(model_name.lower(), '/ernie-bot')}?access_token={access_token}"
+            headers = {"Content-Type": "application/json"}
+            data = {"messages": messages, "temperature": 0.1, "top_p": 0.7}
+            extract = lambda result: result.get("result", "")
+        elif provider == "openai" and self.openai_api_key:
+            base_url = self.model_endpoints.get("model_openai", OPENAI_BASE_URL)
+            url = f"{base_url.rstrip('/')}/chat/completions"
+            headers = {"Authorization": f"Bearer {self.openai_api_key}", "Content-Type": "application/json"}
+            data = {"model": model_name, "messages": messages,
+                    "temperature": 0.1, "top_p": 0.7, "max_tokens": current_max_tokens() or OPENAI_MAX_TOKENS}
+            extract = lambda result: result["choices"][0]["message"]["content"]
+        else:
+            logger.error(f"未识别的模型名称: {model_name}，请检查配置")
+            return None
+        
+        session = self.pools.get_async_session(provider)
+        for attempt in range(max_retries):
             try:
                 start_time = time.time()
-                logger = setup_logger(model_name)
-                logger.info(f"开始处理模型 {model_name} 的请求...")
+                logger.info(f"开始异步调用模型: {model_name}")
+                connect_timeout, read_timeout = self._attempt_timeout()
+                permit = await self.rate_limiter.aacquire(provider, model_name, prompt,
+                                                          timeout=current_deadline().remaining())
+                with permit:
+                    timeout = aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout)
+                    async with session.post(url, headers=headers, json=data, timeout=timeout) as response:
+                        if provider == "baidu" and response.status in (200, 401):
+                            result = await response.json(content_type=None)
+                            if self._is_baidu_token_error(response.status, result):
+                                logger.warning("百度访问令牌无效或已过期，刷新后重试")
+                                permit.release("error")
+                                fresh_token = await asyncio.to_thread(self.baidu_tokens.invalidate, access_token)
+                                if not fresh_token:
+                                    return None
+                                url = url.replace(f"access_token={access_token}", f"access_token={fresh_token}")
+                                access_token = fresh_token
+                                continue
+                            self._check_baidu_rate_limit(result)
+                        response.raise_for_status()
+                        result = await response.json(content_type=None)
+                    usage = result.get("usage") if isinstance(result, dict) else None
+                    if usage and "total_tokens" in usage:
+                        permit.record_tokens(usage["total_tokens"])
+                if self._response_truncated(result):
+                    mark_truncated()
                 
-                result = self.call_model(model_name, prompt)
                 elapsed_time = time.time() - start_time
-
-                if result is None:
-                    with self.lock:
-                        results[model_name] = {
-                            "content": None,
-                            "time": elapsed_time,
-                            "status": "error",
-                            "error": f"未识别的模型名称或API调用失败: {model_name}"
-                        }
-                        logger.error(f"模型 {model_name} 调用失败")
-                else:
-                    with self.lock:
-                        results[model_name] = {
-                            "content": result,
-                            "time": elapsed_time,
-                            "status": "success"
-                        }
-                        logger.info(f"模型 {model_name} 处理成功，耗时: {elapsed_time:.2f}秒")
-
+                logger.info(f"{model_name} 异步调用响应时间: {elapsed_time:.2f}秒")
+                return extract(result)
+            
             except Exception as e:
-                error_msg = f"处理时发生异常: {str(e)}"
-                logger.error(f"模型 {model_name} {error_msg}")
-                with self.lock:
-                    results[model_name] = {
-                        "content": None,
-                        "time": time.time() - start_time if 'start_time' in locals() else 0,
-                        "status": "error",
-                        "error": error_msg
-                    }
+                logger.warning(f"异步调用 {model_name} 错误: {str(e)} (第{attempt+1}次重试)")
+                if attempt < max_retries - 1 and await self._asleep_before_retry(e, attempt):
+                    continue
+                else:
+                    logger.error(f"达到最大重试次数或超过截止时间，放弃异步调用 {model_name}")
+                    return None
+    
+    async def acall_model_result(self, model_name, prompt, deadline=None, template_name=None, cancel_event=None):
+        """call_model_result的异步版本"""
+        logger = setup_logger(model_name)
+        start_time = time.time()
+        cancelled = lambda: cancel_event is not None and cancel_event.is_set()
+        try:
+            result = await self.acall_model(model_name, prompt, deadline=deadline, template_name=template_name,
+                                            cancel_event=cancel_event)
+        except CircuitOpenError as e:
+            return {"content": None, "time": time.time() - start_time, "status": "error", "error": str(e),
+                    "not_sent": "circuit_open"}
+        except DeadlineExceeded as e:
+            return {"content": None, "time": time.time() - start_time,
+                    "status": "skipped" if cancelled() else "error", "error": str(e)}
+        except Exception as e:
+            error_msg = f"处理时发生异常: {str(e)}"
+            logger.error(f"模型 {model_name} {error_msg}")
+            return {"content": None, "time": time.time() - start_time, "status": "error", "error": error_msg}
         
-        # 创建并启动线程
-        for model_name in models:
-            thread = threading.Thread(target=worker, args=(model_name,))
-            thread.daemon = True  # 设置为后台线程
-            threads.append(thread)
-            thread.start()
-
-        # 等待所有线程完成，添加超时处理
-        for thread in threads:
-            thread.join(timeout=300)  # 设置5分钟超时
-            
-        # 检查是否所有模型都有结果
+        elapsed_time = time.time() - start_time
+        if result is None and cancelled():
+            return {"content": None, "time": elapsed_time, "status": "skipped", "error": "调用已取消"}
+        if result is None:
+            return {
+                "content": None,
+                "time": elapsed_time,
+                "status": "error",
+                "error": f"未识别的模型名称或API调用失败: {model_name}"
+            }
+        return {"content": result, "time": elapsed_time, "status": "success"}
+    
+    async def aprocess_prompts(self, models, prompt, deadline=None, quorum=None):
+        """
+        process_prompts_parallel的异步版本，在同一个事件循环中并发调用多个模型
+        
+        deadline和quorum的含义相同；达到quorum后尚未返回的调用所在的协程被取消，在结果中标记为skipped
+        """
+        cancel_event = threading.Event() if quorum else None
+        tasks = {
+            asyncio.ensure_future(self.acall_model_result(model_name, prompt, deadline=deadline,
+                                                          cancel_event=cancel_event)): model_name
+            for model_name in models
+        }
+        start_time = time.time()
+        results = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results[tasks[task]] = task.result()
+                if quorum and pending and housing_quorum(
+                        [r["content"] for r in results.values() if r["status"] == "success"], quorum) is not None:
+                    cancel_event.set()
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
         for model_name in models:
             if model_name not in results:
-                results[model_name] = {
-                    "content": None,
-                    "status": "error",
-                    "error": "处理超时或线程未正常完成"
-                }
-
-        return results
+                results[model_name] = {"content": None, "time": time.time() - start_time, "status": "skipped",
+                                       "error": QUORUM_SKIPPED}
+        return {model_name: results[model_name] for model_name in models}
 
 def call_models(prompt, models=None):
     """
@@ -493,4 +1410,4 @@ def save_results_to_json(results, output_dir, filename_prefix="model_comparison"
     return output_file
 
 # 导出的函数和类
-__all__ = ['LLMService', 'call_models', 'save_results_to_json', 'setup_logger']
\ No newline at end of file
+__all__ = ['LLMService', 'call_models', 'save_results_to_json', 'setup_logger', 'get_model_provider']
\ No newline at end of file
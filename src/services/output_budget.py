@@ -0,0 +1,197 @@
+"""
+输出token预算
+按模板和模型确定每次调用的max_tokens：默认值来自TEMPLATE_OUTPUT_BUDGETS，
+再根据历史运行报告中记录的输出长度分布自动调整，MODEL_OUTPUT_BUDGET_OVERRIDES中的设置优先
+"""
+
+import os
+import glob
+import json
+import math
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from src.config.model_config import OUTPUT_BUDGET_CONFIG
+from src.config.prompt_templates import TEMPLATE_OUTPUT_BUDGETS, MODEL_OUTPUT_BUDGET_OVERRIDES
+
+logger = logging.getLogger(__name__)
+
+# 运行报告中记录输出长度分布的段落名称
+REPORT_SECTION = "输出长度统计"
+
+
+def histogram_percentile(histogram, p, bucket_size):
+    """
+    从分桶计数中估算第p百分位（取所在分桶的上界）
+
+    Args:
+        histogram: 分桶下界（字符串） -> 次数
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+    threshold = p / 100 * total
+    seen = 0
+    for lower in sorted(histogram, key=int):
+        seen += histogram[lower]
+        if seen >= threshold:
+            return int(lower) + bucket_size
+    return int(max(histogram, key=int)) + bucket_size
+
+
+def tune_budgets(histograms, config=None):
+    """
+    根据输出长度分布计算各(模板, 模型)的预算
+
+    Args:
+        histograms: 模板 -> 模型 -> 分桶计数，即运行报告中的“输出长度统计”
+        config: 结构同OUTPUT_BUDGET_CONFIG
+
+    Returns:
+        模板 -> 模型 -> 预算token数，只包含样本数足够的组合
+    """
+    config = config or OUTPUT_BUDGET_CONFIG
+    tuned = {}
+    for template_name, models in histograms.items():
+        for model_name, histogram in models.items():
+            if sum(histogram.values()) < config["min_samples"]:
+                continue
+            length = histogram_percentile(histogram, config["percentile"], config["bucket_size"])
+            budget = max(config["min_tokens"], int(math.ceil(length * config["headroom"])))
+            tuned.setdefault(template_name, {})[model_name] = budget
+    return tuned
+
+
+def load_histograms(output_dir, limit=None):
+    """
+    读取输出目录下最近的运行报告，合并其中的输出长度分布
+
+    Args:
+        output_dir: 输出目录，运行报告位于其下各模板子目录中
+        limit: 最多读取的报告数，如果为None则使用OUTPUT_BUDGET_CONFIG中的history_reports
+    """
+    limit = limit or OUTPUT_BUDGET_CONFIG["history_reports"]
+    paths = sorted(glob.glob(os.path.join(output_dir, "*", "run_report_*.json")),
+                   key=os.path.getmtime, reverse=True)[:limit]
+    merged = {}
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                section = json.load(f).get(REPORT_SECTION, {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取运行报告失败 {path}: {str(e)}")
+            continue
+        for template_name, models in section.items():
+            for model_name, histogram in models.items():
+                target = merged.setdefault(template_name, {}).setdefault(model_name, {})
+                for lower, count in histogram.items():
+                    target[lower] = target.get(lower, 0) + count
+    return merged
+
+
+class OutputBudget:
+    def __init__(self, tuned=None, config=None):
+        """
+        初始化输出预算
+
+        Args:
+            tuned: tune_budgets的结果，为None时只使用默认预算
+            config: 结构同OUTPUT_BUDGET_CONFIG，如果为None则使用OUTPUT_BUDGET_CONFIG
+        """
+        self.config = config or OUTPUT_BUDGET_CONFIG
+        self.tuned = tuned or {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_history(cls, output_dir, config=None):
+        """按输出目录中历史运行报告的输出长度分布创建自动调整的预算"""
+        config = config or OUTPUT_BUDGET_CONFIG
+        tuned = tune_budgets(load_histograms(output_dir, config["history_reports"]), config)
+        if tuned:
+            logger.info(f"按历史输出长度调整的输出预算: {tuned}")
+        return cls(tuned, config)
+
+    def max_tokens(self, template_name, model_name, model_limit):
+        """
+        返回一次调用的max_tokens，不超过模型上限model_limit
+
+        没有模板（或模板没有预算）时返回model_limit
+        """
+        override = MODEL_OUTPUT_BUDGET_OVERRIDES.get(model_name, {}).get(template_name)
+        budget = override or self.tuned.get(template_name, {}).get(model_name) \
+            or TEMPLATE_OUTPUT_BUDGETS.get(template_name)
+        if budget is None:
+            return model_limit
+        return min(budget, model_limit) if model_limit else budget
+
+    def observe(self, template_name, model_name, output_text):
+        """记录一次调用的输出长度（字符数，近似为token数）"""
+        if not template_name or output_text is None:
+            return
+        lower = str(len(output_text) // self.config["bucket_size"] * self.config["bucket_size"])
+        with self._lock:
+            histogram = self.histograms.setdefault(template_name, {}).setdefault(model_name, {})
+            histogram[lower] = histogram.get(lower, 0) + 1
+
+    def snapshot(self):
+        """返回本次运行的输出长度分布，写入运行报告后供后续运行调整预算"""
+        with self._lock:
+            return {template_name: {model_name: dict(histogram) for model_name, histogram in models.items()}
+                    for template_name, models in self.histograms.items()}
+
+
+_max_tokens = contextvars.ContextVar("llm_max_tokens", default=None)
+
+
+def current_max_tokens():
+    """返回当前调用的max_tokens，不在max_tokens_scope中时返回None"""
+    return _max_tokens.get()
+
+
+@contextmanager
+def max_tokens_scope(max_tokens):
+    """在with块内将max_tokens设为当前调用的输出预算，各调用路径据此设置请求参数"""
+    token = _max_tokens.set(max_tokens)
+    try:
+        yield max_tokens
+    finally:
+        _max_tokens.reset(token)
+
+
+class OutputTruncation:
+    """记录一次调用的输出是否因达到max_tokens而被截断"""
+
+    def __init__(self):
+        self.truncated = False
+
+
+_truncation = contextvars.ContextVar("llm_output_truncation", default=None)
+
+
+def mark_truncated():
+    """服务商返回finish_reason为length时由各调用路径调用，不在truncation_scope中时忽略"""
+    truncation = _truncation.get()
+    if truncation is not None:
+        truncation.truncated = True
+
+
+@contextmanager
+def truncation_scope():
+    """
+    在with块内记录输出是否被截断，已在truncation_scope中时沿用外层的记录
+
+    对冲请求等在上下文副本中执行的调用共享同一个记录对象
+    """
+    truncation = _truncation.get()
+    if truncation is not None:
+        yield truncation
+        return
+    truncation = OutputTruncation()
+    token = _truncation.set(truncation)
+    try:
+        yield truncation
+    finally:
+        _truncation.reset(token)
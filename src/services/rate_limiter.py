@@ -0,0 +1,327 @@
+"""
+自适应限流
+按服务商和模型两级维护请求数/分钟与token数/分钟的令牌桶，并用AIMD（加性增、乘性减）自动调整并发上限：
+调用成功时并发上限缓慢增加，遇到429/503时减半，并遵守服务端返回的Retry-After
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+from src.config.model_config import RATE_LIMIT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 表示被限流的HTTP状态码
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+class ThrottledError(Exception):
+    """服务端以非HTTP状态码的方式（例如响应体中的错误码）表示被限流"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """解析Retry-After头（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def throttle_info(error):
+    """
+    判断异常是否表示被限流
+
+    支持requests.HTTPError、OpenAI客户端的APIStatusError、aiohttp.ClientResponseError和ThrottledError
+
+    Returns:
+        (是否被限流, Retry-After秒数或None)
+    """
+    if isinstance(error, ThrottledError):
+        return True, error.retry_after
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    headers = getattr(error, "headers", None)
+    response = getattr(error, "response", None)
+    if response is not None:
+        status = status or getattr(response, "status_code", None) or getattr(response, "status", None)
+        headers = headers or getattr(response, "headers", None)
+    if status not in THROTTLE_STATUS_CODES:
+        return False, None
+    return True, parse_retry_after(headers.get("Retry-After") if headers else None)
+
+
+class TokenBucket:
+    """按分钟配额匀速补充的令牌桶，容量为一分钟的配额"""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """取出amount个令牌需要等待的秒数"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta):
+        """按实际用量修正预扣的令牌数，delta为正表示实际用量多于预估"""
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class _Limit:
+    """单个服务商或模型的限流状态"""
+
+    def __init__(self, name, settings, config):
+        self.name = name
+        self.settings = settings
+        self.config = config
+        rpm = settings.get("requests_per_minute")
+        tpm = settings.get("tokens_per_minute")
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.concurrency = float(settings["initial_concurrency"])
+        self.active = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.stats = {"requests": 0, "throttled": 0, "wait_seconds": 0.0}
+
+    def wait_time(self, tokens, now):
+        """
+        返回需要等待的秒数；0表示可以立即发送，None表示需要等待其他请求完成（并发已满）
+        """
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        waits = [0.0]
+        if self.request_bucket is not None:
+            waits.append(self.request_bucket.wait_time(1, now))
+        if self.token_bucket is not None:
+            waits.append(self.token_bucket.wait_time(tokens, now))
+        if max(waits) > 0:
+            return max(waits)
+        if self.active >= int(self.concurrency):
+            return None
+        return 0.0
+
+    def take(self, tokens, now):
+        if self.request_bucket is not None:
+            self.request_bucket.take(1, now)
+        if self.token_bucket is not None:
+            self.token_bucket.take(tokens, now)
+        self.active += 1
+        self.stats["requests"] += 1
+
+    def on_success(self):
+        # 加性增：每完成一个"窗口"（约等于当前并发数个请求）并发上限加additive_increase
+        increase = self.config["additive_increase"] / max(self.concurrency, 1.0)
+        self.concurrency = min(self.settings["max_concurrency"], self.concurrency + increase)
+
+    def on_throttle(self, retry_after, now):
+        self.stats["throttled"] += 1
+        # 同一波并发请求同时被限流时只减一次，避免并发上限瞬间降到最低
+        if now - self.last_decrease >= self.config["decrease_cooldown"]:
+            self.concurrency = max(self.settings["min_concurrency"],
+                                   self.concurrency * self.config["multiplicative_decrease"])
+            self.last_decrease = now
+        delay = retry_after if retry_after is not None else self.config["throttle_backoff"]
+        self.blocked_until = max(self.blocked_until, now + delay)
+
+
+class RatePermit:
+    """一次调用占用的限流许可，作为上下文管理器使用时根据是否抛出限流异常自动释放"""
+
+    def __init__(self, limiter, limits, reserved_tokens):
+        self.limiter = limiter
+        self.limits = limits
+        self.reserved_tokens = reserved_tokens
+        self._released = False
+
+    def record_tokens(self, used_tokens):
+        """用接口返回的实际token用量修正预扣量"""
+        self.limiter._adjust_tokens(self.limits, used_tokens - self.reserved_tokens)
+
+    def release(self, outcome="success", retry_after=None):
+        """
+        释放许可
+
+        Args:
+            outcome: success、throttled或error；只有success和throttled会调整并发上限
+            retry_after: 被限流时服务端要求的等待秒数
+        """
+        if not self._released:
+            self._released = True
+            self.limiter._release(self.limits, outcome, retry_after)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.release("success")
+            return False
+        throttled, retry_after = throttle_info(exc)
+        self.release("throttled" if throttled else "error", retry_after)
+        return False
+
+
+class RateLimiter:
+    def __init__(self, config=None):
+        """
+        初始化限流器
+
+        Args:
+            config: 限流配置，结构同RATE_LIMIT_CONFIG，如果为None则使用RATE_LIMIT_CONFIG
+        """
+        self.config = config or RATE_LIMIT_CONFIG
+        self._limits = {}
+        self._cond = threading.Condition()
+
+    def _settings(self, kind, name):
+        settings = dict(self.config["default"])
+        settings.update(self.config.get(kind, {}).get(name, {}))
+        return settings
+
+    def _get_limits(self, provider, model_name):
+        keys = [("providers", provider), ("models", model_name)]
+        limits = []
+        for kind, name in keys:
+            key = f"{kind}:{name}"
+            limit = self._limits.get(key)
+            if limit is None:
+                limit = _Limit(key, self._settings(kind, name), self.config)
+                self._limits[key] = limit
+            limits.append(limit)
+        return limits
+
+    def estimate_tokens(self, prompt):
+        """预估一次调用消耗的token数：提示词长度加预期输出长度"""
+        return len(prompt) + self.config["expected_output_tokens"]
+
+    def _try_acquire(self, provider, model_name, tokens):
+        """在持有self._cond时尝试获取许可，返回(许可, 等待秒数)"""
+        now = time.monotonic()
+        limits = self._get_limits(provider, model_name)
+        waits = [limit.wait_time(tokens, now) for limit in limits]
+        if all(w == 0.0 for w in waits):
+            for limit in limits:
+                limit.take(tokens, now)
+            return RatePermit(self, limits, tokens), 0.0
+        known = [w for w in waits if w]
+        return None, max(known) if known else None
+
+    def acquire(self, provider, model_name, prompt, timeout=None):
+        """
+        获取一次调用的许可，配额不足或并发已满时阻塞等待
+
+        Args:
+            timeout: 最长等待秒数，None表示一直等待
+
+        Returns:
+            RatePermit，建议用with语句包住实际的请求
+
+        Raises:
+            TimeoutError: 等待超过timeout
+        """
+        tokens = self.estimate_tokens(prompt)
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                permit, wait = self._try_acquire(provider, model_name, tokens)
+                if permit is not None:
+                    self._record_wait(permit.limits, time.monotonic() - start)
+                    return permit
+                if timeout is not None:
+                    left = start + timeout - time.monotonic()
+                    if left <= 0:
+                        raise TimeoutError(f"等待 {model_name} 的限流许可超时")
+                    wait = left if wait is None else min(wait, left)
+                self._cond.wait(timeout=wait)
+
+    async def aacquire(self, provider, model_name, prompt, timeout=None):
+        """acquire的异步版本，等待期间不阻塞事件循环"""
+        tokens = self.estimate_tokens(prompt)
+        start = time.monotonic()
+        while True:
+            with self._cond:
+                permit, wait = self._try_acquire(provider, model_name, tokens)
+                if permit is not None:
+                    self._record_wait(permit.limits, time.monotonic() - start)
+                    return permit
+            if timeout is not None and time.monotonic() - start >= timeout:
+                raise TimeoutError(f"等待 {model_name} 的限流许可超时")
+            await asyncio.sleep(min(wait, 1.0) if wait else 0.05)
+
+    def _record_wait(self, limits, waited):
+        for limit in limits:
+            limit.stats["wait_seconds"] += waited
+
+    def _release(self, limits, outcome, retry_after):
+        now = time.monotonic()
+        with self._cond:
+            for limit in limits:
+                limit.active -= 1
+                if outcome == "success":
+                    limit.on_success()
+                elif outcome == "throttled":
+                    limit.on_throttle(retry_after, now)
+            self._cond.notify_all()
+        if outcome == "throttled":
+            logger.warning(f"{limits[-1].name} 被限流，并发上限降为 {limits[-1].concurrency:.1f}"
+                           + (f"，等待 {retry_after:.1f} 秒" if retry_after else ""))
+
+    def _adjust_tokens(self, limits, delta):
+        with self._cond:
+            for limit in limits:
+                if limit.token_bucket is not None:
+                    limit.token_bucket.adjust(delta)
+
+    def backoff(self, error, attempt):
+        """
+        重试前的等待秒数：被限流时由限流器在下次获取许可时等待（遵守Retry-After），这里不再额外等待；
+        其他错误使用指数退避
+        """
+        throttled, _ = throttle_info(error)
+        return 0 if throttled else 2 ** attempt
+
+    def stats(self):
+        """返回各服务商和模型的请求数、被限流次数、累计等待时间和当前并发上限"""
+        with self._cond:
+            return {
+                name: {**limit.stats, "wait_seconds": round(limit.stats["wait_seconds"], 2),
+                       "concurrency": round(limit.concurrency, 2)}
+                for name, limit in self._limits.items()
+            }
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_rate_limiter():
+    """返回进程内共享的限流器，同一进程中的所有LLMService共用服务商和模型的配额"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter()
+        return _shared_limiter
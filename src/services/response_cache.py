@@ -0,0 +1,184 @@
+"""
+模型响应缓存
+以(模型, 模板, 提示词, 生成参数)的哈希为键，将模型响应持久化到本地SQLite文件，支持按大小和时间的LRU淘汰
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from src.config.model_config import RESPONSE_CACHE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 缓存模式
+# readwrite: 读取并写入缓存；readonly: 只读取不写入；refresh: 不读取但写入新结果；bypass: 完全不使用缓存
+CACHE_MODES = ("readwrite", "readonly", "refresh", "bypass")
+
+
+def make_cache_key(model_id, template_name, prompt, params):
+    """
+    计算缓存键
+
+    Args:
+        model_id: 模型名称
+        template_name: 模板名称，可为None
+        prompt: 渲染后的提示词
+        params: 生成参数字典（temperature、top_p、max_tokens等）
+
+    Returns:
+        SHA-256十六进制字符串
+    """
+    payload = json.dumps([model_id, template_name, prompt, params], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=None, mode="readwrite", max_size_mb=None, max_age_days=None):
+        """
+        初始化响应缓存
+
+        Args:
+            cache_dir: 缓存目录，如果为None则使用RESPONSE_CACHE_CONFIG中的配置
+            mode: 缓存模式，见CACHE_MODES
+            max_size_mb: 缓存总大小上限（MB），超出时淘汰最久未访问的条目
+            max_age_days: 条目最长保留天数，超出时淘汰
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知的缓存模式: {mode}，可选值: {', '.join(CACHE_MODES)}")
+
+        self.mode = mode
+        self.cache_dir = str(cache_dir or RESPONSE_CACHE_CONFIG["cache_dir"])
+        self.max_size_bytes = int((max_size_mb or RESPONSE_CACHE_CONFIG["max_size_mb"]) * 1024 * 1024)
+        self.max_age_seconds = (max_age_days or RESPONSE_CACHE_CONFIG["max_age_days"]) * 86400
+        self.evict_interval = RESPONSE_CACHE_CONFIG.get("evict_interval", 500)
+        self.touch_batch = RESPONSE_CACHE_CONFIG.get("touch_batch", 200)
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0}
+        self._writes_since_evict = 0
+        self._touched = {}  # 尚未写回的访问时间：键 -> 时间
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if mode != "bypass":
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.cache_dir, "responses.sqlite3"),
+                                         timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    template TEXT,
+                    response TEXT,
+                    latency REAL,
+                    created_at REAL,
+                    accessed_at REAL,
+                    size INTEGER
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+            self._conn.commit()
+            self.evict()
+
+    @property
+    def readable(self):
+        return self.mode in ("readwrite", "readonly")
+
+    @property
+    def writable(self):
+        return self.mode in ("readwrite", "refresh")
+
+    def get(self, key):
+        """
+        读取缓存条目
+
+        命中时的访问时间（用于按最久未访问淘汰）先记在内存中，累计touch_batch条、写入新条目、淘汰或关闭时批量写回；
+        只读模式下不写回
+
+        Returns:
+            包含response、latency、created_at的字典，未命中或模式不允许读取时返回None
+        """
+        if not self.readable:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, latency, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[2] > self.max_age_seconds:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            if self.writable:
+                self._touched[key] = now
+                if len(self._touched) >= self.touch_batch:
+                    self._flush_touched()
+                    self._conn.commit()
+        return {"response": row[0], "latency": row[1], "created_at": row[2]}
+
+    def put(self, key, model_id, template_name, response, latency):
+        """写入缓存条目，模式不允许写入时忽略"""
+        if not self.writable or response is None:
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model_id, template_name, response, latency, now, now, size)
+            )
+            self._touched.pop(key, None)
+            self._flush_touched()
+            self._conn.commit()
+            self.stats["writes"] += 1
+            self._writes_since_evict += 1
+            should_evict = self._writes_since_evict >= self.evict_interval
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """淘汰过期条目，然后按最久未访问的顺序淘汰条目直到总大小不超过上限"""
+        if self._conn is None or self.mode == "readonly":
+            return 0
+        with self._lock:
+            self._writes_since_evict = 0
+            self._flush_touched()
+            cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?",
+                                        (time.time() - self.max_age_seconds,))
+            evicted = cursor.rowcount
+            total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_size > self.max_size_bytes:
+                rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+                stale_keys = []
+                for key, size in rows:
+                    if total_size <= self.max_size_bytes:
+                        break
+                    stale_keys.append((key,))
+                    total_size -= size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+                evicted += len(stale_keys)
+            self._conn.commit()
+            self.stats["evicted"] += evicted
+        if evicted:
+            logger.info(f"响应缓存淘汰了 {evicted} 个条目")
+        return evicted
+
+    def _flush_touched(self):
+        """将内存中的访问时间写回数据库，调用方持有锁并负责提交"""
+        if self._touched:
+            self._conn.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?",
+                                   [(accessed_at, key) for key, accessed_at in self._touched.items()])
+            self._touched.clear()
+
+    def close(self):
+        """写回尚未保存的访问时间并关闭缓存数据库"""
+        with self._lock:
+            if self._conn is not None:
+                self._flush_touched()
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,138 @@
+"""
+相同调用合并（single-flight）
+多个线程同时发起相同的调用（模型、提示词和生成参数都相同，如同时处理的文件中重复出现的条款）时，
+只有第一个调用方真正发送请求，其余调用方等待同一个Future并得到相同的结果；
+异步调用方（ado）与同步调用方共用同一张表
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+logger = logging.getLogger(__name__)
+
+
+class _NotShared(Exception):
+    """发起方的结果不可共享（如调用被取消），等待方需要重新发起"""
+
+
+class WaitTimeout(FutureTimeout):
+    """等待其他调用方的结果超过timeout，与发起方自身抛出的超时异常区分"""
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def do(self, key, fn, label=None, timeout=None, shareable=None, shareable_error=None):
+        """
+        执行调用，键相同的调用正在进行时等待其结果
+
+        Args:
+            key: 调用的键
+            fn: 实际执行调用的无参函数
+            label: 统计分组（如模型名称）
+            timeout: 等待其他调用方结果的最长时间（秒），None表示一直等待
+            shareable: 结果 -> 是否可以共享给等待方的函数，不可共享时等待方自行重新发起，None表示总是共享
+            shareable_error: 异常 -> 是否可以共享给等待方的函数（如发起方自身的截止时间或取消导致的异常不应共享），
+                None表示总是共享
+
+        Returns:
+            fn的返回值；可共享的异常传递给所有等待方
+
+        Raises:
+            WaitTimeout: 等待其他调用方的结果超过timeout
+        """
+        while True:
+            future, leader = self._join(key, label)
+            if not leader:
+                try:
+                    return future.result(timeout)
+                except _NotShared:
+                    self._retry(label)
+                    continue
+                except FutureTimeout:
+                    # 发起方抛出的超时类异常（已完成的Future）原样传递，只有等待本身超时才转换
+                    if future.done():
+                        raise
+                    raise WaitTimeout(f"等待相同调用的结果超过 {timeout} 秒")
+
+            try:
+                result = fn()
+            except BaseException as e:
+                self._settle(key, future, shareable_error, error=e)
+                raise
+            self._settle(key, future, shareable, result=result)
+            return result
+
+    async def ado(self, key, coroutine_fn, label=None, timeout=None, shareable=None, shareable_error=None):
+        """
+        do的异步版本，参数含义相同，coroutine_fn返回要等待的协程
+
+        与do共用同一张进行中调用表，同步和异步调用方之间也会合并；等待方被取消时不影响发起方，
+        发起方的协程被取消时等待方自行重新发起
+        """
+        while True:
+            future, leader = self._join(key, label)
+            if not leader:
+                try:
+                    return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+                except _NotShared:
+                    self._retry(label)
+                    continue
+                except asyncio.TimeoutError:
+                    if future.done():
+                        raise
+                    raise WaitTimeout(f"等待相同调用的结果超过 {timeout} 秒")
+
+            try:
+                result = await coroutine_fn()
+            except asyncio.CancelledError as e:
+                self._settle(key, future, lambda error: False, error=e)
+                raise
+            except BaseException as e:
+                self._settle(key, future, shareable_error, error=e)
+                raise
+            self._settle(key, future, shareable, result=result)
+            return result
+
+    def _join(self, key, label):
+        """登记一次调用，返回(Future, 是否为发起方)"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            stats = self._stats.setdefault(label, {"calls": 0, "coalesced": 0})
+            stats["calls" if leader else "coalesced"] += 1
+        return future, leader
+
+    def _retry(self, label):
+        """等待方因发起方结果不可共享而重新发起，不计为合并"""
+        with self._lock:
+            self._stats[label]["coalesced"] -= 1
+
+    def _settle(self, key, future, shareable, result=None, error=None):
+        """发起方结束：按是否可共享设置Future，并移出进行中调用表"""
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error if shareable is None or shareable(error) else _NotShared())
+        elif shareable is None or shareable(result):
+            future.set_result(result)
+        else:
+            future.set_exception(_NotShared())
+
+    def in_flight(self):
+        """正在进行的调用数"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        """返回各分组实际发起的调用数和合并到进行中调用的次数"""
+        with self._lock:
+            return {label: dict(stats) for label, stats in self._stats.items()}
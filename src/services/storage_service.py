@@ -1,6 +1,8 @@
 from pathlib import Path
 import json
 import os
+import time
+import threading
 
 class StorageService:
     def __init__(self, output_dir):
@@ -15,4 +17,103 @@ class StorageService:
     def log_results(self, model_name, log_data):
         log_file_path = self.output_dir / f"{model_name}_log.json"
         with open(log_file_path, 'w', encoding='utf-8') as log_file:
-            json.dump(log_data, log_file, ensure_ascii=False, indent=4)
\ No newline at end of file
+            json.dump(log_data, log_file, ensure_ascii=False, indent=4)
+
+class StreamingResultWriter:
+    """
+    逐句写出分析结果
+
+    每个句子的所有模型结果完成后，立即以一行紧凑JSON追加到all目录和各模型目录下的JSONL文件中，
+    结束时可选地生成与原有格式一致的汇总JSON文件
+    """
+
+    def __init__(self, template_output_dir, filename):
+        self.template_output_dir = Path(template_output_dir)
+        self.filename = filename
+        self.all_dir = self.template_output_dir / "all"
+        self.all_dir.mkdir(parents=True, exist_ok=True)
+        self.all_path = self.all_dir / f"{filename}_sentences.jsonl"
+        self._all_file = open(self.all_path, 'w', encoding='utf-8')
+        self._model_files = {}
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def _model_file(self, model_name):
+        model_file = self._model_files.get(model_name)
+        if model_file is None:
+            model_dir = self.template_output_dir / model_name
+            model_dir.mkdir(parents=True, exist_ok=True)
+            model_file = open(model_dir / f"{self.filename}_results.jsonl", 'w', encoding='utf-8')
+            self._model_files[model_name] = model_file
+        return model_file
+
+    def write_sentence(self, index, sentence, models, span=None):
+        """
+        写出一个句子的结果
+
+        Args:
+            index: 句子在文件中的索引
+            sentence: 句子原文
+            models: 模型名称 -> 整理后的结果
+            span: 按条款分块时块在原文中的位置，写入汇总行
+        """
+        entry = {"index": index, "text": sentence, "models": models}
+        if span is not None:
+            entry["span"] = span
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._all_file.write(line + "\n")
+            self._all_file.flush()
+            for model_name, model_result in models.items():
+                model_file = self._model_file(model_name)
+                model_file.write(json.dumps({"index": index, "text": sentence, "result": model_result},
+                                            ensure_ascii=False) + "\n")
+                model_file.flush()
+            self.written += 1
+
+    def close(self, finalize=False):
+        """
+        关闭所有文件
+
+        Args:
+            finalize: 是否按句子顺序生成汇总JSON文件（{filename}_sentences.json）
+
+        Returns:
+            生成的汇总JSON文件路径，未生成时返回None
+        """
+        with self._lock:
+            self._all_file.close()
+            for model_file in self._model_files.values():
+                model_file.close()
+        if finalize:
+            return self.finalize()
+        return None
+
+    def finalize(self):
+        """按句子顺序将JSONL结果转换为带缩进的汇总JSON，只在内存中保留每行的位置"""
+        offsets = []
+        with open(self.all_path, 'rb') as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                offsets.append((json.loads(line)["index"], offset))
+        offsets.sort()
+
+        output_path = self.all_dir / f"{self.filename}_sentences.json"
+        header = json.dumps({
+            "filename": self.filename,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "total_sentences": len(offsets)
+        }, ensure_ascii=False, indent=2)
+        with open(self.all_path, 'rb') as src, open(output_path, 'w', encoding='utf-8') as out:
+            out.write(header[:-2] + ',\n  "sentences": [')
+            for i, (_, offset) in enumerate(offsets):
+                src.seek(offset)
+                entry = json.loads(src.readline())
+                entry = {key: entry[key] for key in ("text", "span", "models") if key in entry}
+                text = json.dumps(entry, ensure_ascii=False, indent=2).replace("\n", "\n    ")
+                out.write(("," if i else "") + "\n    " + text)
+            out.write("\n  ]\n}" if offsets else "]\n}")
+        return output_path
@@ -0,0 +1,61 @@
+"""
+流式输出
+OpenAI兼容接口（阿里云兼容模式和OpenAI）以流式方式接收输出，记录首个token的到达时间；
+结构化模板的输出已经完整时提前结束流，不再等待模型输出多余的内容
+"""
+
+import contextvars
+import threading
+from contextlib import contextmanager
+
+from src.utils.response_parser import housing_elements_complete
+
+# 模板名称 -> 判断输出前缀是否已完整的函数
+STREAM_STOP_CONDITIONS = {
+    "housing": housing_elements_complete,
+    "housing_with_examples": housing_elements_complete,
+}
+
+_stop_condition = contextvars.ContextVar("stream_stop_condition", default=None)
+
+
+def current_stop_condition():
+    """返回当前调用的提前结束条件，没有时返回None"""
+    return _stop_condition.get()
+
+
+@contextmanager
+def stop_condition_scope(template_name):
+    """在with块内将模板对应的提前结束条件设为当前调用的条件"""
+    token = _stop_condition.set(STREAM_STOP_CONDITIONS.get(template_name))
+    try:
+        yield
+    finally:
+        _stop_condition.reset(token)
+
+
+class StreamStats:
+    """按模型统计流式调用次数、提前结束次数、首token时间和接收的字符数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def record(self, model_name, first_token_seconds, stopped_early, chars):
+        with self._lock:
+            stats = self.stats.setdefault(model_name, {"streams": 0, "early_stops": 0,
+                                                       "first_token_seconds": 0.0, "chars": 0})
+            stats["streams"] += 1
+            stats["early_stops"] += int(stopped_early)
+            stats["chars"] += chars
+            if first_token_seconds is not None:
+                stats["first_token_seconds"] += first_token_seconds
+
+    def snapshot(self):
+        """
+        返回各模型的统计；first_token_seconds为首token时间的累计值（平均值为其除以streams），
+        便于多进程统计直接相加
+        """
+        with self._lock:
+            return {model_name: {**stats, "first_token_seconds": round(stats["first_token_seconds"], 3)}
+                    for model_name, stats in self.stats.items()}
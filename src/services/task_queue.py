@@ -0,0 +1,238 @@
+"""
+持久化任务队列
+以SQLite文件保存(文件, 句子, 模板, 模型)任务，工作进程通过租约领取任务、续约并写回结果
+
+队列文件使用回滚日志（journal_mode=DELETE）而不是WAL：WAL依赖同一台机器上的共享内存索引，
+放在NFS/SMB等网络文件系统上时多台机器会读到不一致的数据。回滚日志模式下的互斥完全依靠文件系统的字节范围锁，
+多台机器共享队列文件时，网络文件系统必须正确实现fcntl锁（如启用了锁服务的NFSv4，不使用nolock等挂载选项）；
+无法确认时只在一台机器上运行工作进程（同一台机器上可以运行多个）
+
+队列只依赖enqueue/lease/heartbeat/complete/fail/counts/results这几个方法，需要换成其他消息中间件时实现同样的接口即可
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from src.config.model_config import TASK_QUEUE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class SQLiteTaskQueue:
+    def __init__(self, db_path=None, visibility_timeout=None, max_attempts=None):
+        """
+        打开任务队列
+
+        Args:
+            db_path: SQLite文件路径，如果为None则使用TASK_QUEUE_CONFIG中的配置；多台机器共享时放在
+                     正确实现fcntl锁的共享卷上（见模块说明）
+            visibility_timeout: 租约时长（秒），超时未续约的任务会被其他工作进程重新领取
+            max_attempts: 每个任务最多尝试次数，超过后标记为失败
+        """
+        self.db_path = str(db_path or TASK_QUEUE_CONFIG["db_path"])
+        self.visibility_timeout = visibility_timeout or TASK_QUEUE_CONFIG["visibility_timeout"]
+        self.max_attempts = max_attempts or TASK_QUEUE_CONFIG["max_attempts"]
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        # isolation_level=None：由代码显式控制事务，领取任务时使用BEGIN IMMEDIATE避免多个进程领到同一任务
+        self._conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        # 回滚日志只依赖文件锁，不需要WAL的共享内存索引（见模块说明）
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_key TEXT,
+                file_name TEXT,
+                sentence_index INTEGER,
+                sentence TEXT,
+                template TEXT,
+                model TEXT,
+                status TEXT,
+                attempts INTEGER DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                result TEXT,
+                updated_at REAL,
+                not_before REAL,
+                UNIQUE (file_key, sentence_index, template, model)
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        if "not_before" not in columns:
+            # 兼容旧版本创建的队列文件
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN not_before REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, lease_expires)")
+
+    def retry_delay(self, attempts):
+        """已尝试attempts次的任务放回队列后的等待时间（秒）"""
+        delay = TASK_QUEUE_CONFIG["retry_delay"] * 2 ** max(attempts - 1, 0)
+        return min(delay, TASK_QUEUE_CONFIG["max_retry_delay"])
+
+    def enqueue(self, tasks):
+        """
+        批量加入任务，已存在的(文件, 句子索引, 模板, 模型)任务会被忽略
+
+        Args:
+            tasks: 字典列表，包含file_key、file_name、sentence_index、sentence、template、model
+
+        Returns:
+            新加入的任务数
+        """
+        now = time.time()
+        rows = [(t["file_key"], t["file_name"], t["sentence_index"], t["sentence"], t["template"], t["model"],
+                 PENDING, now) for t in tasks]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany("""
+                    INSERT OR IGNORE INTO tasks
+                        (file_key, file_name, sentence_index, sentence, template, model, status, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+                inserted = self._conn.total_changes - before
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return inserted
+
+    def lease(self, worker_id, limit):
+        """
+        领取最多limit个待处理任务（包括租约已过期的任务），放回队列时指定了等待时间的任务到时间后才能领取
+
+        Returns:
+            任务字典列表，包含id、file_key、file_name、sentence_index、sentence、template、model、attempts
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute("""
+                    SELECT id, file_key, file_name, sentence_index, sentence, template, model, attempts
+                    FROM tasks
+                    WHERE ((status = ? AND (not_before IS NULL OR not_before <= ?))
+                           OR (status = ? AND lease_expires < ?)) AND attempts < ?
+                    ORDER BY id LIMIT ?
+                """, (PENDING, now, LEASED, now, self.max_attempts, limit)).fetchall()
+                self._conn.executemany("""
+                    UPDATE tasks SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1,
+                                     updated_at = ?
+                    WHERE id = ?
+                """, [(LEASED, worker_id, now + self.visibility_timeout, now, row[0]) for row in rows])
+                # 租约过期且已用完尝试次数的任务不会再被领取，直接标记为失败
+                self._conn.execute("""
+                    UPDATE tasks SET status = ?, updated_at = ?
+                    WHERE status = ? AND lease_expires < ? AND attempts >= ?
+                """, (FAILED, now, LEASED, now, self.max_attempts))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        keys = ("id", "file_key", "file_name", "sentence_index", "sentence", "template", "model", "attempts")
+        return [dict(zip(keys, row[:-1] + (row[-1] + 1,))) for row in rows]
+
+    def heartbeat(self, worker_id, task_ids):
+        """延长工作进程仍持有的任务租约，返回成功续约的任务数"""
+        if not task_ids:
+            return 0
+        expires = time.time() + self.visibility_timeout
+        with self._lock:
+            cursor = self._conn.executemany(
+                "UPDATE tasks SET lease_expires = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                [(expires, task_id, LEASED, worker_id) for task_id in task_ids]
+            )
+            return cursor.rowcount
+
+    def complete(self, task_id, worker_id, result):
+        """
+        写回任务结果
+
+        租约已被其他工作进程接管时忽略本次结果，返回是否写入
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET status = ?, result = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND status = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), time.time(), task_id, worker_id, LEASED)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, task_id, worker_id, result, count_attempt=True, delay=0):
+        """
+        任务失败：尚有尝试次数时放回队列，否则标记为失败并保存最后一次的结果
+
+        Args:
+            count_attempt: 是否计入尝试次数；请求没有发出（模型熔断中、排队时已超过截止时间或被取消）时为False，
+                           任务放回队列且不消耗尝试次数
+            delay: 放回队列后至少等待的时间（秒），到时间后才能被重新领取
+
+        Returns:
+            是否写入，租约已被其他工作进程接管时为False
+        """
+        refund = 0 if count_attempt else 1
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute("""
+                UPDATE tasks
+                SET status = CASE WHEN attempts - ? < ? THEN ? ELSE ? END, attempts = attempts - ?, result = ?,
+                    lease_owner = NULL, not_before = ?, updated_at = ?
+                WHERE id = ? AND lease_owner = ? AND status = ?
+            """, (refund, self.max_attempts, PENDING, FAILED, refund, json.dumps(result, ensure_ascii=False),
+                  now + delay, now, task_id, worker_id, LEASED))
+            return cursor.rowcount == 1
+
+    def counts(self):
+        """返回各状态的任务数"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def has_unfinished(self):
+        """是否还有待处理或处理中的任务"""
+        counts = self.counts()
+        return counts[PENDING] + counts[LEASED] > 0
+
+    def results(self, template=None):
+        """
+        按文件读取已结束的任务
+
+        Yields:
+            (file_key, file_name, 行列表)，行为(sentence_index, sentence, model, status, result)，按句子索引排序
+        """
+        query = "SELECT DISTINCT file_key, file_name FROM tasks"
+        params = ()
+        if template:
+            query += " WHERE template = ?"
+            params = (template,)
+        with self._lock:
+            files = self._conn.execute(query, params).fetchall()
+        for file_key, file_name in files:
+            with self._lock:
+                rows = self._conn.execute("""
+                    SELECT sentence_index, sentence, model, status, result FROM tasks
+                    WHERE file_key = ? AND (? IS NULL OR template = ?)
+                    ORDER BY sentence_index, id
+                """, (file_key, template, template)).fetchall()
+            yield file_key, file_name, [
+                (index, sentence, model, status, json.loads(result) if result else None)
+                for index, sentence, model, status, result in rows
+            ]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
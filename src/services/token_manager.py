@@ -0,0 +1,238 @@
+"""
+百度访问令牌管理
+按expires_in缓存访问令牌并在过期前后台刷新，令牌持久化到本地文件（带文件锁），供同一进程内的多个服务和并行的工作进程复用
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，退化为仅进程内加锁
+    fcntl = None
+
+import requests
+
+from src.config.model_config import BAIDU_TOKEN_CONFIG
+
+logger = logging.getLogger(__name__)
+
+BAIDU_TOKEN_URL = "https://aip.baidubce.com/oauth/2.0/token"
+
+# 百度接口表示访问令牌无效或过期的错误码
+BAIDU_TOKEN_ERROR_CODES = (110, 111)
+
+
+@contextmanager
+def _file_lock(lock_path):
+    """对锁文件加排他锁，跨进程串行化令牌的读取和刷新"""
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    with open(lock_path, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class BaiduTokenManager:
+    def __init__(self, api_key, secret_key, token_url=None, cache_dir=None, session=None,
+                 refresh_margin=None, background_refresh=True):
+        """
+        初始化令牌管理器
+
+        Args:
+            api_key: 百度API Key
+            secret_key: 百度Secret Key
+            token_url: 令牌接口地址，如果为None则使用BAIDU_TOKEN_URL
+            cache_dir: 令牌文件目录，如果为None则使用BAIDU_TOKEN_CONFIG中的配置；为False时不持久化
+            session: 用于请求令牌的requests.Session，如果为None则使用requests模块
+            refresh_margin: 距过期多少秒时刷新，如果为None则使用BAIDU_TOKEN_CONFIG中的配置
+            background_refresh: 是否在过期前由后台线程自动刷新
+        """
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.token_url = token_url or BAIDU_TOKEN_URL
+        self.session = session
+        self.refresh_margin = BAIDU_TOKEN_CONFIG["refresh_margin"] if refresh_margin is None else refresh_margin
+        self.background_refresh = background_refresh
+
+        if cache_dir is None:
+            cache_dir = BAIDU_TOKEN_CONFIG["cache_dir"]
+        self.token_path = None
+        if cache_dir is not False and api_key:
+            # 文件名只包含API Key的摘要，不在磁盘上暴露密钥
+            key_digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+            self.token_path = os.path.join(str(cache_dir), f"baidu_token_{key_digest}.json")
+
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._timer = None
+        self.stats = {"fetched": 0, "loaded_from_file": 0, "invalidated": 0}
+
+    @property
+    def configured(self):
+        return bool(self.api_key and self.secret_key)
+
+    def _valid(self, now=None):
+        return self._token is not None and (now or time.time()) < self._expires_at - self.refresh_margin
+
+    def get_token(self):
+        """
+        返回有效的访问令牌，缓存失效时刷新
+
+        Returns:
+            访问令牌字符串，无法获取时返回None
+        """
+        with self._lock:
+            if not self._valid():
+                self._refresh_locked(stale_token=self._token)
+            return self._token
+
+    def set_token(self, token, expires_in=None):
+        """直接设置访问令牌（例如测试或外部获取的令牌），不写入文件"""
+        with self._lock:
+            self._token = token
+            self._expires_at = time.time() + (expires_in or BAIDU_TOKEN_CONFIG["default_expires_in"])
+
+    def invalidate(self, stale_token):
+        """
+        令牌被服务端拒绝时调用，刷新并返回新令牌
+
+        并发调用只会触发一次刷新：若当前令牌已不是被拒绝的令牌，说明其他线程已经刷新过，直接返回当前令牌
+
+        Args:
+            stale_token: 被拒绝的令牌
+        """
+        with self._lock:
+            if self._token is not None and self._token != stale_token and self._valid():
+                return self._token
+            self.stats["invalidated"] += 1
+            self._token = None
+            self._expires_at = 0.0
+            self._refresh_locked(stale_token=stale_token)
+            return self._token
+
+    def _refresh_locked(self, stale_token=None):
+        """在持有self._lock时刷新令牌：先尝试读取其他进程写入的令牌文件，仍无效时请求新令牌"""
+        if not self.configured:
+            return
+        if self.token_path is None:
+            self._fetch()
+            return
+
+        with _file_lock(self.token_path + ".lock"):
+            cached = self._read_file()
+            if cached is not None and cached["access_token"] != stale_token \
+                    and time.time() < cached["expires_at"] - self.refresh_margin:
+                self._token = cached["access_token"]
+                self._expires_at = cached["expires_at"]
+                self.stats["loaded_from_file"] += 1
+                self._schedule_refresh()
+                return
+            if self._fetch():
+                self._write_file()
+
+    def _fetch(self):
+        """请求新的访问令牌，成功返回True"""
+        params = {
+            "grant_type": "client_credentials",
+            "client_id": self.api_key,
+            "client_secret": self.secret_key
+        }
+        try:
+            post = self.session.post if self.session is not None else requests.post
+            response = post(self.token_url, params=params, timeout=BAIDU_TOKEN_CONFIG["timeout"])
+            payload = response.json() if response.status_code == 200 else None
+        except Exception as e:
+            logger.error(f"获取百度访问令牌出错: {str(e)}")
+            return False
+
+        if not payload or not payload.get("access_token"):
+            logger.error(f"获取百度访问令牌失败: {response.text}")
+            return False
+
+        self._token = payload["access_token"]
+        expires_in = payload.get("expires_in") or BAIDU_TOKEN_CONFIG["default_expires_in"]
+        self._expires_at = time.time() + float(expires_in)
+        self.stats["fetched"] += 1
+        logger.info(f"成功获取百度访问令牌，有效期 {int(float(expires_in))} 秒")
+        self._schedule_refresh()
+        return True
+
+    def _read_file(self):
+        try:
+            with open(self.token_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get("access_token") and cached.get("expires_at"):
+                return cached
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _write_file(self):
+        # 先写临时文件再替换，其他进程不会读到写了一半的文件
+        tmp_path = f"{self.token_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"access_token": self._token, "expires_at": self._expires_at}, f)
+            os.replace(tmp_path, self.token_path)
+        except OSError as e:
+            logger.warning(f"保存百度访问令牌失败: {str(e)}")
+
+    def _schedule_refresh(self):
+        """安排后台线程在令牌即将过期前刷新"""
+        if not self.background_refresh:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        delay = max(1.0, self._expires_at - self.refresh_margin - time.time())
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            self._timer = None
+            if self._valid():
+                return
+            logger.info("百度访问令牌即将过期，后台刷新")
+            self._refresh_locked(stale_token=self._token)
+
+    def close(self):
+        """取消后台刷新"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_baidu_token_manager(api_key, secret_key, token_url=None, session=None):
+    """
+    返回进程内共享的令牌管理器，同一组密钥只创建一次
+
+    Args:
+        api_key: 百度API Key
+        secret_key: 百度Secret Key
+        token_url: 令牌接口地址
+        session: 用于请求令牌的requests.Session（仅在首次创建时使用）
+    """
+    key = (api_key, secret_key, token_url or BAIDU_TOKEN_URL)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = BaiduTokenManager(api_key, secret_key, token_url=token_url, session=session)
+            _managers[key] = manager
+    return manager
@@ -0,0 +1,82 @@
+"""
+Aho-Corasick多模式匹配
+一次扫描文本即可找出所有词表中的词，耗时与文本长度加匹配数成正比，与词表大小无关
+"""
+
+from collections import deque
+
+
+class AhoCorasick:
+    def __init__(self, patterns=None):
+        """
+        初始化自动机
+
+        Args:
+            patterns: 可选，词 -> 值的字典或词的可迭代对象（值为词本身）
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._own = [[]]      # 以该状态结尾的词：(长度, 值)
+        self._outputs = [[]]  # 构建后包含失败链接上的所有词
+        self._size = 0
+        self._built = True
+        if patterns is not None:
+            items = patterns.items() if isinstance(patterns, dict) else ((p, p) for p in patterns)
+            for pattern, value in items:
+                self.add(pattern, value)
+
+    def add(self, pattern, value=None):
+        """加入一个词，匹配时返回value（默认为词本身）；加入后需要重新构建失败链接"""
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+            state = next_state
+        self._own[state].append((len(pattern), pattern if value is None else value))
+        self._size += 1
+        self._built = False
+
+    def build(self):
+        """按广度优先计算失败链接，并把失败链接上的输出合并到当前状态；多线程共享时应在加入所有词后先调用一次"""
+        self._outputs = [list(own) for own in self._own]
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+        self._built = True
+
+    def iter_matches(self, text):
+        """
+        扫描文本
+
+        Yields:
+            (起始位置, 结束位置, 值)，按结束位置排列，重叠和嵌套的匹配都会返回
+        """
+        if not self._built:
+            self.build()
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in outputs[state]:
+                yield i + 1 - length, i + 1, value
+
+    def __len__(self):
+        return self._size
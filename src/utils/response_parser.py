@@ -2,8 +2,15 @@ import re
 import json
 import logging
 
+from src.config.prompt_templates import HOUSING_ELEMENT_CHOICES
+from src.utils.vocabulary import get_housing_normalizer
+
 logger = logging.getLogger(__name__)
 
+# housing模板要求输出的七个要素，按输出顺序排列
+HOUSING_ELEMENTS = ["policy_object", "policy_stage", "policy_type", "policy_tool",
+                    "policy_geo_scope", "policy_target_scope", "tool_parameter"]
+
 def parse_housing_elements(response_text):
     """
     将housing模板的文本响应解析为JSON格式
@@ -11,10 +18,7 @@ def parse_housing_elements(response_text):
     
     # 使用正则表达式解析分号分隔的字段
     result = {}
-    elements = ["policy_object", "policy_stage", "policy_type", "policy_tool", 
-                "policy_geo_scope", "policy_target_scope", "tool_parameter"]
-    
-    for element in elements:
+    for element in HOUSING_ELEMENTS:
         pattern = rf"{element}:\s*([^;]+)"
         match = re.search(pattern, response_text)
         if match:
@@ -22,4 +26,116 @@ def parse_housing_elements(response_text):
         else:
             result[element] = "未提取"
     
-    return result
\ No newline at end of file
+    return result
+
+def housing_output_problems(response_text):
+    """
+    检查housing模板的输出是否合格
+    
+    Returns:
+        问题列表，合格时为空：parse_failed表示有要素未能提取，invalid_<要素>表示取值不在模板规定的选项中
+    """
+    if not isinstance(response_text, str):
+        return ["parse_failed"]
+    parsed = parse_housing_elements(response_text)
+    if "未提取" in parsed.values():
+        return ["parse_failed"]
+    problems = []
+    for element, choices in HOUSING_ELEMENT_CHOICES.items():
+        if parsed[element].strip("\"'“”「」 ") not in choices:
+            problems.append(f"invalid_{element}")
+    return problems
+
+# 达到法定数后未等待的调用在输出中的标记
+QUORUM_SKIPPED = "skipped by quorum"
+
+def housing_quorum(responses, quorum, fields=None):
+    """
+    判断多个模型的housing输出是否已达到法定数
+    
+    Args:
+        responses: 各模型输出的文本列表
+        quorum: 法定数，每个要素都需要至少quorum个模型给出相同的取值
+        fields: 参与比较的要素，如果为None则比较全部七个要素
+    
+    Returns:
+        达到法定数时为要素 -> 多数取值的字典，否则为None；未能提取的要素不计票
+    """
+    votes = {field: {} for field in (fields or HOUSING_ELEMENTS)}
+    for response_text in responses:
+        if not isinstance(response_text, str):
+            continue
+        parsed = parse_housing_elements(response_text)
+        for field, counts in votes.items():
+            value = parsed[field].strip("\"'“”「」 ")
+            if value != "未提取":
+                counts[value] = counts.get(value, 0) + 1
+    agreed = {}
+    for field, counts in votes.items():
+        value = max(counts, key=counts.get, default=None)
+        if value is None or counts[value] < quorum:
+            return None
+        agreed[field] = value
+    return agreed
+
+# 打包输出中每一行的编号，如"[3] policy_object: ..."、"3. policy_object: ..."
+PACKED_LINE_PATTERN = re.compile(r"^\s*\[?(\d+)\s*[\]\.、:：)）]?\s*(policy_object\s*:.*)$", re.MULTILINE)
+
+def parse_packed_housing_elements(response_text, count):
+    """
+    将多句打包的housing模板响应拆分为逐句结果
+    
+    Args:
+        response_text: 模型返回的文本，每行以编号开头
+        count: 打包的句子数
+    
+    Returns:
+        长度为count的列表，元素为该句对应的单行文本；缺失或要素不完整的句子为None
+    """
+    lines = [None] * count
+    for match in PACKED_LINE_PATTERN.finditer(response_text or ""):
+        index = int(match.group(1)) - 1
+        line = match.group(2).strip()
+        if 0 <= index < count and lines[index] is None:
+            parsed = parse_housing_elements(line)
+            if "未提取" not in parsed.values():
+                lines[index] = line
+    return lines
+
+def format_model_result(result):
+    """
+    将单个模型的调用结果整理为输出格式
+    
+    Returns:
+        成功时为housing模板的解析结果或原始文本，失败时为包含error的字典
+    """
+    if "content" in result and result["status"] == "success":
+        content = result["content"]
+        # 检测是否是housing模板的输出格式
+        if isinstance(content, str) and "policy_object:" in content and "policy_stage:" in content:
+            parsed = parse_housing_elements(content)
+            # 级联调用的结果附带最终采用的模型和升级记录
+            if "cascade" in result:
+                parsed["cascade"] = result["cascade"]
+            # 预筛选判为不相关、未调用模型的结果附带得分
+            if "prefilter" in result:
+                parsed["prefilter"] = result["prefilter"]
+            # 枚举型要素归一化为模板中的标准取值
+            parsed["normalized"] = get_housing_normalizer().normalize(parsed)
+            return parsed
+        return content
+    # 达到法定数后跳过的调用
+    if result.get("status") == "skipped":
+        return {"skipped": result.get("error", "")}
+    return {"error": result.get("error", "未知错误")}
+
+def housing_elements_complete(response_text):
+    """
+    判断流式输出的前缀是否已包含完整的七个要素，用于提前结束流式输出
+    
+    每个要素的值之后都要已经出现分号或换行，避免最后一个要素只收到一半就结束；
+    带编号的多句打包输出不会提前结束
+    """
+    if PACKED_LINE_PATTERN.search(response_text):
+        return False
+    return all(re.search(rf"{element}:\s*[^;\n]+[;\n]", response_text) for element in HOUSING_ELEMENTS)
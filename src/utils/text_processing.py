@@ -1,31 +1,127 @@
-def split_text_into_sentences(text):
-    import re
-    pattern = r'([。！？])'
-    parts = re.split(pattern, text)
-    
-    sentences = []
-    temp_sentence = []
+import re
+import codecs
+import itertools
+import unicodedata
+
+# 中文标点到半角标点的映射，用于句子归一化
+_PUNCTUATION_TABLE = str.maketrans({
+    "。": ".", "，": ",", "、": ",", "；": ";", "：": ":", "！": "!", "？": "?",
+    "（": "(", "）": ")", "【": "[", "】": "]", "《": "<", "》": ">",
+    "“": '"', "”": '"', "‘": "'", "’": "'", "—": "-", "～": "~",
+})
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# 句子：任意非句末标点字符后跟一个或多个句末标点（连续的句末标点归入同一句）
+_SENTENCE_END_MARKS = "。！？"
+_SENTENCE_PATTERN = re.compile(rf"[^{_SENTENCE_END_MARKS}]*[{_SENTENCE_END_MARKS}]+")
+# 流式切分时每次读取的字符数（二进制流和mmap为字节数）
+SENTENCE_CHUNK_SIZE = 1 << 20
+
+def _iter_text_chunks(source, chunk_size):
+    """按块读取字符串、文本流、二进制流或mmap，二进制内容按UTF-8增量解码（多字节字符可能跨块）"""
+    if isinstance(source, str):
+        yield source
+        return
+    decoder = None
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, (bytes, bytearray)):
+            decoder = decoder or codecs.getincrementaldecoder("utf-8")(errors="replace")
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+def iter_sentences(source, chunk_size=SENTENCE_CHUNK_SIZE):
+    """
+    逐句切分文本，保留句末标点，只扫描一遍
     
-    for part in parts:
-        if re.match(pattern, part):
-            temp_sentence.append(part)
-            sentence = "".join(temp_sentence).strip()
-            if sentence:
-                sentences.append(sentence)
-            temp_sentence = []
-        else:
-            temp_sentence.append(part)
+    Args:
+        source: 字符串、文本文件对象、二进制文件对象或mmap
+        chunk_size: 每次读取的大小，跨块的句子会与下一块拼接后再切分
     
-    if temp_sentence:
-        sentence = "".join(temp_sentence).strip()
-        if sentence:
-            sentences.append(sentence)
+    Returns:
+        逐个产生去除首尾空白后的非空句子的迭代器；最后没有句末标点的部分作为最后一句
+    """
+    return _scan_sentences(source, chunk_size, False)
+
+def iter_sentence_spans(source, chunk_size=SENTENCE_CHUNK_SIZE):
+    """
+    逐句切分文本并给出每句在原文中的位置，参数同iter_sentences
     
-    return [s for s in sentences if s.strip()]
+    Returns:
+        逐个产生(起始位置, 结束位置, 句子)的迭代器，位置为原文中的字符偏移，句子与iter_sentences相同
+    """
+    return _scan_sentences(source, chunk_size, True)
+
+def _scan_sentences(source, chunk_size, with_spans):
+    # 不需要位置时不计算偏移，保持分句的吞吐量
+    # 只在新读入的块中查找句末标点，没有句末标点的块（如长表格）先存入pending，
+    # 读到句末标点时才拼接一次，避免每读一块都复制和扫描整个缓冲区
+    pending = []
+    pending_len = 0
+    end = 0  # 拼接后最后一个句末标点之后的位置
+    base = 0
+    for chunk in itertools.chain(_iter_text_chunks(source, chunk_size), [None]):
+        final = chunk is None
+        if not final:
+            pending.append(chunk)
+            pending_len += len(chunk)
+            last = max(chunk.rfind(mark) for mark in _SENTENCE_END_MARKS)
+            if last < 0:
+                continue
+            end = pending_len - len(chunk) + last + 1
+        if end == 0:
+            continue
+        buffer = "".join(pending)
+        consumed = 0
+        # 只在最后一个句末标点之前匹配，避免没有句末标点的长尾反复回溯
+        for match in _SENTENCE_PATTERN.finditer(buffer, 0, end):
+            # 块末尾的句子可能还有后续的句末标点，留到下一块
+            if match.end() == len(buffer) and not final:
+                break
+            consumed = match.end()
+            sentence = match.group().strip()
+            if sentence:
+                yield _sentence_span(match.group(), sentence, base + match.start()) if with_spans else sentence
+        rest = buffer[consumed:]
+        pending = [rest] if rest else []
+        pending_len = len(rest)
+        end -= consumed
+        base += consumed
+    buffer = "".join(pending)
+    sentence = buffer.strip()
+    if sentence:
+        yield _sentence_span(buffer, sentence, base) if with_spans else sentence
+
+def _sentence_span(raw, sentence, start):
+    """raw去除首尾空白后为sentence，raw在原文中从start开始，返回(起始位置, 结束位置, sentence)"""
+    offset = start + len(raw) - len(raw.lstrip())
+    return offset, offset + len(sentence), sentence
+
+def split_text_into_sentences(text):
+    return list(iter_sentences(text))
 
 def clean_text(text):
     return text.strip()  # Add more cleaning logic if needed
 
 def process_text(text):
     cleaned_text = clean_text(text)
-    return split_text_into_sentences(cleaned_text)
\ No newline at end of file
+    return split_text_into_sentences(cleaned_text)
+
+def normalize_sentence(text):
+    """
+    归一化句子用于去重比较：统一全角/半角字符和中英文标点，去除所有空白
+    
+    Args:
+        text: 原始句子
+    
+    Returns:
+        归一化后的句子
+    """
+    text = unicodedata.normalize("NFKC", text).translate(_PUNCTUATION_TABLE)
+    return _WHITESPACE_PATTERN.sub("", text)
@@ -0,0 +1,142 @@
+"""
+枚举要素的词表索引
+模型对housing模板中枚举型要素的回答写法不一（如"公租房"、"公共租赁住房"、"公共租赁住房（公租房）"），
+用模板中的可选值及其常见写法构建Aho-Corasick自动机和字符n-gram模糊索引，
+在本地将回答归一化为标准取值并给出匹配得分，耗时与回答长度成正比
+"""
+
+import threading
+from collections import Counter
+
+from src.config.model_config import VOCABULARY_CONFIG
+from src.config.prompt_templates import HOUSING_POLICY_OBJECTS, HOUSING_ELEMENT_CHOICES
+from src.utils.aho_corasick import AhoCorasick
+from src.utils.text_processing import normalize_sentence
+
+# policy_object在模板中规定的无匹配取值
+NO_POLICY_OBJECT = "未匹配"
+
+
+def _ngrams(text, n):
+    """文本的字符n-gram计数，短于n的文本作为一个整体"""
+    if len(text) <= n:
+        return Counter([text]) if text else Counter()
+    return Counter(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+class VocabularyIndex:
+    def __init__(self, vocabulary, ngram=None, min_score=None):
+        """
+        构建索引
+
+        Args:
+            vocabulary: 标准取值 -> 写法列表（标准取值本身总是作为一种写法）
+            ngram: 模糊匹配使用的字符n-gram长度，如果为None则使用VOCABULARY_CONFIG中的ngram
+            min_score: 模糊匹配的最低得分，如果为None则使用VOCABULARY_CONFIG中的min_score
+        """
+        self.ngram = ngram or VOCABULARY_CONFIG["ngram"]
+        self.min_score = VOCABULARY_CONFIG["min_score"] if min_score is None else min_score
+        self.canonical = list(vocabulary)
+        self.automaton = AhoCorasick()
+        self._postings = {}   # n-gram -> [(写法编号, 该写法中的出现次数)]
+        self._aliases = []    # (标准取值, 写法的n-gram总数)
+        for canonical, aliases in vocabulary.items():
+            for alias in dict.fromkeys([canonical, *aliases]):
+                alias = normalize_sentence(alias)
+                self.automaton.add(alias, canonical)
+                grams = _ngrams(alias, self.ngram)
+                for gram, count in grams.items():
+                    self._postings.setdefault(gram, []).append((len(self._aliases), count))
+                self._aliases.append((canonical, sum(grams.values())))
+        self.automaton.build()
+
+    def lookup(self, answer):
+        """
+        将一个回答归一化
+
+        先用自动机找出回答中出现的所有写法（长的优先、互不重叠），得分为这些写法覆盖回答中文字的比例；
+        没有任何写法出现时，按字符n-gram的Dice系数找最接近的写法，低于min_score时视为无法归一化
+
+        Returns:
+            (标准取值列表, 得分)，标准取值按在回答中出现的顺序排列；无法归一化时列表为空，得分为最接近写法的得分
+        """
+        text = normalize_sentence(answer or "").strip("\"'“”「」")
+        matches = sorted(self.automaton.iter_matches(text), key=lambda m: (m[0] - m[1], m[0]))
+        covered = [False] * len(text)
+        found = []
+        for start, end, canonical in matches:
+            if any(covered[start:end]):
+                continue
+            covered[start:end] = [True] * (end - start)
+            found.append((start, canonical))
+        if found:
+            letters = [i for i, char in enumerate(text) if char.isalnum()]
+            score = sum(covered[i] for i in letters) / len(letters) if letters else 1.0
+            values = list(dict.fromkeys(canonical for _, canonical in sorted(found)))
+            return values, round(score, 4)
+
+        canonical, score = self._fuzzy(text)
+        if canonical is None or score < self.min_score:
+            return [], round(score, 4)
+        return [canonical], round(score, 4)
+
+    def _fuzzy(self, text):
+        """返回n-gram Dice系数最高的写法对应的(标准取值, 得分)"""
+        grams = _ngrams(text, self.ngram)
+        total = sum(grams.values())
+        common = Counter()
+        for gram, count in grams.items():
+            for alias_id, alias_count in self._postings.get(gram, ()):
+                common[alias_id] += min(count, alias_count)
+        best, best_score = None, 0.0
+        for alias_id, shared in common.items():
+            canonical, alias_total = self._aliases[alias_id]
+            score = 2 * shared / (total + alias_total)
+            if score > best_score:
+                best, best_score = canonical, score
+        return best, best_score
+
+
+def housing_vocabularies():
+    """housing模板中各枚举型要素的词表：要素 -> {标准取值: 写法列表}"""
+    vocabularies = {"policy_object": dict(HOUSING_POLICY_OBJECTS, **{NO_POLICY_OBJECT: []})}
+    for element, choices in HOUSING_ELEMENT_CHOICES.items():
+        vocabularies[element] = {choice: [] for choice in choices}
+    return vocabularies
+
+
+class HousingNormalizer:
+    """按要素归一化housing模板解析结果中的枚举型要素"""
+
+    def __init__(self, vocabularies=None):
+        self.indexes = {element: VocabularyIndex(vocabulary)
+                        for element, vocabulary in (vocabularies or housing_vocabularies()).items()}
+
+    def normalize(self, parsed):
+        """
+        为parse_housing_elements的结果附加归一化信息
+
+        Returns:
+            要素 -> {"values": 标准取值列表, "score": 得分}，只包含解析结果中已提取的枚举型要素
+        """
+        normalized = {}
+        for element, index in self.indexes.items():
+            answer = parsed.get(element)
+            if answer is None or answer == "未提取":
+                continue
+            values, score = index.lookup(answer)
+            normalized[element] = {"values": values, "score": score}
+        return normalized
+
+
+_shared_normalizer = None
+_shared_lock = threading.Lock()
+
+
+def get_housing_normalizer():
+    """返回进程内共享的housing要素归一化器，第一次调用时构建索引"""
+    global _shared_normalizer
+    with _shared_lock:
+        if _shared_normalizer is None:
+            _shared_normalizer = HousingNormalizer()
+        return _shared_normalizer
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from src.services.circuit_breaker import CircuitBreakerRegistry
+from src.services.llm_service import LLMService
+from src.services.response_cache import ResponseCache
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """模拟各服务商接口的本地HTTP服务，chatglm接口按delay延迟响应并记录收到的提示词"""
+
+    delay = 0
+    prompts = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/chatglm":
+            type(self).prompts.append(body["prompt"])
+            time.sleep(type(self).delay)
+        if self.path == "/compatible/chat/completions":
+            payload = {"choices": [{"message": {"content": f"compatible:{body['model']}"}}]}
+        elif self.path == "/native":
+            payload = {"output": {"text": f"native:{body['model']}"}}
+        elif self.path == "/chatglm":
+            payload = {"response": f"chatglm:{body['prompt']}"}
+        elif self.path.startswith("/baidu/ernie-bot?access_token=token"):
+            payload = {"result": "baidu:ernie-bot"}
+        else:
+            self.send_response(500)
+            self.end_headers()
+            return
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAsyncLLMService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        base = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.endpoints = {
+            "model_alicloud_compatible": f"{base}/compatible",
+            "model_alicloud_native": f"{base}/native",
+            "model_chatglm": f"{base}/chatglm",
+            "model_baidu": f"{base}/baidu",
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInHandler.delay = 0
+        StandInHandler.prompts = []
+        self.service = LLMService(self.endpoints)
+        self.service.baidu_access_token = "token"
+
+    def _run(self, coro):
+        async def runner():
+            try:
+                return await coro
+            finally:
+                await self.service.pools.aclose()
+        return asyncio.run(runner())
+
+    def test_aprocess_prompts_covers_all_providers(self):
+        models = ["qwen-turbo", "deepseek-v2", "chatglm-local", "ernie-bot"]
+        results = self._run(self.service.aprocess_prompts(models, "政策"))
+
+        self.assertEqual(results["qwen-turbo"]["content"], "compatible:qwen-turbo")
+        self.assertEqual(results["deepseek-v2"]["content"], "native:deepseek-v2")
+        self.assertEqual(results["chatglm-local"]["content"], "chatglm:政策")
+        self.assertEqual(results["ernie-bot"]["content"], "baidu:ernie-bot")
+        self.assertTrue(all(r["status"] == "success" for r in results.values()))
+
+    def test_many_concurrent_calls_on_one_loop(self):
+        async def fan_out():
+            return await asyncio.gather(*(self.service.acall_model("chatglm-local", f"句子{i}")
+                                          for i in range(200)))
+
+        contents = self._run(fan_out())
+        self.assertEqual(contents[150], "chatglm:句子150")
+
+    def test_unknown_model_reports_error(self):
+        results = self._run(self.service.aprocess_prompts(["unknown-model"], "政策"))
+        self.assertEqual(results["unknown-model"]["status"], "error")
+
+    def test_cache_shared_with_sync_calls(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.service.response_cache = ResponseCache(cache_dir)
+        self.addCleanup(self.service.response_cache.close)
+        self.assertEqual(self._run(self.service.acall_model("chatglm-local", "政策", template_name="housing")),
+                         "chatglm:政策")
+        self.assertEqual(self.service.call_model("chatglm-local", "政策", template_name="housing"), "chatglm:政策")
+        self.assertEqual(self._run(self.service.acall_model("chatglm-local", "政策", template_name="housing")),
+                         "chatglm:政策")
+        # 模板不同时缓存键不同
+        self._run(self.service.acall_model("chatglm-local", "政策"))
+        self.assertEqual(StandInHandler.prompts, ["政策", "政策"])
+        self.assertEqual(self.service.response_cache.stats["hits"], 2)
+
+    def test_concurrent_identical_calls_coalesced(self):
+        StandInHandler.delay = 0.3
+
+        async def fan_out():
+            return await asyncio.gather(*(self.service.acall_model("chatglm-local", "政策") for _ in range(5)))
+
+        self.assertEqual(self._run(fan_out()), ["chatglm:政策"] * 5)
+        self.assertEqual(StandInHandler.prompts, ["政策"])
+        self.assertEqual(self.service.single_flight.stats()["chatglm-local"], {"calls": 1, "coalesced": 4})
+
+    def test_sync_caller_joins_async_call(self):
+        StandInHandler.delay = 0.3
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(
+            self.service.call_model("chatglm-local", "政策")))
+
+        async def lead():
+            call = asyncio.ensure_future(self.service.acall_model("chatglm-local", "政策"))
+            await asyncio.sleep(0.1)
+            waiter.start()
+            return await call
+
+        self.assertEqual(self._run(lead()), "chatglm:政策")
+        waiter.join()
+        self.assertEqual(results, ["chatglm:政策"])
+        self.assertEqual(StandInHandler.prompts, ["政策"])
+
+    def test_cancel_event_interrupts_call(self):
+        StandInHandler.delay = 2
+        cancel_event = threading.Event()
+        threading.Timer(0.2, cancel_event.set).start()
+        start = time.monotonic()
+        result = self._run(self.service.acall_model_result("chatglm-local", "政策", cancel_event=cancel_event))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(result["status"], "skipped")
+        # 被取消的调用不计为模型失败
+        self.assertEqual(self.service.circuit_breakers.get("chatglm-local").snapshot()["consecutive_failures"], 0)
+
+    def test_no_backoff_past_deadline(self):
+        service = LLMService({"model_chatglm": self.endpoints["model_chatglm"] + "/missing"},
+                             circuit_breakers=CircuitBreakerRegistry())
+        self.service = service
+        start = time.monotonic()
+        # 第一次失败后等待1秒再重试，第二次失败后剩余时间不足2秒的退避，立即放弃而不是等到截止时间
+        result = self._run(service.acall_model("chatglm-local", "政策", deadline=time.monotonic() + 1.8))
+        self.assertIsNone(result)
+        self.assertLess(time.monotonic() - start, 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
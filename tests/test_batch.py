@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.services.batch import BatchRun, batch_custom_id, parse_batch_output, parse_custom_id
+from src.services.circuit_breaker import CircuitBreakerRegistry
+from src.services.fake_batch_server import FakeBatchServer, DEFAULT_ANSWER, default_responder
+from src.services.llm_service import LLMService
+
+CONFIG = {"completion_window": "24h", "max_requests_per_file": 2, "poll_interval": 0.05, "timeout": 10}
+
+
+def responder(body):
+    prompt = body["messages"][-1]["content"]
+    if "失败" in prompt:
+        raise ValueError("内容不合规")
+    return f"{body['model']}: {prompt}"
+
+
+class TestBatchOutput(unittest.TestCase):
+
+    def test_custom_id_round_trip(self):
+        self.assertEqual(parse_custom_id(batch_custom_id(3, 12, "qwen2-7b-instruct")), (3, 12, "qwen2-7b-instruct"))
+
+    def test_parse_output_and_errors(self):
+        lines = [
+            {"custom_id": "0-0-qwen-turbo", "response": {"status_code": 200, "body": {
+                "choices": [{"message": {"content": "答案"}}]}}, "error": None},
+            {"custom_id": "0-1-qwen-turbo", "response": {"status_code": 400, "body": {
+                "error": {"message": "参数错误"}}}, "error": None},
+            {"custom_id": "0-2-qwen-turbo", "response": None, "error": {"code": "x", "message": "超时"}},
+        ]
+        results = parse_batch_output("\n".join(json.dumps(line) for line in lines) + "\n不是JSON\n", elapsed=5.0)
+        self.assertEqual(results["0-0-qwen-turbo"], {"content": "答案", "time": 5.0, "status": "success"})
+        self.assertEqual(results["0-1-qwen-turbo"]["error"], "批处理请求失败: 参数错误")
+        self.assertEqual(results["0-2-qwen-turbo"]["error"], "批处理请求失败: 超时")
+
+
+class TestBatchRun(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeBatchServer(responder=responder, delay=0.1).start()
+        self.service = LLMService({"model_alicloud_compatible": self.server.base_url},
+                                  circuit_breakers=CircuitBreakerRegistry())
+        self.service.api_key = "test"
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.stop()
+        self.service.pools.close()
+        shutil.rmtree(self.work_dir)
+
+    def test_submit_poll_and_collect(self):
+        run = BatchRun(self.service, self.work_dir, CONFIG)
+        for index, prompt in enumerate(["第一句", "第二句", "失败的句子"]):
+            self.assertTrue(run.add(batch_custom_id(0, index, "qwen-turbo"), "qwen-turbo", prompt, "housing"))
+        self.assertFalse(run.add(batch_custom_id(0, 0, "chatglm3-6b"), "chatglm3-6b", "第一句"))
+        run.submit()
+        results = run.wait()
+
+        self.assertEqual(results["0-0-qwen-turbo"]["content"], "qwen-turbo: 第一句")
+        self.assertEqual(results["0-2-qwen-turbo"]["status"], "error")
+        self.assertEqual(run.stats, {"requests": 3, "unsupported": 1, "batches": 2, "succeeded": 2, "failed": 1,
+                                     "missing": 0, "pending": 0, "poll_errors": 0})
+
+        with open(os.path.join(self.work_dir, "alicloud_0.jsonl"), encoding="utf-8") as f:
+            request = json.loads(f.readline())
+        self.assertEqual(request["url"], "/v1/chat/completions")
+        self.assertEqual(request["body"]["max_tokens"], 300)
+        with open(os.path.join(self.work_dir, "manifest.json"), encoding="utf-8") as f:
+            self.assertEqual([job["status"] for job in json.load(f)["jobs"]], ["completed", "completed"])
+
+    def test_timeout_leaves_requests_missing(self):
+        self.server.state.delay = 60
+        run = BatchRun(self.service, self.work_dir, dict(CONFIG, timeout=0.2))
+        run.add(batch_custom_id(0, 0, "qwen-plus"), "qwen-plus", "第一句")
+        run.submit()
+        self.assertEqual(run.wait(), {})
+        self.assertEqual(run.stats["missing"], 0)
+        self.assertEqual(run.stats["pending"], 1)
+        self.assertEqual(run.pending_ids(), {"0-0-qwen-plus"})
+
+    def test_resume_from_manifest(self):
+        self.server.state.delay = 0.3
+        run = BatchRun(self.service, self.work_dir, dict(CONFIG, timeout=0.05), context={"template": "housing"})
+        run.add(batch_custom_id(0, 0, "qwen-plus"), "qwen-plus", "第一句")
+        run.submit()
+        self.assertEqual(run.wait(), {})
+
+        resumed = BatchRun.resume(self.service, run.manifest_path, CONFIG)
+        self.assertEqual(resumed.context, {"template": "housing"})
+        self.assertTrue(resumed.add(batch_custom_id(0, 0, "qwen-plus"), "qwen-plus", "第一句"))
+        results = resumed.wait()
+        self.assertEqual(results["0-0-qwen-plus"]["content"], "qwen-plus: 第一句")
+        self.assertEqual(resumed.pending_ids(), set())
+        self.assertEqual((resumed.stats["requests"], resumed.stats["succeeded"]), (1, 1))
+
+    def test_poll_errors_are_retried(self):
+        run = BatchRun(self.service, self.work_dir, CONFIG)
+        run.add(batch_custom_id(0, 0, "qwen-plus"), "qwen-plus", "第一句")
+        run.submit()
+        adapter = run.jobs[0]["adapter"]
+        retrieve = adapter.retrieve
+        calls = []
+
+        def flaky_retrieve(batch_id):
+            calls.append(batch_id)
+            if len(calls) == 1:
+                raise ConnectionError("连接被重置")
+            return retrieve(batch_id)
+
+        adapter.retrieve = flaky_retrieve
+        self.assertEqual(run.wait()["0-0-qwen-plus"]["status"], "success")
+        self.assertEqual(run.stats["poll_errors"], 1)
+
+    def test_default_answer(self):
+        self.server.state.responder = default_responder
+        run = BatchRun(self.service, self.work_dir, CONFIG)
+        run.add(batch_custom_id(0, 0, "qwen-max"), "qwen-max", "第一句")
+        run.submit()
+        self.assertEqual(run.wait()["0-0-qwen-max"]["content"], DEFAULT_ANSWER)
+
+
+if __name__ == '__main__':
+    unittest.main()
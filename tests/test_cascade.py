@@ -0,0 +1,94 @@
+import threading
+import unittest
+
+from src.core.cascade import Cascade, CASCADE_MODEL
+from src.core.scheduler import AnalysisScheduler
+from src.utils.response_parser import housing_output_problems
+
+
+def answer(stage="需求端", policy_type="激励型", policy_object="公租房"):
+    return (f"policy_object: {policy_object}; policy_stage: {stage}; policy_type: {policy_type}; "
+            f"policy_tool: 补贴; policy_geo_scope: 全市; policy_target_scope: 户籍; tool_parameter: 无")
+
+
+class ScriptedService:
+    """按(模型, 提示词)返回预设内容的模拟LLM服务，记录调用过的模型"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def call_model_result(self, model_name, prompt, template_name=None):
+        with self.lock:
+            self.calls.append((prompt, model_name))
+        content = self.answers.get((model_name, prompt), self.answers.get(model_name))
+        if content is None:
+            return {"content": None, "time": 0, "status": "error", "error": "失败"}
+        return {"content": content, "time": 0, "status": "success"}
+
+
+CONFIG = {"tiers": ["turbo", "plus", "max"], "verifier": "small",
+          "agreement_fields": ["policy_object", "policy_stage", "policy_type"]}
+
+
+class TestHousingOutputProblems(unittest.TestCase):
+
+    def test_problems(self):
+        self.assertEqual(housing_output_problems(answer()), [])
+        self.assertEqual(housing_output_problems('policy_object: 公租房; policy_stage: "需求端"'), ["parse_failed"])
+        self.assertEqual(housing_output_problems(answer(stage="需求侧", policy_type="奖励")),
+                         ["invalid_policy_stage", "invalid_policy_type"])
+        self.assertEqual(housing_output_problems(None), ["parse_failed"])
+
+
+class TestCascade(unittest.TestCase):
+
+    def run_cascade(self, answers, sentences):
+        service = ScriptedService(answers)
+        cascade = Cascade(CONFIG)
+        results = {}
+        scheduler = AnalysisScheduler(service, global_limit=4)
+        with scheduler:
+            cascade.submit(scheduler, "doc", list(enumerate(sentences)), lambda s: s, "housing",
+                           lambda index, model_name, result: results.__setitem__((index, model_name), result))
+        return service, cascade, results
+
+    def test_cheap_answer_accepted_when_verified(self):
+        service, cascade, results = self.run_cascade({"turbo": answer(), "small": answer()}, ["句子"])
+        final = results[(0, CASCADE_MODEL)]
+        self.assertEqual(final["cascade"]["model"], "turbo")
+        self.assertEqual(sorted(m for _, m in service.calls), ["small", "turbo"])
+        self.assertEqual(cascade.stats()["tiers"]["0:turbo"], {"accepted": 1, "escalated": 0})
+        self.assertEqual(cascade.stats()["verifier"]["agreed"], 1)
+
+    def test_escalates_on_invalid_and_disagreement(self):
+        answers = {
+            ("turbo", "无效"): answer(policy_type="奖励型"),
+            ("turbo", "分歧"): answer(stage="供给端"),
+            "small": answer(),
+            "plus": answer(stage="需求侧"),
+            "max": answer(),
+        }
+        service, cascade, results = self.run_cascade(answers, ["无效", "分歧"])
+        for index in range(2):
+            final = results[(index, CASCADE_MODEL)]
+            self.assertEqual(final["cascade"]["model"], "max")
+            self.assertEqual(final["cascade"]["tier"], 2)
+            self.assertEqual(final["content"], answer())
+
+        stats = cascade.stats()
+        self.assertEqual(stats["tiers"]["0:turbo"]["escalated"], 2)
+        self.assertEqual(stats["tiers"]["1:plus"]["escalated"], 2)
+        self.assertEqual(stats["tiers"]["2:max"]["accepted"], 2)
+        self.assertEqual(stats["reasons"]["invalid_policy_type"], 1)
+        self.assertEqual(stats["reasons"]["disagree_policy_stage"], 1)
+
+    def test_failed_call_escalates(self):
+        service, cascade, results = self.run_cascade({"small": answer(), "plus": answer()}, ["句子"])
+        self.assertEqual(results[(0, CASCADE_MODEL)]["cascade"]["model"], "plus")
+        self.assertEqual(cascade.stats()["reasons"], {"call_failed": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
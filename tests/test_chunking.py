@@ -0,0 +1,70 @@
+import io
+import unittest
+
+from src.core.chunking import ClauseChunker, clause_level, iter_segments
+from src.utils.text_processing import iter_sentence_spans
+
+TEXT = """第一章 总则
+第一条 为做好住房保障工作，制定本办法。本办法适用于本市。
+第二条 申请条件如下：
+（一）具有本市户籍；
+（二）家庭人均收入低于标准。
+第二章 保障方式
+第三条 补贴标准按年度确定。"""
+
+
+class TestClauseLevel(unittest.TestCase):
+
+    def test_markers(self):
+        self.assertEqual(clause_level("第十二章 附则"), "chapter")
+        self.assertEqual(clause_level("第3条 本办法自发布之日起施行。"), "article")
+        for text in ("（一）具有本市户籍；", "(2)收入标准", "三、保障方式", "1. 租赁补贴", "２、实物配租"):
+            self.assertEqual(clause_level(text), "item", text)
+        for text in ("1.5万元以下的补贴。", "本条所称住房", "2020年起施行。"):
+            self.assertIsNone(clause_level(text), text)
+
+
+class TestClauseChunker(unittest.TestCase):
+
+    def test_merges_within_clauses(self):
+        chunker = ClauseChunker(max_chars=200)
+        chunks = chunker.chunk(TEXT)
+        self.assertEqual([chunk.text for chunk in chunks], [
+            "第一章 总则\n第一条 为做好住房保障工作，制定本办法。本办法适用于本市。",
+            "第二条 申请条件如下：\n（一）具有本市户籍；\n（二）家庭人均收入低于标准。",
+            "第二章 保障方式\n第三条 补贴标准按年度确定。",
+        ])
+        self.assertEqual(chunker.stats(), {"files": 1, "sentences": 8, "chunks": 3,
+                                           "boundary_splits": 2, "budget_splits": 0})
+
+    def test_offsets_map_to_original_sentences(self):
+        for chunk in ClauseChunker().chunk(io.StringIO(TEXT), chunk_size=7):
+            self.assertEqual(chunk.start, chunk.sentences[0][0])
+            self.assertEqual(chunk.end, chunk.sentences[-1][1])
+            for start, end in chunk.sentences:
+                self.assertIn(TEXT[start:end], chunk.text)
+        self.assertEqual([segment[:3] for segment in iter_segments(TEXT)][:2],
+                         [(0, 6, "第一章 总则"), (7, 27, "第一条 为做好住房保障工作，制定本办法。")])
+
+    def test_budget(self):
+        chunks = ClauseChunker(max_chars=20).chunk(TEXT)
+        self.assertEqual(chunks[1].text, "第一条 为做好住房保障工作，制定本办法。")
+        self.assertTrue(all(len(chunk.text) <= 20 or len(chunk.sentences) == 1 for chunk in chunks))
+        # token预算同样生效
+        self.assertEqual(len(ClauseChunker(max_chars=1000, max_tokens=20).chunk(TEXT)), len(chunks))
+
+    def test_item_boundaries(self):
+        chunker = ClauseChunker(config={"boundary_levels": ["chapter", "article", "item"]})
+        texts = [chunk.text for chunk in chunker.chunk(TEXT)]
+        self.assertIn("第二条 申请条件如下：\n（一）具有本市户籍；", texts)
+        self.assertIn("（二）家庭人均收入低于标准。", texts)
+
+    def test_text_without_markers(self):
+        text = "租赁补贴按月发放。实物配租按季度分配。"
+        chunks = ClauseChunker().chunk(text)
+        self.assertEqual([(chunk.text, chunk.start, chunk.end) for chunk in chunks], [(text, 0, len(text))])
+        self.assertEqual(chunks[0].sentences, [(s, e) for s, e, _ in iter_sentence_spans(text)])
+
+
+if __name__ == '__main__':
+    unittest.main()
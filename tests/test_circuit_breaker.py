@@ -0,0 +1,78 @@
+import time
+import unittest
+
+from src.services.circuit_breaker import CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError
+from src.services.llm_service import LLMService
+
+
+class FlakyService(LLMService):
+    """_call_provider的返回值由outcomes依次给出，None表示调用失败"""
+
+    def __init__(self, outcomes, **kwargs):
+        super().__init__({}, **kwargs)
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def _call_provider(self, model_name, prompt, max_retries=3):
+        self.calls += 1
+        return self.outcomes.pop(0)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("qwen-turbo", failure_threshold=2, reset_timeout=60)
+        breaker.allow()
+        breaker.record_failure()
+        breaker.allow()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+        self.assertEqual(breaker.snapshot()["rejected"], 1)
+
+    def test_single_half_open_probe(self):
+        breaker = CircuitBreaker("qwen-turbo", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        breaker.allow()
+        self.assertEqual(breaker.state, "half_open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        time.sleep(0.06)
+        breaker.allow()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.snapshot()["probes"], 2)
+
+    def test_late_failures_do_not_postpone_probe(self):
+        breaker = CircuitBreaker("qwen-turbo", failure_threshold=1, reset_timeout=0.1)
+        breaker.record_failure()
+        opened_at = breaker.opened_at
+        # 打开前已经发出的调用陆续失败
+        time.sleep(0.06)
+        breaker.record_failure()
+        self.assertEqual(breaker.opened_at, opened_at)
+        self.assertEqual(breaker.snapshot()["opened"], 1)
+        time.sleep(0.06)
+        breaker.allow()
+        self.assertEqual(breaker.state, "half_open")
+
+    def test_call_model_fails_fast_while_open(self):
+        registry = CircuitBreakerRegistry(failure_threshold=2, reset_timeout=60)
+        service = FlakyService([None, None, "ok"], circuit_breakers=registry)
+        for _ in range(2):
+            self.assertEqual(service.call_model_result("qwen-plus", "政策")["status"], "error")
+        result = service.call_model_result("qwen-plus", "政策")
+        self.assertEqual(result["status"], "error")
+        self.assertIn("熔断", result["error"])
+        self.assertEqual(service.calls, 2)
+        self.assertEqual(registry.stats()["qwen-plus"]["state"], "open")
+
+
+if __name__ == '__main__':
+    unittest.main()
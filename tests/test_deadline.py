@@ -0,0 +1,169 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from src.core.scheduler import AnalysisScheduler, ModelTask
+from src.services.circuit_breaker import CircuitBreakerRegistry
+from src.services.deadline import Deadline, DeadlineExceeded, deadline_scope, current_deadline, get_timeouts
+from src.services.llm_service import LLMService
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """等待server.delay秒后返回ChatGLM格式的响应"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.delay)
+        body = json.dumps({"response": "ok"}).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_attempt_timeout_capped_by_remaining(self):
+        deadline = Deadline(time.monotonic() + 2, connect=5, read=60)
+        connect, read = deadline.attempt_timeout()
+        self.assertLessEqual(connect, 2)
+        self.assertLessEqual(read, 2)
+
+        expired = Deadline(time.monotonic() - 1, connect=5, read=60)
+        with self.assertRaises(DeadlineExceeded):
+            expired.attempt_timeout()
+
+    def test_for_call_uses_earlier_deadline(self):
+        outer = time.monotonic() + 1
+        deadline = Deadline.for_call({"connect": 5, "read": 60, "total": 180}, outer)
+        self.assertEqual(deadline.expires_at, outer)
+
+    def test_model_overrides_provider_and_default(self):
+        config = {
+            "default": {"connect": 5, "read": 60, "total": 180},
+            "providers": {"local": {"read": 120}},
+            "models": {"slow-model": {"read": 200, "total": 400}},
+        }
+        with patch.dict("src.services.deadline.TIMEOUT_CONFIG", config):
+            self.assertEqual(get_timeouts("local", "chatglm-local"), {"connect": 5, "read": 120, "total": 180})
+            self.assertEqual(get_timeouts("local", "slow-model"), {"connect": 5, "read": 200, "total": 400})
+
+    def test_scope_is_restored(self):
+        deadline = Deadline(time.monotonic() + 1, 1, 1)
+        with deadline_scope(deadline):
+            self.assertIs(current_deadline(), deadline)
+        self.assertIsNone(current_deadline())
+
+
+class TestCallDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+        self.server.daemon_threads = True
+        self.server.delay = 2.0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{self.server.server_address[1]}/chat"
+        self.service = LLMService({"model_chatglm": url}, circuit_breakers=CircuitBreakerRegistry())
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.pools.close()
+
+    def test_retries_share_total_budget(self):
+        start = time.monotonic()
+        result = self.service.call_model_result("chatglm-local", "政策", deadline=time.monotonic() + 0.5)
+        elapsed = time.monotonic() - start
+        self.assertEqual(result["status"], "error")
+        self.assertLess(elapsed, 1.5)
+
+    def test_call_within_deadline_succeeds(self):
+        self.server.delay = 0.05
+        result = self.service.call_model_result("chatglm-local", "政策", deadline=time.monotonic() + 5)
+        self.assertEqual(result["content"], "ok")
+
+    def test_expired_deadline_not_sent(self):
+        result = self.service.call_model_result("chatglm-local", "政策", deadline=time.monotonic() - 1)
+        self.assertEqual(result["status"], "error")
+        self.assertIn("截止时间", result["error"])
+
+    def test_parallel_calls_return_by_deadline(self):
+        start = time.monotonic()
+        results = self.service.process_prompts_parallel(["chatglm-local", "chatglm-local-2"], "政策",
+                                                        deadline=time.monotonic() + 0.5)
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertTrue(all(r["status"] == "error" for r in results.values()))
+
+    def test_async_call_cancelled_at_deadline(self):
+        async def run():
+            try:
+                return await self.service.acall_model_result("chatglm-local", "政策",
+                                                             deadline=time.monotonic() + 0.5)
+            finally:
+                await self.service.pools.aclose()
+
+        start = time.monotonic()
+        result = asyncio.run(run())
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertEqual(result["status"], "error")
+
+
+class TestSchedulerDeadline(unittest.TestCase):
+
+    def test_queued_task_cancelled_after_deadline(self):
+        class SlowService:
+            def call_model_result(self, model_name, prompt, template_name=None, deadline=None):
+                time.sleep(0.3)
+                return {"content": prompt, "time": 0.3, "status": "success"}
+
+        results = {}
+        scheduler = AnalysisScheduler(SlowService(), global_limit=1)
+        with scheduler:
+            deadline = time.monotonic() + 0.1
+            for i in range(2):
+                scheduler.submit(ModelTask("doc", i, "qwen-turbo", f"句子{i}", None, deadline),
+                                 lambda task, result: results.__setitem__(task.sentence_index, result))
+
+        self.assertEqual(results[0]["status"], "success")
+        self.assertEqual(results[1]["status"], "error")
+        self.assertEqual(scheduler.stats["cancelled"], 1)
+
+    def test_new_deadline_disabled_by_default(self):
+        self.assertIsNone(AnalysisScheduler(None).new_deadline())
+        deadline = AnalysisScheduler(None, sentence_deadline=10).new_deadline()
+        self.assertGreater(deadline.start(), time.monotonic())
+
+    def test_deadline_starts_when_task_runs(self):
+        seen = []
+
+        class RecordingService:
+            def call_model_result(self, model_name, prompt, template_name=None, deadline=None):
+                seen.append(deadline)
+                return {"content": prompt, "time": 0.0, "status": "success"}
+
+        scheduler = AnalysisScheduler(RecordingService(), global_limit=1, sentence_deadline=0.2)
+        deadline = scheduler.new_deadline()
+        # 提交前等待的时间（如背压阻塞）不计入句子截止时间
+        time.sleep(0.3)
+        with scheduler:
+            for model_name in ("qwen-turbo", "qwen-plus"):
+                scheduler.submit(ModelTask("doc", 0, model_name, "句子", None, deadline), lambda task, result: None)
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(seen[0], seen[1])
+        self.assertGreater(seen[0], time.monotonic() - 0.2)
+        self.assertEqual(scheduler.stats["cancelled"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+from src.core.dedup import SentenceDeduplicator
+from src.utils.text_processing import normalize_sentence
+
+
+class TestNormalizeSentence(unittest.TestCase):
+
+    def test_width_punctuation_and_whitespace(self):
+        self.assertEqual(normalize_sentence("本办法 适用于（公租房）。"),
+                         normalize_sentence("本办法适用于(公租房)."))
+        self.assertEqual(normalize_sentence("ＡＢＣ　１２３"), "ABC123")
+
+
+class TestSentenceDeduplicator(unittest.TestCase):
+
+    def test_results_fan_out_to_all_occurrences(self):
+        dedup = SentenceDeduplicator()
+        records = []
+        record_a = lambda index, model, result: records.append(("a", index, model, result["content"]))
+        record_b = lambda index, model, result: records.append(("b", index, model, result["content"]))
+
+        key, dispatch = dedup.register("housing", "本办法自发布之日起施行。", 3, record_a, ["qwen-turbo"])
+        self.assertEqual(dispatch, ["qwen-turbo"])
+        _, dispatch = dedup.register("housing", "本办法自发布之日起施行.", 7, record_b, ["qwen-turbo"])
+        self.assertEqual(dispatch, [])
+        _, dispatch = dedup.register("standard", "本办法自发布之日起施行。", 0, record_b, ["qwen-turbo"])
+        self.assertEqual(dispatch, ["qwen-turbo"])
+
+        dedup.resolve(key, "qwen-turbo", {"content": "答案", "status": "success"})
+        self.assertCountEqual(records, [("a", 3, "qwen-turbo", "答案"), ("b", 7, "qwen-turbo", "答案")])
+
+        # 结果返回后登记的出现位置立即收到结果
+        dedup.register("housing", "本办法自发布之日起施行。", 9, record_a, ["qwen-turbo"])
+        self.assertIn(("a", 9, "qwen-turbo", "答案"), records)
+
+        stats = dedup.stats(model_count=2)
+        self.assertEqual(stats["total_sentences"], 4)
+        self.assertEqual(stats["unique_sentences"], 2)
+        self.assertEqual(stats["dedup_ratio"], 0.5)
+        self.assertEqual(stats["saved_calls"], 4)
+
+    def test_occurrences_released_when_all_models_resolved(self):
+        dedup = SentenceDeduplicator()
+        records = []
+        record = lambda index, model, result: records.append((index, model))
+        key, _ = dedup.register("housing", "第一句。", 0, record, ["a", "b"])
+        dedup.register("housing", "第一句。", 5, record, ["a", "b"])
+        dedup.resolve(key, "a", {"content": "甲"})
+        self.assertEqual([occurrence[2] for occurrence in dedup._entries[key].occurrences], [{"b"}, {"b"}])
+        dedup.resolve(key, "b", {"content": "乙"})
+        self.assertEqual(dedup._entries[key].occurrences, [])
+        self.assertCountEqual(records, [(0, "a"), (5, "a"), (0, "b"), (5, "b")])
+
+    def test_completed_entries_bounded(self):
+        dedup = SentenceDeduplicator(max_completed=2)
+        record = lambda index, model, result: None
+        keys = [dedup.register("housing", f"第{i}句。", i, record, ["a"])[0] for i in range(3)]
+        # 未完成的句子不会被淘汰
+        self.assertEqual(len(dedup._entries), 3)
+        for key in keys:
+            dedup.resolve(key, "a", {"content": "答案"})
+        self.assertNotIn(keys[0], dedup._entries)
+        self.assertEqual(dedup.stats()["evicted"], 1)
+        # 被淘汰的句子再次出现时重新调用模型
+        self.assertEqual(dedup.register("housing", "第0句。", 9, record, ["a"])[1], ["a"])
+        self.assertEqual(dedup.register("housing", "第2句。", 9, record, ["a"])[1], [])
+
+    def test_error_results_not_reused(self):
+        dedup = SentenceDeduplicator()
+        records = []
+        record = lambda index, model, result: records.append((index, model, result["status"]))
+        key, _ = dedup.register("housing", "第一句。", 0, record, ["a", "b"])
+        dedup.register("housing", "第一句。", 1, record, ["a", "b"])
+        dedup.resolve(key, "a", {"content": None, "status": "error", "error": "超过截止时间"})
+        dedup.resolve(key, "b", {"content": "乙", "status": "success"})
+        # 等待中的出现位置收到错误，之后出现时只重新调用出错的模型
+        self.assertCountEqual(records, [(0, "a", "error"), (1, "a", "error"), (0, "b", "success"),
+                                        (1, "b", "success")])
+        records.clear()
+        self.assertEqual(dedup.register("housing", "第一句。", 2, record, ["a", "b"])[1], ["a"])
+        self.assertEqual(dedup.register("housing", "第一句。", 3, record, ["a", "b"])[1], [])
+        dedup.resolve(key, "a", {"content": "甲", "status": "success"})
+        self.assertCountEqual(records, [(2, "b", "success"), (3, "b", "success"), (2, "a", "success"),
+                                        (3, "a", "success")])
+        self.assertEqual(dedup.register("housing", "第一句。", 4, record, ["a", "b"])[1], [])
+        stats = dedup.stats(model_count=2)
+        self.assertEqual(stats["redispatched"], 1)
+        self.assertEqual(stats["saved_calls"], 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.circuit_breaker import CircuitBreakerRegistry
+from src.services.deadline import current_deadline
+from src.services.hedging import HedgePolicy, LatencyTracker
+from src.services.llm_service import LLMService
+
+CONFIG = {
+    "percentile": 95,
+    "window": 50,
+    "min_samples": 3,
+    "min_delay": 0.05,
+    "max_hedge_ratio": 0.5,
+    "max_workers": 8,
+    "models": {},
+}
+
+
+class DelayedService(LLMService):
+    """
+    _call_provider/_acall_provider依次使用delays中的延迟，返回第几次调用的编号
+
+    interruptible为True时同步调用像流式输出一样在截止时间被取消后立即结束，否则像非流式请求一样等到延迟结束
+    """
+
+    def __init__(self, delays, interruptible=True, **kwargs):
+        super().__init__({}, circuit_breakers=CircuitBreakerRegistry(), **kwargs)
+        self.delays = list(delays)
+        self.interruptible = interruptible
+        self.calls = 0
+        self.cancelled = 0
+        self.threads = []
+        self.count_lock = threading.Lock()
+
+    def _next(self):
+        with self.count_lock:
+            self.calls += 1
+            return self.calls, self.delays.pop(0)
+
+    def _call_provider(self, model_name, prompt, max_retries=3):
+        call, delay = self._next()
+        self.threads.append(threading.current_thread())
+        deadline = current_deadline()
+        finish_at = time.monotonic() + delay
+        while time.monotonic() < finish_at:
+            if self.interruptible and deadline is not None and deadline.cancelled:
+                with self.count_lock:
+                    self.cancelled += 1
+                return None
+            time.sleep(0.005)
+        return f"call-{call}"
+
+    async def _acall_provider(self, model_name, prompt, max_retries=3):
+        call, delay = self._next()
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"call-{call}"
+
+
+class TestLatencyTracker(unittest.TestCase):
+
+    def test_percentile(self):
+        tracker = LatencyTracker(window=100)
+        for latency in range(1, 101):
+            tracker.add(latency / 100)
+        self.assertEqual(tracker.percentile(95), 0.95)
+        self.assertIsNone(LatencyTracker(window=10).percentile(95))
+
+
+class TestHedgePolicy(unittest.TestCase):
+
+    def test_no_hedge_until_enough_samples(self):
+        policy = HedgePolicy(CONFIG)
+        self.assertIsNone(policy.hedge_delay("qwen-max"))
+        for _ in range(3):
+            policy.record_latency("qwen-max", 0.2)
+        self.assertEqual(policy.hedge_delay("qwen-max"), 0.2)
+
+    def test_hedge_rate_capped(self):
+        policy = HedgePolicy(CONFIG)
+        allowed = 0
+        for _ in range(10):
+            policy.hedge_delay("qwen-max")
+            allowed += policy.try_hedge("qwen-max")
+        self.assertEqual(allowed, 5)
+        self.assertEqual(policy.snapshot()["qwen-max"]["capped"], 5)
+
+
+class TestHedgedCalls(unittest.TestCase):
+
+    def make_service(self, delays, interruptible=True):
+        policy = HedgePolicy({**CONFIG, "max_hedge_ratio": 1.0})
+        for _ in range(3):
+            policy.record_latency("qwen-max", 0.05)
+        return DelayedService(delays, interruptible, hedging=policy)
+
+    def test_hedge_wins_over_straggler(self):
+        service = self.make_service([1.0, 0.01])
+        start = time.monotonic()
+        self.assertEqual(service.call_model("qwen-max", "政策"), "call-2")
+        self.assertLess(time.monotonic() - start, 0.5)
+        service.threads[0].join()
+        stats = service.hedging.snapshot()["qwen-max"]
+        self.assertEqual(stats["hedged"], 1)
+        self.assertEqual(stats["hedge_wins"], 1)
+        self.assertEqual(stats["losers_cancelled"], 1)
+        self.assertEqual(service.cancelled, 1)
+        # 被中断的原请求没有结果，不记录节省时间
+        self.assertEqual(stats["saved_seconds"], 0)
+        # 原请求在单独的线程中执行，对冲请求使用线程池
+        self.assertEqual(service.threads[0].name, "llm-hedge-primary")
+        self.assertTrue(service.threads[1].name.startswith("llm-hedge_"))
+
+    def test_uninterruptible_primary_does_not_delay_hedge_result(self):
+        service = self.make_service([0.8, 0.01], interruptible=False)
+        start = time.monotonic()
+        self.assertEqual(service.call_model("qwen-max", "政策"), "call-2")
+        elapsed = time.monotonic() - start
+        # 对冲延迟0.05秒加对冲请求的0.01秒，不等待仍在读取的原请求
+        self.assertLess(elapsed, 0.3)
+        self.assertEqual(service.hedging.snapshot()["qwen-max"]["saved_seconds"], 0)
+        service.threads[0].join()
+        stats = service.hedging.snapshot()["qwen-max"]
+        self.assertEqual(stats["hedge_wins"], 1)
+        self.assertAlmostEqual(stats["saved_seconds"], 0.8 - elapsed, delta=0.1)
+
+    def test_primary_not_queued_behind_busy_executor(self):
+        service = self.make_service([0.01])
+        service._hedge_executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(service._hedge_executor.shutdown)
+        blocker = threading.Event()
+        service._hedge_executor.submit(blocker.wait)
+        try:
+            start = time.monotonic()
+            self.assertEqual(service.call_model("qwen-max", "政策"), "call-1")
+            self.assertLess(time.monotonic() - start, 0.5)
+        finally:
+            blocker.set()
+
+    def test_fast_call_not_hedged(self):
+        service = self.make_service([0.01])
+        self.assertEqual(service.call_model("qwen-max", "政策"), "call-1")
+        self.assertEqual(service.calls, 1)
+        self.assertEqual(service.hedging.snapshot()["qwen-max"]["hedged"], 0)
+
+    def test_async_loser_cancelled(self):
+        service = self.make_service([1.0, 0.01])
+        start = time.monotonic()
+        result = asyncio.run(service.acall_model("qwen-max", "政策"))
+        self.assertEqual(result, "call-2")
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(service.cancelled, 1)
+        self.assertEqual(service.hedging.snapshot()["qwen-max"]["hedge_wins"], 1)
+
+    def test_hedge_target_uses_backup_endpoint(self):
+        config = {**CONFIG, "models": {"qwen-max": {"endpoints": {"model_alicloud_compatible": "http://backup/v1"}}}}
+        service = LLMService({"model_alicloud_compatible": "http://primary/v1"}, hedging=HedgePolicy(config))
+        target = service._hedge_target("qwen-max")
+        self.assertEqual(target.model_endpoints["model_alicloud_compatible"], "http://backup/v1")
+        self.assertEqual(service.model_endpoints["model_alicloud_compatible"], "http://primary/v1")
+        self.assertIs(target.rate_limiter, service.rate_limiter)
+        self.assertIs(service._hedge_target("qwen-plus"), service)
+
+
+if __name__ == '__main__':
+    unittest.main()
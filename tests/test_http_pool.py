@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import MagicMock
+
+from src.services.http_pool import ConnectionPoolManager
+from src.services.llm_service import LLMService, get_model_provider
+
+
+class TestConnectionPoolManager(unittest.TestCase):
+
+    def setUp(self):
+        self.pools = ConnectionPoolManager({
+            "default": {"pool_connections": 2, "pool_maxsize": 5},
+            "alicloud": {"pool_maxsize": 20}
+        })
+
+    def tearDown(self):
+        self.pools.close()
+
+    def test_session_reused_per_provider_and_host(self):
+        first = self.pools.get_session("baidu", "https://aip.baidubce.com/chat/ernie-bot?access_token=a")
+        second = self.pools.get_session("baidu", "https://aip.baidubce.com/chat/ernie-bot-4?access_token=b")
+        other = self.pools.get_session("alicloud", "https://dashscope.aliyuncs.com/api/v1")
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+
+    def test_pool_settings_override_default(self):
+        session = self.pools.get_session("alicloud", "https://dashscope.aliyuncs.com/api/v1")
+        adapter = session.get_adapter("https://dashscope.aliyuncs.com")
+
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 20)
+
+    def test_openai_client_reused(self):
+        first = self.pools.get_openai_client("openai", "https://api.openai.com/v1", "key")
+        second = self.pools.get_openai_client("openai", "https://api.openai.com/v1", "key")
+        other = self.pools.get_openai_client("openai", "https://api.openai.com/v1", "other-key")
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+
+
+class TestLLMServicePooling(unittest.TestCase):
+
+    def test_chatglm_calls_share_session(self):
+        service = LLMService({"model_chatglm": "http://127.0.0.1:8002/chat"})
+        session = service.pools.get_session("local", "http://127.0.0.1:8002/chat")
+        response = MagicMock()
+        response.json.return_value = {"response": "ok"}
+        session.post = MagicMock(return_value=response)
+
+        self.assertEqual(service.call_model("chatglm-local", "第一句"), "ok")
+        self.assertEqual(service.call_model("chatglm-local", "第二句"), "ok")
+        self.assertEqual(session.post.call_count, 2)
+
+    def test_get_model_provider(self):
+        self.assertEqual(get_model_provider("qwen-max"), "alicloud")
+        self.assertEqual(get_model_provider("deepseek-r1"), "alicloud")
+        self.assertEqual(get_model_provider("chatglm-local"), "local")
+        self.assertEqual(get_model_provider("ernie-bot"), "baidu")
+        self.assertEqual(get_model_provider("gpt-4"), "openai")
+        self.assertIsNone(get_model_provider("unknown"))
+
+
+if __name__ == '__main__':
+    unittest.main()
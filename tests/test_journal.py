@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from src.services.journal import ProgressJournal
+
+
+class TestProgressJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "journal", "run_20240101_000000.jsonl")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_replay_completed_results(self):
+        journal = ProgressJournal(self.path)
+        journal.append("/data/a.txt", 0, "第一句。", "qwen-turbo",
+                       {"content": "答案", "status": "success", "time": 1.0, "prompt": "很长的提示词"})
+        journal.append("/data/a.txt", 1, "第二句。", "qwen-turbo", {"content": "答案二", "status": "success"})
+        journal.close()
+
+        resumed = ProgressJournal(self.path, replay=True)
+        self.addCleanup(resumed.close)
+        replayed = resumed.replay("/data/a.txt", 0, "第一句。", ["qwen-turbo", "qwen-max"])
+
+        self.assertEqual(list(replayed), ["qwen-turbo"])
+        self.assertEqual(replayed["qwen-turbo"]["content"], "答案")
+        self.assertNotIn("prompt", replayed["qwen-turbo"])
+        # 句子内容变化后不复用旧结果
+        self.assertEqual(resumed.replay("/data/a.txt", 1, "第二句已修改。", ["qwen-turbo"]), {})
+
+    def test_truncated_last_line_is_skipped(self):
+        journal = ProgressJournal(self.path)
+        journal.append("/data/a.txt", 0, "第一句。", "qwen-turbo", {"content": "答案", "status": "success"})
+        journal.close()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"file": "/data/a.txt", "index": 1, "dig')
+
+        resumed = ProgressJournal(self.path, replay=True)
+        self.assertEqual(len(resumed.replay("/data/a.txt", 0, "第一句。", ["qwen-turbo"])), 1)
+        resumed.append("/data/a.txt", 1, "第二句。", "qwen-turbo", {"content": "答案二", "status": "success"})
+        resumed.close()
+
+        again = ProgressJournal(self.path, replay=True)
+        self.addCleanup(again.close)
+        self.assertEqual(len(again.replay("/data/a.txt", 1, "第二句。", ["qwen-turbo"])), 1)
+
+    def test_latest_path(self):
+        journal_dir = os.path.dirname(self.path)
+        self.assertIsNone(ProgressJournal.latest_path(journal_dir))
+        ProgressJournal(self.path).close()
+        ProgressJournal(os.path.join(journal_dir, "run_20240102_000000.jsonl")).close()
+
+        self.assertTrue(ProgressJournal.latest_path(journal_dir).endswith("run_20240102_000000.jsonl"))
+
+
+if __name__ == '__main__':
+    unittest.main()
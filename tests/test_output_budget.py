@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from src.core.run_report import RunReport
+from src.services.circuit_breaker import CircuitBreakerRegistry
+from src.services.llm_service import LLMService
+from src.services.response_cache import ResponseCache
+from src.services.output_budget import (OutputBudget, REPORT_SECTION, histogram_percentile, load_histograms,
+                                        tune_budgets)
+
+CONFIG = {
+    "auto_tune": True,
+    "percentile": 99,
+    "headroom": 1.5,
+    "min_samples": 10,
+    "min_tokens": 64,
+    "bucket_size": 16,
+    "history_reports": 5,
+}
+
+
+class CompatibleHandler(BaseHTTPRequestHandler):
+    """记录请求体并返回固定内容的OpenAI兼容接口，max_tokens小于server.truncate_below时返回finish_reason=length"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        finish_reason = "length" if body["max_tokens"] < self.server.truncate_below else "stop"
+        data = json.dumps({"id": "1", "object": "chat.completion", "created": 0, "model": "qwen-turbo",
+                           "choices": [{"index": 0, "finish_reason": finish_reason,
+                                        "message": {"role": "assistant", "content": "policy_object: 公租房;"}}]})
+        data = data.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTuning(unittest.TestCase):
+
+    def test_histogram_percentile(self):
+        histogram = {"0": 90, "96": 9, "480": 1}
+        self.assertEqual(histogram_percentile(histogram, 90, 16), 16)
+        self.assertEqual(histogram_percentile(histogram, 99, 16), 112)
+        self.assertEqual(histogram_percentile(histogram, 100, 16), 496)
+
+    def test_tune_requires_enough_samples(self):
+        tuned = tune_budgets({"housing": {"qwen-turbo": {"96": 20}, "qwen-max": {"96": 5}}}, CONFIG)
+        self.assertEqual(tuned, {"housing": {"qwen-turbo": 168}})
+        self.assertEqual(tune_budgets({"housing": {"qwen-turbo": {"0": 20}}}, CONFIG)["housing"]["qwen-turbo"], 64)
+
+
+class TestOutputBudget(unittest.TestCase):
+
+    def test_precedence(self):
+        budget = OutputBudget({"housing": {"qwen-turbo": 150}}, CONFIG)
+        self.assertEqual(budget.max_tokens("housing", "qwen-turbo", 4000), 150)
+        self.assertEqual(budget.max_tokens("housing", "qwen-plus", 4000), 300)
+        self.assertEqual(budget.max_tokens("housing", "deepseek-r1", 2000), 1000)
+        self.assertEqual(budget.max_tokens("standard", "qwen-72b-chat", 1000), 1000)
+        self.assertEqual(budget.max_tokens(None, "qwen-turbo", 4000), 4000)
+
+    def test_history_round_trip(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        budget = OutputBudget(config=CONFIG)
+        for _ in range(12):
+            budget.observe("housing", "qwen-turbo", "字" * 100)
+        report = RunReport()
+        report.add_section(REPORT_SECTION, budget.snapshot())
+        report.save(os.path.join(output_dir, "housing"))
+
+        self.assertEqual(load_histograms(output_dir), {"housing": {"qwen-turbo": {"96": 12}}})
+        tuned = OutputBudget.from_history(output_dir, CONFIG)
+        self.assertEqual(tuned.max_tokens("housing", "qwen-turbo", 4000), 168)
+
+
+class TestCallUsesBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), CompatibleHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.server.truncate_below = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        self.service = LLMService({"model_alicloud_compatible": base_url},
+                                  circuit_breakers=CircuitBreakerRegistry(),
+                                  output_budget=OutputBudget(config=CONFIG))
+        self.service.api_key = "test"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.pools.close()
+
+    def test_template_budget_sent_and_output_observed(self):
+        self.service.call_model("qwen-turbo", "政策", template_name="housing")
+        self.service.call_model("qwen-turbo", "政策")
+        self.assertEqual([r["max_tokens"] for r in self.server.requests], [300, 4000])
+        self.assertEqual(self.service.get_generation_params("qwen-turbo", "housing")["max_tokens"], 300)
+        self.assertEqual(self.service.output_budget.snapshot(), {"housing": {"qwen-turbo": {"16": 1}}})
+
+    def test_truncated_output_retried_with_model_limit(self):
+        self.server.truncate_below = 1000
+        self.assertEqual(self.service.call_model("qwen-turbo", "政策", template_name="housing"), "policy_object: 公租房;")
+        self.assertEqual([r["max_tokens"] for r in self.server.requests], [300, 4000])
+        self.assertEqual(self.service.output_budget.snapshot(), {"housing": {"qwen-turbo": {"16": 1}}})
+
+    def test_truncated_output_not_cached_or_observed(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.service.response_cache = ResponseCache(cache_dir)
+        self.addCleanup(self.service.response_cache.close)
+        self.server.truncate_below = 10000
+        self.service.call_model("qwen-turbo", "政策", template_name="housing")
+        self.service.call_model("qwen-turbo", "政策", template_name="housing")
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(self.service.output_budget.snapshot(), {})
+        self.assertEqual(self.service.response_cache.stats["writes"], 0)
+
+    def test_cache_key_independent_of_tuned_budget(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.service.response_cache = ResponseCache(cache_dir)
+        self.addCleanup(self.service.response_cache.close)
+        self.service.call_model("qwen-turbo", "政策", template_name="housing")
+        # 历史输出长度变化后预算不同，仍命中缓存
+        self.service.output_budget = OutputBudget({"housing": {"qwen-turbo": 150}}, CONFIG)
+        self.service.call_model("qwen-turbo", "政策", template_name="housing")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_async_call_uses_budget(self):
+        self.server.truncate_below = 1000
+        result = asyncio.run(self.service.acall_model("qwen-turbo", "政策", template_name="housing"))
+        self.assertEqual(result, "policy_object: 公租房;")
+        asyncio.run(self.service.acall_model("qwen-turbo", "政策"))
+        self.assertEqual([r["max_tokens"] for r in self.server.requests], [300, 4000, 4000])
+
+
+if __name__ == '__main__':
+    unittest.main()
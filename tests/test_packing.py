@@ -0,0 +1,54 @@
+import unittest
+
+from src.core.packing import AdaptivePacker, render_packed_prompt, split_packed_response
+
+LINE = ("policy_object: 廉租房; policy_stage: 需求端; policy_type: 激励型; policy_tool: 租金补贴; "
+        "policy_geo_scope: 未指定; policy_target_scope: 低收入家庭; tool_parameter: 无;")
+
+
+class TestPackedPrompt(unittest.TestCase):
+
+    def test_render_numbers_sentences(self):
+        prompt = render_packed_prompt("housing", ["第一句。", "第二句。"])
+
+        self.assertIn("[1] 第一句。\n[2] 第二句。", prompt)
+        self.assertIn("全部2行", prompt)
+        self.assertIn("公共租赁住房（公租房）", prompt)
+
+    def test_split_marks_missing_and_incomplete_items(self):
+        content = "\n".join([
+            f"[1] {LINE}",
+            "[2] policy_object: 廉租房; policy_stage: 需求端;",
+            f"4. {LINE}",
+        ])
+        lines = split_packed_response(content, 4)
+
+        self.assertEqual(lines[0], LINE)
+        self.assertIsNone(lines[1])
+        self.assertIsNone(lines[2])
+        self.assertEqual(lines[3], LINE)
+
+
+class TestAdaptivePacker(unittest.TestCase):
+
+    def test_batch_respects_k_and_token_budget(self):
+        packer = AdaptivePacker(max_k=3, config={"max_input_tokens": 10})
+        items = list(enumerate(["一二三", "四五六", "七八九", "十"]))
+
+        self.assertEqual([i for i, _ in packer.next_batch("qwen-turbo", items)], [0, 1, 2])
+        self.assertEqual([i for i, _ in packer.next_batch("qwen-turbo", [(0, "长" * 20), (1, "短")])], [0])
+
+    def test_k_adapts_to_parse_failures_per_model(self):
+        packer = AdaptivePacker(max_k=8)
+
+        packer.record("qwen-turbo", 8, 4)
+        self.assertEqual(packer.current_k("qwen-turbo"), 4)
+        self.assertEqual(packer.current_k("qwen-max"), 8)
+
+        packer.record("qwen-turbo", 4, 0)
+        self.assertEqual(packer.current_k("qwen-turbo"), 5)
+        self.assertEqual(packer.stats["failed_items"], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import io
+import json
+import unittest
+
+from src.config.prompt_templates import HOUSING_ELEMENTS_TEMPLATE, HOUSING_POLICY_OBJECTS
+from src.core.prefilter import HousingPrefilter, labels_from_output, labels_from_jsonl
+from src.utils.aho_corasick import AhoCorasick
+from src.utils.response_parser import format_model_result
+
+# 标注样本：公文中常见的导语、落款、日期、抄送名单为不相关
+LABELED_SAMPLE = [
+    ("对符合条件的本市户籍家庭发放公租房租赁补贴。", True),
+    ("新建商品住房项目应当按照不低于10%的比例配建保障性租赁住房。", True),
+    ("商品房预售资金应当全部存入监管账户。", True),
+    ("各区住房保障部门负责申请材料的审核。", True),
+    ("棚户区改造安置房优先用于回迁安置。", True),
+    ("对违规转租的承租家庭，五年内不得再次申请。", True),
+    ("人才可按规定申请住房补贴。", True),
+    ("为贯彻落实党中央、国务院决策部署，结合本市实际，制定本办法。", False),
+    ("广州市住房和城乡建设局", False),
+    ("2023年5月1日", False),
+    ("抄送：市财政局、市发展改革委、市自然资源局。", False),
+    ("各区人民政府要加强组织领导，确保各项工作落到实处。", False),
+    ("本办法自印发之日起施行，有效期五年。", False),
+    ("请各单位认真贯彻执行。", False),
+]
+
+
+class TestAhoCorasick(unittest.TestCase):
+
+    def test_overlapping_matches(self):
+        automaton = AhoCorasick({"住房": 1, "保障性租赁住房": 2, "租赁": 3})
+        self.assertEqual(sorted(automaton.iter_matches("配建保障性租赁住房")),
+                         [(2, 9, 2), (5, 7, 3), (7, 9, 1)])
+        self.assertEqual(list(automaton.iter_matches("无关文本")), [])
+
+    def test_add_after_search(self):
+        automaton = AhoCorasick(["公租房"])
+        self.assertEqual(list(automaton.iter_matches("公租房")), [(0, 3, "公租房")])
+        automaton.add("租房")
+        self.assertEqual(len(automaton), 2)
+        self.assertEqual(sorted(automaton.iter_matches("公租房")), [(0, 3, "公租房"), (1, 3, "租房")])
+
+
+class TestHousingPrefilter(unittest.TestCase):
+
+    def test_vocabulary_matches_template(self):
+        self.assertIn("、".join(HOUSING_POLICY_OBJECTS), HOUSING_ELEMENTS_TEMPLATE)
+
+    def test_score_counts_distinct_keywords(self):
+        score, keywords = HousingPrefilter().score("公租房租赁补贴，公租房。")
+        self.assertEqual(score, 2.0)
+        self.assertEqual(keywords, ["公租房", "租赁", "补贴"])
+        self.assertEqual(HousingPrefilter().score("广州市住房和城乡建设局")[0], 0.5)
+
+    def test_not_relevant_record(self):
+        prefilter = HousingPrefilter()
+        self.assertIsNone(prefilter.check("对符合条件的家庭发放公租房租赁补贴。", 3))
+        result = prefilter.check("请各单位认真贯彻执行。", 3)
+        formatted = format_model_result(result)
+        self.assertEqual(formatted["policy_object"], "未匹配")
+        self.assertEqual(formatted["policy_tool"], "未定义")
+        self.assertEqual(formatted["prefilter"], {"score": 0, "keywords": []})
+        self.assertEqual(prefilter.stats(), {"sentences": 2, "filtered": 1, "skipped_calls": 3})
+
+    def test_precision_and_recall_on_labeled_sample(self):
+        result = HousingPrefilter().evaluate(LABELED_SAMPLE)
+        self.assertEqual(result["samples"], len(LABELED_SAMPLE))
+        self.assertEqual(result["recall"], 1.0)
+        self.assertEqual(result["precision"], 1.0)
+        self.assertEqual(result["filtered_ratio"], 0.5)
+        # 阈值过高时漏掉相关句子
+        self.assertLess(HousingPrefilter(3.0).evaluate(LABELED_SAMPLE)["recall"], 1.0)
+
+    def test_labels_from_output(self):
+        combined = {"sentences": [
+            {"text": "相关", "models": {"a": {"policy_object": "未匹配", "policy_tool": "一次性补贴"},
+                                      "b": {"policy_object": "未匹配", "policy_tool": "未定义"}}},
+            {"text": "不相关", "models": {"a": {"policy_object": "未匹配", "policy_tool": "未定义"},
+                                       "b": {"error": "超时"}}},
+            {"text": "失败", "models": {"a": {"error": "超时"}}},
+        ]}
+        self.assertEqual(list(labels_from_output(combined)), [("相关", True), ("不相关", False)])
+        lines = io.StringIO(json.dumps({"text": "句子", "relevant": True}, ensure_ascii=False) + "\n\n")
+        self.assertEqual(list(labels_from_jsonl(lines)), [("句子", True)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from src.core.quorum import Quorum
+from src.core.scheduler import AnalysisScheduler
+from src.services.circuit_breaker import CircuitBreakerRegistry
+from src.services.llm_service import LLMService
+from src.utils.response_parser import housing_quorum, format_model_result, QUORUM_SKIPPED
+
+
+def answer(stage="需求端", policy_tool="补贴"):
+    return (f"policy_object: 公租房; policy_stage: {stage}; policy_type: 激励型; policy_tool: {policy_tool}; "
+            f"policy_geo_scope: 全市; policy_target_scope: 户籍; tool_parameter: 无;")
+
+
+class SlowModelService:
+    """slow模型一直等到被取消，其余模型立即返回预设内容"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def call_model_result(self, model_name, prompt, template_name=None, cancel_event=None):
+        with self.lock:
+            self.calls.append(model_name)
+        if model_name == "slow":
+            cancelled = cancel_event.wait(5)
+            return {"content": None if cancelled else answer(), "time": 0,
+                    "status": "skipped" if cancelled else "success", "error": "调用已取消"}
+        return {"content": self.answers[model_name], "time": 0, "status": "success"}
+
+
+class SlowStreamHandler(BaseHTTPRequestHandler):
+    """qwen-max逐块缓慢输出，其余模型一次输出完整答案"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        slow = body["model"] == "qwen-max"
+        pieces = [answer()[i:i + 5] for i in range(0, len(answer()), 5)] if slow else [answer()]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        sent = 0
+        try:
+            for piece in pieces:
+                chunk = {"id": "1", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                         "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                sent += 1
+                if slow:
+                    time.sleep(0.1)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            if slow:
+                self.server.slow_chunks.append((sent, len(pieces)))
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHousingQuorum(unittest.TestCase):
+
+    def test_every_field_needs_quorum(self):
+        self.assertEqual(housing_quorum([answer(), answer()], 2)["policy_stage"], "需求端")
+        self.assertIsNone(housing_quorum([answer(), answer(policy_tool="贷款")], 2))
+        self.assertIsNotNone(housing_quorum([answer(), answer(policy_tool="贷款")], 2, fields=["policy_stage"]))
+        self.assertIsNone(housing_quorum([answer(), None, "无法回答"], 2))
+
+    def test_format_skipped_result(self):
+        self.assertEqual(format_model_result({"content": None, "status": "skipped", "error": QUORUM_SKIPPED}),
+                         {"skipped": QUORUM_SKIPPED})
+
+
+class TestQuorumScheduling(unittest.TestCase):
+
+    def run_quorum(self, answers, models):
+        service = SlowModelService(answers)
+        quorum = Quorum(2)
+        results = {}
+        scheduler = AnalysisScheduler(service, global_limit=4)
+        started = time.monotonic()
+        with scheduler:
+            quorum.submit(scheduler, "doc", [(0, "句子")], lambda s: s, models, "housing",
+                          lambda index, model_name, result: results.__setitem__(model_name, result))
+        return quorum, results, scheduler, time.monotonic() - started
+
+    def test_slow_model_skipped_once_quorum_agrees(self):
+        quorum, results, scheduler, elapsed = self.run_quorum({"a": answer(), "b": answer()}, ["a", "b", "slow"])
+        self.assertLess(elapsed, 2)
+        self.assertEqual(results["slow"]["status"], "skipped")
+        self.assertEqual(results["slow"]["error"], QUORUM_SKIPPED)
+        self.assertEqual(results["a"]["prompt"], "句子")
+        self.assertEqual(quorum.stats(), {"sentences": 1, "early_exits": 1, "skipped_calls": 1})
+        self.assertEqual(scheduler.stats["skipped"], 1)
+
+    def test_waits_for_all_without_agreement(self):
+        answers = {"a": answer(), "b": answer(stage="供给端"), "c": answer(policy_tool="贷款")}
+        quorum, results, _, _ = self.run_quorum(answers, ["a", "b", "c"])
+        self.assertEqual({m: r["status"] for m, r in results.items()}, {"a": "success", "b": "success", "c": "success"})
+        self.assertEqual(quorum.stats(), {"sentences": 1, "early_exits": 0, "skipped_calls": 0})
+
+
+class TestParallelQuorum(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SlowStreamHandler)
+        self.server.daemon_threads = True
+        self.server.slow_chunks = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        self.service = LLMService({"model_alicloud_compatible": base_url}, streaming=True,
+                                  circuit_breakers=CircuitBreakerRegistry())
+        self.service.api_key = "test"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.pools.close()
+
+    def test_returns_before_slow_model_and_cancels_stream(self):
+        started = time.monotonic()
+        results = self.service.process_prompts_parallel(["qwen-turbo", "qwen-plus", "qwen-max"], "政策", quorum=2)
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(results["qwen-turbo"]["status"], "success")
+        self.assertEqual(results["qwen-max"], {"content": None, "time": results["qwen-max"]["time"],
+                                               "status": "skipped", "error": QUORUM_SKIPPED})
+
+        # 被取消的流式调用提前关闭，且不计为模型失败
+        for _ in range(100):
+            if self.server.slow_chunks:
+                break
+            time.sleep(0.05)
+        sent, total = self.server.slow_chunks[0]
+        self.assertLess(sent, total)
+        time.sleep(0.1)
+        self.assertEqual(self.service.circuit_breakers.get("qwen-max").snapshot()["consecutive_failures"], 0)
+
+
+class QuorumAsyncService(LLMService):
+    """qwen-max一直等到被取消，其余模型立即返回相同的答案"""
+
+    def __init__(self):
+        super().__init__({}, circuit_breakers=CircuitBreakerRegistry())
+        self.cancelled = []
+
+    async def _acall_provider(self, model_name, prompt, max_retries=3):
+        if model_name == "qwen-max":
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                self.cancelled.append(model_name)
+                raise
+        return answer()
+
+
+class TestAsyncParallelQuorum(unittest.TestCase):
+
+    def test_returns_before_slow_model(self):
+        service = QuorumAsyncService()
+        started = time.monotonic()
+        results = asyncio.run(service.aprocess_prompts(["qwen-turbo", "qwen-plus", "qwen-max"], "政策", quorum=2))
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(results["qwen-plus"]["status"], "success")
+        self.assertEqual(results["qwen-max"]["status"], "skipped")
+        self.assertEqual(results["qwen-max"]["error"], QUORUM_SKIPPED)
+        self.assertEqual(service.cancelled, ["qwen-max"])
+        self.assertEqual(service.circuit_breakers.get("qwen-max").snapshot()["consecutive_failures"], 0)
+
+    def test_deadline_passed_through(self):
+        service = QuorumAsyncService()
+        started = time.monotonic()
+        results = asyncio.run(service.aprocess_prompts(["qwen-turbo", "qwen-max"], "政策",
+                                                       deadline=time.monotonic() + 0.3))
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(results["qwen-turbo"]["status"], "success")
+        self.assertEqual(results["qwen-max"]["status"], "error")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import copy
+import json
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from src.config.model_config import RATE_LIMIT_CONFIG
+from src.services.llm_service import LLMService
+from src.services.rate_limiter import RateLimiter, TokenBucket, parse_retry_after, throttle_info
+
+
+def make_config(**defaults):
+    config = copy.deepcopy(RATE_LIMIT_CONFIG)
+    config["default"].update(defaults)
+    config["providers"] = {}
+    config["models"] = {}
+    return config
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    """第一次请求返回429和Retry-After，之后正常返回"""
+
+    calls = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        ThrottlingHandler.calls += 1
+        if ThrottlingHandler.calls == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "0.3")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = json.dumps({"response": "ok"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_token_bucket_wait_time(self):
+        bucket = TokenBucket(60)
+        now = time.monotonic()
+        bucket.take(60, now)
+        self.assertAlmostEqual(bucket.wait_time(2, now), 2.0, places=2)
+        self.assertEqual(bucket.wait_time(1, now + 1), 0.0)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+
+    def test_throttle_info_from_http_error(self):
+        response = requests.Response()
+        response.status_code = 429
+        response.headers["Retry-After"] = "5"
+        self.assertEqual(throttle_info(requests.HTTPError(response=response)), (True, 5.0))
+        response.status_code = 500
+        self.assertEqual(throttle_info(requests.HTTPError(response=response)), (False, None))
+
+    def test_concurrency_limited_and_increased_on_success(self):
+        limiter = RateLimiter(make_config(initial_concurrency=2, max_concurrency=4))
+        first = limiter.acquire("alicloud", "qwen-turbo", "句子")
+        second = limiter.acquire("alicloud", "qwen-turbo", "句子")
+        acquired = threading.Event()
+        waiter = threading.Thread(target=lambda: (limiter.acquire("alicloud", "qwen-turbo", "句子"), acquired.set()))
+        waiter.start()
+        self.assertFalse(acquired.wait(0.1))
+        first.release("success")
+        self.assertTrue(acquired.wait(1))
+        waiter.join()
+        second.release("success")
+        self.assertGreater(limiter.stats()["models:qwen-turbo"]["concurrency"], 2)
+
+    def test_throttle_halves_concurrency_and_blocks(self):
+        limiter = RateLimiter(make_config(initial_concurrency=8))
+        permits = [limiter.acquire("baidu", "ernie-bot", "句子") for _ in range(4)]
+        for permit in permits:
+            permit.release("throttled", retry_after=0.2)
+        stats = limiter.stats()["models:ernie-bot"]
+        # 同一波限流只减半一次
+        self.assertEqual(stats["concurrency"], 4)
+        self.assertEqual(stats["throttled"], 4)
+        start = time.monotonic()
+        limiter.acquire("baidu", "ernie-bot", "句子").release()
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_requests_per_minute_budget(self):
+        limiter = RateLimiter(make_config(requests_per_minute=600))
+        limiter._get_limits("local", "chatglm-local")[1].request_bucket.tokens = 0
+        start = time.monotonic()
+        limiter.acquire("local", "chatglm-local", "句子").release()
+        self.assertGreaterEqual(time.monotonic() - start, 0.08)
+
+    def test_call_path_honours_retry_after(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            limiter = RateLimiter(make_config())
+            service = LLMService({"model_chatglm": f"http://127.0.0.1:{server.server_port}/chat"},
+                                 rate_limiter=limiter)
+            start = time.monotonic()
+            self.assertEqual(service.call_chatglm_api("政策", max_retries=2), "ok")
+            self.assertGreaterEqual(time.monotonic() - start, 0.25)
+            self.assertEqual(limiter.stats()["models:chatglm-local"]["throttled"], 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
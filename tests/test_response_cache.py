@@ -0,0 +1,114 @@
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from src.services.llm_service import LLMService
+from src.services.response_cache import ResponseCache, make_cache_key
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _cache(self, **kwargs):
+        cache = ResponseCache(self.tmpdir.name, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_key_depends_on_all_inputs(self):
+        params = {"temperature": 0.1, "top_p": 0.7, "max_tokens": 2000}
+        key = make_cache_key("qwen-turbo", "housing", "句子", params)
+
+        self.assertEqual(key, make_cache_key("qwen-turbo", "housing", "句子", dict(params)))
+        self.assertNotEqual(key, make_cache_key("qwen-max", "housing", "句子", params))
+        self.assertNotEqual(key, make_cache_key("qwen-turbo", "housing", "句子", {**params, "max_tokens": 100}))
+
+    def test_round_trip_and_persistence(self):
+        cache = self._cache()
+        cache.put("k", "qwen-turbo", "housing", "答案", 1.5)
+        cache.close()
+
+        reopened = self._cache()
+        entry = reopened.get("k")
+        self.assertEqual(entry["response"], "答案")
+        self.assertEqual(entry["latency"], 1.5)
+        self.assertEqual(reopened.stats["hits"], 1)
+
+    def test_modes(self):
+        self._cache().put("k", "qwen-turbo", None, "旧答案", 1.0)
+
+        readonly = self._cache(mode="readonly")
+        readonly.put("other", "qwen-turbo", None, "不写入", 1.0)
+        self.assertIsNone(readonly.get("other"))
+
+        refresh = self._cache(mode="refresh")
+        self.assertIsNone(refresh.get("k"))
+        refresh.put("k", "qwen-turbo", None, "新答案", 1.0)
+        self.assertEqual(readonly.get("k")["response"], "新答案")
+
+        self.assertIsNone(self._cache(mode="bypass").get("k"))
+        with self.assertRaises(ValueError):
+            self._cache(mode="unknown")
+
+    def test_lru_eviction_by_size(self):
+        cache = self._cache(max_size_mb=0.00002)  # 约20字节
+        cache.put("a", "m", None, "x" * 8, 0)
+        cache.put("b", "m", None, "y" * 8, 0)
+        time.sleep(0.01)
+        cache.get("a")
+        cache.put("c", "m", None, "z" * 8, 0)
+        cache.evict()
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_hits_do_not_write_per_access(self):
+        cache = self._cache()
+        cache.put("a", "m", None, "答案", 0)
+        statements = []
+        cache._conn.set_trace_callback(statements.append)
+        for _ in range(3):
+            cache.get("a")
+        self.assertFalse([s for s in statements if s.startswith("UPDATE")])
+        cache.close()
+        self.assertTrue([s for s in statements if s.startswith("UPDATE")])
+
+        readonly = self._cache(mode="readonly")
+        statements.clear()
+        readonly._conn.set_trace_callback(statements.append)
+        self.assertEqual(readonly.get("a")["response"], "答案")
+        readonly.close()
+        self.assertEqual([s for s in statements if not s.startswith("SELECT")], [])
+
+    def test_age_eviction(self):
+        cache = self._cache(max_age_days=1)
+        cache.put("old", "m", None, "旧", 0)
+        with patch("src.services.response_cache.time.time", return_value=time.time() + 2 * 86400):
+            self.assertIsNone(cache.get("old"))
+            self.assertEqual(cache.evict(), 1)
+
+
+class TestLLMServiceCache(unittest.TestCase):
+
+    def test_call_model_uses_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ResponseCache(tmpdir)
+            service = LLMService(response_cache=cache)
+            with patch.object(service, "_call_provider", return_value="答案") as provider_call:
+                self.assertEqual(service.call_model("qwen-turbo", "提示", template_name="housing"), "答案")
+                self.assertEqual(service.call_model("qwen-turbo", "提示", template_name="housing"), "答案")
+                service.call_model("qwen-turbo", "提示", template_name="standard")
+            cache.close()
+
+        self.assertEqual(provider_call.call_count, 2)
+        self.assertEqual(cache.stats["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
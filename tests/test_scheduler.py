@@ -0,0 +1,71 @@
+import threading
+import time
+import unittest
+
+from src.core.scheduler import AnalysisScheduler, ModelTask
+
+
+class FakeService:
+    """记录各服务商并发峰值的模拟LLM服务"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = {}
+        self.peak = {}
+        self.peak_total = 0
+
+    def call_model_result(self, model_name, prompt, template_name=None):
+        provider = "baidu" if model_name.startswith("ernie") else "alicloud"
+        with self.lock:
+            self.active[provider] = self.active.get(provider, 0) + 1
+            self.peak[provider] = max(self.peak.get(provider, 0), self.active[provider])
+            self.peak_total = max(self.peak_total, sum(self.active.values()))
+        time.sleep(self.delay)
+        with self.lock:
+            self.active[provider] -= 1
+        return {"content": f"{model_name}:{prompt}", "time": self.delay, "status": "success"}
+
+
+class TestAnalysisScheduler(unittest.TestCase):
+
+    def test_all_tasks_complete_within_limits(self):
+        service = FakeService()
+        results = {}
+        lock = threading.Lock()
+
+        def on_result(task, result):
+            with lock:
+                results[(task.sentence_index, task.model_name)] = result["content"]
+
+        scheduler = AnalysisScheduler(service, global_limit=5,
+                                      provider_limits={"alicloud": 4, "baidu": 1},
+                                      max_pending=6)
+        with scheduler:
+            for i in range(10):
+                for model in ["qwen-turbo", "qwen-plus", "ernie-bot"]:
+                    scheduler.submit(ModelTask("doc", i, model, f"句子{i}"), on_result)
+
+        self.assertEqual(len(results), 30)
+        self.assertEqual(results[(3, "ernie-bot")], "ernie-bot:句子3")
+        self.assertLessEqual(service.peak["alicloud"], 4)
+        self.assertEqual(service.peak["baidu"], 1)
+        self.assertLessEqual(service.peak_total, 5)
+        self.assertEqual(scheduler.stats["completed"], 30)
+
+    def test_callback_error_does_not_block_join(self):
+        service = FakeService(delay=0)
+
+        def on_result(task, result):
+            raise ValueError("boom")
+
+        scheduler = AnalysisScheduler(service, global_limit=2)
+        with scheduler:
+            scheduler.submit(ModelTask("doc", 0, "qwen-turbo", "句子"), on_result)
+
+        self.assertEqual(scheduler.stats["submitted"], 1)
+        self.assertEqual(scheduler.stats["failed"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
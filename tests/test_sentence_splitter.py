@@ -0,0 +1,61 @@
+import io
+import mmap
+import os
+import tempfile
+import time
+import unittest
+
+from src.utils.text_processing import iter_sentences, iter_sentence_spans, split_text_into_sentences
+
+TEXT = "第一条 为做好住房保障工作，制定本办法。\n第二条 补贴标准是多少？按年度确定！！\n（一）租赁补贴；（二）实物配租"
+EXPECTED = ["第一条 为做好住房保障工作，制定本办法。", "第二条 补贴标准是多少？", "按年度确定！！",
+            "（一）租赁补贴；（二）实物配租"]
+
+
+class TestIterSentences(unittest.TestCase):
+
+    def test_string(self):
+        self.assertEqual(split_text_into_sentences(TEXT), EXPECTED)
+        self.assertEqual(split_text_into_sentences("  \n "), [])
+
+    def test_sentences_crossing_chunk_boundaries(self):
+        for chunk_size in (1, 2, 5, 17):
+            self.assertEqual(list(iter_sentences(io.StringIO(TEXT), chunk_size)), EXPECTED)
+
+    def test_binary_stream_splits_multibyte_characters(self):
+        # 每个汉字占3个字节，块大小不是3的倍数时字符会被切开
+        for chunk_size in (1, 4, 7):
+            self.assertEqual(list(iter_sentences(io.BytesIO(TEXT.encode("utf-8")), chunk_size)), EXPECTED)
+
+    def test_mmap(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "wb") as f:
+            f.write(TEXT.encode("utf-8"))
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            self.assertEqual(list(iter_sentences(mapped, 10)), EXPECTED)
+
+    def test_long_text_without_terminators(self):
+        text = "无句号" * 100000
+        self.assertEqual(list(iter_sentences(io.StringIO(text), 4096)), [text])
+
+    def test_long_stretch_without_terminators_is_linear(self):
+        # 没有句末标点的长段落不随读入块数反复复制和扫描
+        table = "| 项目 | 标准 |\n" * 200000
+        text = "表格如下：" + table + "以上为补贴标准。最后一句"
+        start = time.monotonic()
+        sentences = list(iter_sentences(io.StringIO(text), 256))
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(sentences, [("表格如下：" + table + "以上为补贴标准。").strip(), "最后一句"])
+        spans = list(iter_sentence_spans(io.StringIO(text), 1024))
+        self.assertEqual([text[s:e] for s, e, _ in spans], sentences)
+
+    def test_terminator_at_chunk_end(self):
+        text = "第一句。" * 10 + "第二句！！" + "尾部"
+        expected = split_text_into_sentences(text)
+        for chunk_size in (1, 3, 4, 5, 8):
+            self.assertEqual(list(iter_sentences(io.StringIO(text), chunk_size)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
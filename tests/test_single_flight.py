@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from src.services.circuit_breaker import CircuitBreakerRegistry
+from src.services.deadline import DeadlineExceeded
+from src.services.llm_service import LLMService
+from src.services.single_flight import SingleFlight
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """等待0.3秒后返回提示词本身的OpenAI兼容接口"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        time.sleep(0.3)
+        data = json.dumps({"id": "1", "object": "chat.completion", "created": 0, "model": body["model"],
+                           "choices": [{"index": 0, "finish_reason": "stop",
+                                        "message": {"role": "assistant",
+                                                    "content": body["messages"][-1]["content"]}}]})
+        data = data.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def run_concurrently(self, flight, fn, count=5, **kwargs):
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            futures = [executor.submit(flight.do, "key", fn, "m", **kwargs) for _ in range(count)]
+            return [future.exception() or future.result() for future in futures]
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.2)
+            return "结果"
+
+        self.assertEqual(self.run_concurrently(flight, fn), ["结果"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats(), {"m": {"calls": 1, "coalesced": 4}})
+        self.assertEqual(flight.in_flight(), 0)
+
+        # 调用完成后相同的键重新发起
+        self.assertEqual(flight.do("key", fn, "m"), "结果")
+        self.assertEqual(len(calls), 2)
+
+    def test_exception_shared(self):
+        def fn():
+            time.sleep(0.2)
+            raise ValueError("失败")
+
+        results = self.run_concurrently(SingleFlight(), fn, count=3)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    def test_unshareable_result_rerun_by_waiters(self):
+        flight = SingleFlight()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.2)
+            return None if len(calls) == 1 else "结果"
+
+        results = self.run_concurrently(flight, fn, count=3, shareable=lambda result: result is not None)
+        self.assertEqual(sorted(results, key=str), [None, "结果", "结果"])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flight.stats()["m"], {"calls": 2, "coalesced": 1})
+
+    def test_waiter_timeout(self):
+        flight = SingleFlight()
+        started = threading.Event()
+
+        def fn():
+            started.set()
+            time.sleep(0.5)
+            return "结果"
+
+        leader = threading.Thread(target=flight.do, args=("key", fn))
+        leader.start()
+        started.wait()
+        with self.assertRaises(FutureTimeout):
+            flight.do("key", fn, timeout=0.05)
+        leader.join()
+
+
+class TestCallModelCoalescing(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        self.service = LLMService({"model_alicloud_compatible": base_url},
+                                  circuit_breakers=CircuitBreakerRegistry())
+        self.service.api_key = "test"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.pools.close()
+
+    def test_identical_prompts_sent_once(self):
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            same = [executor.submit(self.service.call_model, "qwen-turbo", "重复条款", template_name="housing")
+                    for _ in range(4)]
+            other = executor.submit(self.service.call_model, "qwen-turbo", "重复条款", template_name="standard")
+            results = [future.result() for future in same] + [other.result()]
+
+        self.assertEqual(results, ["重复条款"] * 5)
+        # 模板不同时生成参数不同，不合并
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.service.single_flight.stats()["qwen-turbo"], {"calls": 2, "coalesced": 3})
+
+    def test_leader_cancellation_not_shared(self):
+        cancel_event = threading.Event()
+        started = threading.Event()
+        calls = []
+
+        def call_once(model_name, prompt, max_retries, template_name, deadline, event, cache_key):
+            calls.append(event)
+            if event is not None:
+                started.set()
+                event.wait()
+                raise DeadlineExceeded("发起方已取消")
+            return "结果"
+
+        self.service._call_model_once = call_once
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(self.service.call_model, "qwen-turbo", "条款", cancel_event=cancel_event)
+            started.wait()
+            waiter = executor.submit(self.service.call_model, "qwen-turbo", "条款")
+            time.sleep(0.1)
+            cancel_event.set()
+            self.assertEqual(waiter.result(), "结果")
+            # 发起方自己的异常原样抛出，不被当作等待超时
+            with self.assertRaisesRegex(DeadlineExceeded, "发起方已取消"):
+                leader.result()
+        self.assertEqual(calls, [cancel_event, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.services.storage_service import StreamingResultWriter
+
+
+class TestStreamingResultWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_lines_visible_before_close(self):
+        writer = StreamingResultWriter(self.tmpdir.name, "policy")
+        writer.write_sentence(1, "第二句。", {"qwen-turbo": "答案二", "qwen-max": {"error": "超时"}})
+
+        with open(os.path.join(self.tmpdir.name, "all", "policy_sentences.jsonl"), encoding='utf-8') as f:
+            self.assertEqual(json.loads(f.readline())["models"]["qwen-turbo"], "答案二")
+        with open(os.path.join(self.tmpdir.name, "qwen-max", "policy_results.jsonl"), encoding='utf-8') as f:
+            self.assertEqual(json.loads(f.readline()), {"index": 1, "text": "第二句。", "result": {"error": "超时"}})
+        writer.close()
+
+    def test_finalize_matches_combined_json_shape(self):
+        writer = StreamingResultWriter(self.tmpdir.name, "policy")
+        writer.write_sentence(1, "第二句。", {"qwen-turbo": {"policy_object": "廉租房"}})
+        writer.write_sentence(0, "第一句。", {"qwen-turbo": "答案"})
+        output_path = writer.close(finalize=True)
+
+        with open(output_path, encoding='utf-8') as f:
+            combined = json.load(f)
+        self.assertEqual(combined["filename"], "policy")
+        self.assertEqual(combined["total_sentences"], 2)
+        self.assertEqual(combined["sentences"], [
+            {"text": "第一句。", "models": {"qwen-turbo": "答案"}},
+            {"text": "第二句。", "models": {"qwen-turbo": {"policy_object": "廉租房"}}},
+        ])
+
+    def test_chunk_span_kept(self):
+        span = {"start": 0, "end": 12, "sentences": [[0, 6], [7, 12]]}
+        writer = StreamingResultWriter(self.tmpdir.name, "policy")
+        writer.write_sentence(0, "第一章 总则\n第一条。", {"qwen-turbo": "答案"}, span)
+        with open(writer.close(finalize=True), encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["sentences"][0]["span"], span)
+
+    def test_finalize_empty_file(self):
+        output_path = StreamingResultWriter(self.tmpdir.name, "empty").close(finalize=True)
+        with open(output_path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["sentences"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
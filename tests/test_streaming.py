@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from src.services.circuit_breaker import CircuitBreakerRegistry
+from src.services.llm_service import LLMService
+from src.utils.response_parser import housing_elements_complete, parse_housing_elements
+
+ANSWER = ("policy_object: 公租房; policy_stage: 需求端; policy_type: 激励型; policy_tool: 一次性补贴; "
+          "policy_geo_scope: 全市; policy_target_scope: 本市户籍; tool_parameter: 最高100万;")
+
+
+class StreamingHandler(BaseHTTPRequestHandler):
+    """以SSE方式逐块返回ANSWER，之后继续输出多余的说明文字"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        pieces = [ANSWER[i:i + 20] for i in range(0, len(ANSWER), 20)] + ["\n以下是分析过程"] * 20
+        sent = 0
+        try:
+            for piece in pieces:
+                chunk = {"id": "1", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                         "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                sent += 1
+                time.sleep(0.02)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            self.server.sent_chunks.append(sent)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHousingElementsComplete(unittest.TestCase):
+
+    def test_complete_only_after_last_element_terminated(self):
+        self.assertFalse(housing_elements_complete(ANSWER[:-5]))
+        self.assertFalse(housing_elements_complete(ANSWER[:-1]))
+        self.assertTrue(housing_elements_complete(ANSWER))
+        self.assertTrue(housing_elements_complete(ANSWER[:-1] + "\n"))
+
+    def test_packed_output_not_stopped(self):
+        self.assertFalse(housing_elements_complete(f"[1] {ANSWER}\n"))
+
+
+class TestStreamingCalls(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StreamingHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.server.sent_chunks = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        self.service = LLMService({"model_alicloud_compatible": base_url}, streaming=True,
+                                  circuit_breakers=CircuitBreakerRegistry())
+        self.service.api_key = "test"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.pools.close()
+
+    def test_stops_when_housing_elements_complete(self):
+        content = self.service.call_model("qwen-turbo", "政策", template_name="housing")
+        self.assertNotIn("分析过程", content)
+        self.assertEqual(parse_housing_elements(content)["tool_parameter"], "最高100万")
+        self.assertTrue(self.server.requests[0]["stream"])
+
+        stats = self.service.stream_stats.snapshot()["qwen-turbo"]
+        self.assertEqual(stats["streams"], 1)
+        self.assertEqual(stats["early_stops"], 1)
+        self.assertGreater(stats["first_token_seconds"], 0)
+
+        # 客户端关闭连接后服务端不再继续发送
+        for _ in range(100):
+            if self.server.sent_chunks:
+                break
+            time.sleep(0.02)
+        self.assertLess(self.server.sent_chunks[0], 20)
+
+    def test_other_templates_read_full_stream(self):
+        content = self.service.call_model("qwen-turbo", "政策", template_name="standard")
+        self.assertIn("分析过程", content)
+        self.assertEqual(self.service.stream_stats.snapshot()["qwen-turbo"]["early_stops"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import time
+import unittest
+
+from src.services.task_queue import SQLiteTaskQueue
+
+
+def make_tasks(file_name, count, models=("qwen-turbo",)):
+    return [{"file_key": f"/corpus/{file_name}.txt", "file_name": file_name, "sentence_index": i,
+             "sentence": f"第{i}句。", "template": "housing", "model": model}
+            for i in range(count) for model in models]
+
+
+class TestSQLiteTaskQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "tasks.sqlite3")
+        self.queue = SQLiteTaskQueue(self.db_path, visibility_timeout=60, max_attempts=2)
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmpdir.cleanup()
+
+    def test_uses_rollback_journal(self):
+        # WAL的共享内存索引不能跨机器，共享卷上的队列文件必须使用回滚日志
+        mode = self.queue._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "delete")
+
+    def test_enqueue_is_idempotent(self):
+        self.assertEqual(self.queue.enqueue(make_tasks("a", 3, ("qwen-turbo", "qwen-plus"))), 6)
+        self.assertEqual(self.queue.enqueue(make_tasks("a", 4, ("qwen-turbo", "qwen-plus"))), 2)
+        self.assertEqual(self.queue.counts()["pending"], 8)
+
+    def test_workers_lease_disjoint_tasks(self):
+        self.queue.enqueue(make_tasks("a", 10))
+        other = SQLiteTaskQueue(self.db_path, visibility_timeout=60)
+        try:
+            first = self.queue.lease("w1", 6)
+            second = other.lease("w2", 6)
+        finally:
+            other.close()
+        self.assertEqual(len(first), 6)
+        self.assertEqual(len(second), 4)
+        self.assertFalse({t["id"] for t in first} & {t["id"] for t in second})
+
+    def test_expired_lease_is_taken_over(self):
+        self.queue.enqueue(make_tasks("a", 1))
+        self.queue.visibility_timeout = 0.05
+        task = self.queue.lease("w1", 1)[0]
+        time.sleep(0.1)
+        self.assertEqual(self.queue.heartbeat("w1", [task["id"]]), 1)
+        time.sleep(0.1)
+        retaken = self.queue.lease("w2", 1)
+        self.assertEqual([t["id"] for t in retaken], [task["id"]])
+        self.assertEqual(retaken[0]["attempts"], 2)
+        # 原工作进程的结果不再写入
+        self.assertFalse(self.queue.complete(task["id"], "w1", {"status": "success", "content": "旧"}))
+        self.assertTrue(self.queue.complete(task["id"], "w2", {"status": "success", "content": "新"}))
+        self.assertEqual(self.queue.counts()["done"], 1)
+
+    def test_failed_task_retried_until_max_attempts(self):
+        self.queue.enqueue(make_tasks("a", 1))
+        task = self.queue.lease("w1", 1)[0]
+        self.queue.fail(task["id"], "w1", {"status": "error", "error": "超时"})
+        self.assertEqual(self.queue.counts()["pending"], 1)
+        task = self.queue.lease("w1", 1)[0]
+        self.queue.fail(task["id"], "w1", {"status": "error", "error": "超时"})
+        self.assertEqual(self.queue.counts()["failed"], 1)
+        self.assertFalse(self.queue.has_unfinished())
+        self.assertEqual(self.queue.lease("w1", 1), [])
+
+    def test_requeue_delay_and_uncounted_attempts(self):
+        self.queue.enqueue(make_tasks("a", 1))
+        task = self.queue.lease("w1", 1)[0]
+        self.assertTrue(self.queue.fail(task["id"], "w1", {"status": "error", "not_sent": "circuit_open"},
+                                        count_attempt=False, delay=0.1))
+        # 等待时间未到时不能领取
+        self.assertEqual(self.queue.lease("w1", 1), [])
+        self.assertTrue(self.queue.has_unfinished())
+        time.sleep(0.15)
+        task = self.queue.lease("w1", 1)[0]
+        self.assertEqual(task["attempts"], 1)
+        # 未计入的放回不消耗尝试次数，两次真正的失败后才标记为失败
+        self.queue.fail(task["id"], "w1", {"status": "error", "error": "超时"})
+        task = self.queue.lease("w1", 1)[0]
+        self.assertEqual(task["attempts"], 2)
+        self.queue.fail(task["id"], "w1", {"status": "error", "error": "超时"})
+        self.assertEqual(self.queue.counts()["failed"], 1)
+
+    def test_retry_delay_grows_exponentially(self):
+        delays = [self.queue.retry_delay(attempts) for attempts in range(1, 10)]
+        self.assertEqual(delays, sorted(delays))
+        self.assertLess(delays[0], delays[1])
+        self.assertEqual(delays[-1], delays[-2])
+
+    def test_results_grouped_by_file(self):
+        self.queue.enqueue(make_tasks("a", 2) + make_tasks("b", 1))
+        for task in self.queue.lease("w1", 10):
+            self.queue.complete(task["id"], "w1", {"status": "success", "content": task["sentence"]})
+        results = {name: rows for _, name, rows in self.queue.results("housing")}
+        self.assertEqual(sorted(results), ["a", "b"])
+        self.assertEqual([row[0] for row in results["a"]], [0, 1])
+        self.assertEqual(results["a"][1][4]["content"], "第1句。")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from src.services.llm_service import LLMService
+from src.services.token_manager import BaiduTokenManager
+
+
+class TokenHandler(BaseHTTPRequestHandler):
+    """模拟百度令牌接口和文心接口：令牌依次为token-1、token-2……，只接受最新令牌"""
+
+    issued = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        if self.path.startswith("/oauth"):
+            with TokenHandler.lock:
+                TokenHandler.issued += 1
+                payload = {"access_token": f"token-{TokenHandler.issued}", "expires_in": 2592000}
+            time.sleep(0.05)
+        elif self.path.startswith("/chat/ernie-bot"):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            if self.path.endswith(f"access_token=token-{TokenHandler.issued}"):
+                payload = {"result": "ok"}
+            else:
+                payload = {"error_code": 111, "error_msg": "Access token expired"}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestBaiduTokenManager(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), TokenHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        TokenHandler.issued = 0
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _manager(self, **kwargs):
+        return BaiduTokenManager("key", "secret", token_url=f"{self.base}/oauth",
+                                 cache_dir=self.tmpdir.name, background_refresh=False, **kwargs)
+
+    def test_token_cached_until_expiry(self):
+        manager = self._manager()
+        self.assertEqual(manager.get_token(), "token-1")
+        self.assertEqual(manager.get_token(), "token-1")
+        self.assertEqual(TokenHandler.issued, 1)
+
+    def test_token_file_shared_between_managers(self):
+        self.assertEqual(self._manager().get_token(), "token-1")
+        # 另一个进程中的管理器直接读取令牌文件
+        other = self._manager()
+        self.assertEqual(other.get_token(), "token-1")
+        self.assertEqual(other.stats["loaded_from_file"], 1)
+        self.assertEqual(TokenHandler.issued, 1)
+
+    def test_refresh_within_margin(self):
+        manager = self._manager(refresh_margin=2592000)
+        manager.get_token()
+        manager.get_token()
+        self.assertEqual(TokenHandler.issued, 2)
+
+    def test_invalidate_is_single_flight(self):
+        manager = self._manager()
+        stale = manager.get_token()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(manager.invalidate(stale)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(set(results), {"token-2"})
+        self.assertEqual(TokenHandler.issued, 2)
+
+    def test_call_baidu_api_refreshes_rejected_token(self):
+        service = LLMService({"model_baidu": f"{self.base}/chat"})
+        service.baidu_tokens = self._manager()
+        service.baidu_tokens.set_token("revoked")
+        self.assertEqual(service.call_baidu_api("政策", max_retries=2), "ok")
+        self.assertEqual(service.baidu_tokens.stats["invalidated"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
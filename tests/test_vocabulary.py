@@ -0,0 +1,51 @@
+import unittest
+
+from src.utils.response_parser import format_model_result
+from src.utils.vocabulary import VocabularyIndex, HousingNormalizer, housing_vocabularies
+
+CONTENT = ("policy_object: 公共租赁住房（公租房）; policy_stage: 需求侧; policy_type: 激励型; policy_tool: 补贴; "
+           "policy_geo_scope: 全市; policy_target_scope: 本市户籍; tool_parameter: 无")
+
+
+class TestVocabularyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = VocabularyIndex(housing_vocabularies()["policy_object"])
+
+    def test_variants_map_to_canonical(self):
+        for answer in ("公租房", "公共租赁住房", "公共租赁住房（公租房）", "“公租房”", "公共租赁住房(公租房)"):
+            self.assertEqual(self.index.lookup(answer), (["公共租赁住房（公租房）"], 1.0), answer)
+        self.assertEqual(self.index.lookup("未匹配"), (["未匹配"], 1.0))
+
+    def test_multiple_values_in_order(self):
+        self.assertEqual(self.index.lookup("人才公寓、公租房"), (["人才房", "公共租赁住房（公租房）"], 1.0))
+        # 回答中有未收录的文字时得分为已识别文字的比例
+        values, score = self.index.lookup("廉租房和其他")
+        self.assertEqual(values, ["廉租房"])
+        self.assertAlmostEqual(score, 0.5)
+
+    def test_fuzzy_match(self):
+        values, score = self.index.lookup("集体土地建设租赁住房")
+        self.assertEqual(values, ["集体土地租赁住房"])
+        self.assertTrue(0.5 <= score < 1.0)
+        self.assertEqual(self.index.lookup("城中村改造")[0], [])
+        self.assertEqual(self.index.lookup(""), ([], 0.0))
+
+
+class TestHousingNormalizer(unittest.TestCase):
+
+    def test_enumerated_elements(self):
+        normalized = HousingNormalizer().normalize({"policy_object": "公租房", "policy_stage": "需求侧",
+                                                    "policy_type": "未提取", "policy_tool": "补贴"})
+        self.assertEqual(normalized, {"policy_object": {"values": ["公共租赁住房（公租房）"], "score": 1.0},
+                                      "policy_stage": {"values": ["需求端"], "score": 0.5}})
+
+    def test_format_model_result(self):
+        formatted = format_model_result({"content": CONTENT, "time": 1.0, "status": "success"})
+        self.assertEqual(formatted["policy_object"], "公共租赁住房（公租房）")
+        self.assertEqual(formatted["normalized"]["policy_object"], {"values": ["公共租赁住房（公租房）"], "score": 1.0})
+        self.assertEqual(formatted["normalized"]["policy_type"], {"values": ["激励型"], "score": 1.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from src.core.scheduler import AnalysisScheduler, ModelTask
+from src.core.workers import (MP_CONTEXT, shard_files, merge_stats, create_shared_limits, init_worker,
+                              report_file_done)
+from tests.test_scheduler import FakeService
+
+
+def _run_in_worker(log_queue, progress_queue):
+    init_worker(log_queue, progress_queue, {})
+    logging.getLogger("worker-test").info("来自工作进程")
+    report_file_done("doc.txt", 3)
+
+
+class TestWorkers(unittest.TestCase):
+
+    def test_shard_files_balances_by_size(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = []
+            for name, size in [("a", 100), ("b", 30), ("c", 30), ("d", 20)]:
+                path = os.path.join(tmpdir, f"{name}.txt")
+                with open(path, 'w') as f:
+                    f.write("x" * size)
+                paths.append(path)
+            shards = shard_files(paths, 2)
+            self.assertEqual(sorted(len(shard) for shard in shards), [1, 3])
+            self.assertIn([paths[0]], shards)
+            self.assertEqual(shard_files(paths[:1], 4), [paths[:1]])
+
+    def test_merge_stats(self):
+        merged = merge_stats([{"completed": 3, "path": "a"}, {"completed": 4, "failed": 1, "path": "b"}])
+        self.assertEqual(merged, {"completed": 7, "failed": 1, "path": "a"})
+
+    def test_scheduler_honours_shared_limits(self):
+        service = FakeService()
+        shared = create_shared_limits(2, {"alicloud": 1})
+        with AnalysisScheduler(service, global_limit=8, provider_limits={"alicloud": 8},
+                               shared_limits=shared) as scheduler:
+            for i in range(6):
+                scheduler.submit(ModelTask("doc", i, "qwen-turbo", f"句子{i}"), lambda task, result: None)
+        self.assertEqual(service.peak["alicloud"], 1)
+        self.assertEqual(scheduler.stats["completed"], 6)
+
+    def test_worker_logs_and_progress_reach_parent(self):
+        log_queue = MP_CONTEXT.Queue()
+        progress_queue = MP_CONTEXT.Queue()
+        process = MP_CONTEXT.Process(target=_run_in_worker, args=(log_queue, progress_queue))
+        process.start()
+        record = log_queue.get(timeout=30)
+        process.join(timeout=30)
+        self.assertIn("来自工作进程", record.getMessage())
+        self.assertEqual(progress_queue.get(timeout=5)[1:], ("doc.txt", 3))
+
+
+if __name__ == '__main__':
+    unittest.main()